@@ -0,0 +1,44 @@
+import config
+
+# после стольких сбоев подряд сайт считается упавшим (на этом же пороге уходит оповещение)
+DOWN_THRESHOLD = 3
+
+
+def bounds(site) -> tuple:
+    """Границы адаптивного интервала сайта: заданные явно или по умолчанию из настроек."""
+    low = site.min_interval or min(config.adaptive_min_interval, site.check_interval)
+    high = site.max_interval or site.check_interval * config.adaptive_max_factor
+    return low, max(low, high)
+
+
+def record_result(site, previous: bool, status_ok: bool) -> None:
+    """
+    Обновляет оценку «флаппинга»: каждая смена состояния добавляет единицу,
+    с каждой проверкой оценка затухает.
+    """
+    site.flap_score *= config.adaptive_flap_decay
+    if previous is not None and previous != status_ok:
+        site.flap_score += 1.0
+
+
+def next_interval(site) -> float:
+    """
+    Интервал до следующей проверки.
+    Без адаптивного режима — check_interval. В адаптивном режиме:
+    первые сбои подтверждаются быстрой перепроверкой с минимальным интервалом,
+    подтверждённо упавший сайт проверяется всё реже (экспоненциально),
+    флаппинг-сайт — с удвоенным интервалом; всё в пределах bounds().
+    """
+    if not site.adaptive:
+        return site.check_interval
+    low, high = bounds(site)
+    failures = site.consecutive_failures
+    if 0 < failures < DOWN_THRESHOLD:
+        interval = low
+    elif failures >= DOWN_THRESHOLD:
+        interval = site.check_interval * 2 ** min(failures - DOWN_THRESHOLD, 16)
+    elif site.flap_score >= config.adaptive_flap_threshold:
+        interval = site.check_interval * 2
+    else:
+        interval = site.check_interval
+    return min(max(interval, low), high)
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import Callable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+ALERTS = metrics.counter("monitor_alerts_total", "Отправленные оповещения по виду", ("kind",))
+
+DOWN = "down"
+UP = "up"
+# сколько сайтов перечислять в сводке
+SUMMARY_LIMIT = 20
+
+
+def site_domain(url: str) -> str:
+    """Домен второго уровня из URL: по нему группируются сайты одного хоста / CDN."""
+    host = (urlsplit(url).hostname or url).lower()
+    parts = host.split(".")
+    if len(parts) <= 2 or host.replace(".", "").isdigit():
+        return host
+    return ".".join(parts[-2:])
+
+
+def common_host(sites) -> Optional[Tuple[str, int]]:
+    """Самый частый домен среди сайтов, если он встречается хотя бы дважды."""
+    if not sites:
+        return None
+    host, count = Counter(site_domain(site.url) for site in sites).most_common(1)[0]
+    return (host, count) if count >= 2 else None
+
+
+class AlertAggregator:
+    """
+    Собирает переходы «упал / восстановился» за окно alert_window секунд.
+    Мало событий — уходят как есть, много — одной сводкой с общим хостом.
+    Если одновременно лежит большая часть сайтов, вместо поштучных оповещений
+    сообщает о вероятной проблеме на стороне мониторинга (сеть, DNS, аплинк).
+    """
+
+    def __init__(self, notifier, monitored_sites: Callable[[], list]) -> None:
+        self.notifier = notifier
+        # сайты, которые проверяет этот экземпляр: из них считается доля упавших
+        self.monitored_sites = monitored_sites
+        self.local_outage = False
+        self._pending: List[Tuple[str, object, str]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def down(self, site, text: str) -> None:
+        self._add(DOWN, site, text)
+
+    def recovered(self, site, text: str) -> None:
+        self._add(UP, site, text)
+
+    def _add(self, kind: str, site, text: str) -> None:
+        self._pending.append((kind, site, text))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(config.alert_window)
+        self.flush()
+
+    async def close(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.flush()
+
+    def flush(self) -> None:
+        events, self._pending = self._pending, []
+        # сайт, успевший упасть и подняться в пределах окна, не оповещаем ни о том, ни о другом
+        last = {}
+        for kind, site, text in events:
+            previous = last.get(site.name)
+            if previous is not None and previous[0] != kind:
+                del last[site.name]
+            else:
+                last[site.name] = (kind, site, text)
+        downs = [e for e in last.values() if e[0] == DOWN]
+        ups = [e for e in last.values() if e[0] == UP]
+
+        was_outage = self.local_outage
+        if self._check_local_outage():
+            # во время общей аварии поштучные сообщения только мешают
+            return
+        if was_outage:
+            # о восстановлении уже сказало сообщение о конце аварии
+            ups = []
+        for kind, group, title in ((DOWN, downs, "недоступны"), (UP, ups, "восстановлены")):
+            if not group:
+                continue
+            if len(group) < config.alert_group_min:
+                for _, _, text in group:
+                    ALERTS.inc("single")
+                    self.notifier.notify(text)
+                continue
+            ALERTS.inc("summary")
+            self.notifier.notify(self._summary(title, [site for _, site, _ in group]))
+
+    def _check_local_outage(self) -> bool:
+        """Обновляет флаг общей аварии и сообщает о смене состояния. True — авария идёт."""
+        sites = self.monitored_sites()
+        failing = [site for site in sites if site.consecutive_failures >= 3]
+        is_outage = (len(sites) >= config.alert_local_min_sites
+                     and len(failing) >= len(sites) * config.alert_local_ratio)
+        if is_outage and not self.local_outage:
+            ALERTS.inc("local")
+            logger.warning(f"Недоступны {len(failing)} из {len(sites)} сайтов: вероятна проблема сети мониторинга")
+            self.notifier.notify(
+                f"⚠️ Недоступны {len(failing)} из {len(sites)} сайтов одновременно.\n"
+                f"Вероятно, проблема на стороне мониторинга (сеть, DNS, аплинк), а не у сайтов."
+            )
+        elif not is_outage and self.local_outage:
+            ALERTS.inc("local")
+            logger.info(f"Общая авария закончилась, недоступны {len(failing)} из {len(sites)} сайтов")
+            text = f"✅ Связь восстановлена, сейчас недоступны {len(failing)} из {len(sites)} сайтов."
+            if failing:
+                text += "\n" + self._names(failing)
+            self.notifier.notify(text)
+        self.local_outage = is_outage
+        return is_outage
+
+    def _summary(self, title: str, sites) -> str:
+        text = f"{len(sites)} сайтов {title}"
+        common = common_host(sites)
+        if common is not None:
+            text += f", общий хост {common[0]} ({common[1]} из {len(sites)})"
+        return text + "\n" + self._names(sites)
+
+    @staticmethod
+    def _names(sites) -> str:
+        names = [site.name for site in sites[:SUMMARY_LIMIT]]
+        text = ", ".join(names)
+        if len(sites) > SUMMARY_LIMIT:
+            text += f" и ещё {len(sites) - SUMMARY_LIMIT}"
+        return text
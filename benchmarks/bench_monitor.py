@@ -0,0 +1,271 @@
+"""
+Нагрузочный бенчмарк мониторинга.
+
+Поднимает в отдельном процессе ферму из N виртуальных сайтов (site_farm.py) и гоняет
+против неё настоящий SiteMonitor с заглушкой бота и БД в памяти (fake_db.py).
+Результат печатается и сохраняется в JSON, --compare сравнивает с прошлым прогоном.
+
+    python benchmarks/bench_monitor.py --sites 2000 --interval 10 --duration 60
+    python benchmarks/bench_monitor.py --sites 2000 --compare benchmarks/results/<прошлый>.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sys
+import tracemalloc
+from dataclasses import asdict
+from datetime import datetime
+from time import perf_counter
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# MySQL бенчмарку не нужен, но config требует порт БД
+os.environ.setdefault("DB_PORT", "3306")
+
+import aiohttp
+
+import config
+from site_monitor import SiteMonitor
+
+from fake_db import InMemoryDatabase, site_rows
+from site_farm import FarmProfile, run_farm
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+class FakeBot:
+    """Заглушка aiogram.Bot: считает сообщения вместо отправки."""
+
+    def __init__(self) -> None:
+        self.messages = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.messages += 1
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        self.messages += 1
+
+
+def percentiles(values, qs=(0.5, 0.9, 0.99)) -> dict:
+    if not values:
+        return {f"p{int(q * 100)}": None for q in qs} | {"max": None}
+    ordered = sorted(values)
+    result = {f"p{int(q * 100)}": round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3) for q in qs}
+    result["max"] = round(ordered[-1], 3)
+    return result
+
+
+class Recorder:
+    """Подключается к SiteMonitor и собирает замеры по каждой проверке."""
+
+    def __init__(self, monitor: SiteMonitor) -> None:
+        self.monitor = monitor
+        self.drift_ms = []
+        self.elapsed_ms = []
+        self.loop_lag_ms = []
+        self.queue_depth_max = 0
+        self.recording = False
+        self._probe = monitor.scheduler.probe
+        self._check = monitor.http.check
+        # планировщик отдаёт сайт в probe сразу после записи отставания в lag_ms
+        monitor.scheduler.probe = self._recorded_probe
+        monitor.http.check = self._recorded_check
+
+    async def _recorded_probe(self, site):
+        if self.recording:
+            self.drift_ms.append(self.monitor.scheduler.lag_ms.get(site.id, 0.0))
+        await self._probe(site)
+
+    async def _recorded_check(self, site, **kwargs):
+        result = await self._check(site, **kwargs)
+        if self.recording:
+            self.elapsed_ms.append(result.elapsed_ms)
+        return result
+
+    def reset(self) -> None:
+        self.drift_ms.clear()
+        self.elapsed_ms.clear()
+        self.loop_lag_ms.clear()
+        self.queue_depth_max = 0
+
+    async def sample_loop(self, interval: float = 0.05) -> None:
+        """Задержка пробуждения event loop и глубина очереди записи."""
+        loop = asyncio.get_running_loop()
+        db = self.monitor.db
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            if self.recording:
+                self.loop_lag_ms.append(max(0.0, loop.time() - started - interval) * 1000)
+                if db._checks_queue is not None:
+                    self.queue_depth_max = max(self.queue_depth_max, db._checks_queue.qsize())
+
+
+async def farm_stats(session: aiohttp.ClientSession, address, reset: bool = False) -> dict:
+    host, port = address
+    async with session.get(f"http://{host}:{port}/_stats", params={"reset": "1"} if reset else {}) as response:
+        return await response.json()
+
+
+async def run(args, addresses) -> dict:
+    profile = farm_profile(args)
+    urls = [f"http://{addresses[i % len(addresses)][0]}:{addresses[i % len(addresses)][1]}/s/{i}"
+            for i in range(args.sites)]
+
+    config.probe_workers = args.workers
+    config.host_concurrency = args.host_concurrency
+    config.host_rate = args.host_rate
+    config.host_burst = max(1, int(args.host_rate))
+    # синхронизация конфигурации и оповещения не должны мешать замеру
+    config.config_sync_interval = 0
+
+    tracemalloc.start()
+    memory_before = tracemalloc.get_traced_memory()[0]
+    db = InMemoryDatabase(asyncio.get_running_loop(), site_rows(urls, args.interval, args.timeout))
+    bot = FakeBot()
+    monitor = SiteMonitor(bot=bot, db=db)
+    recorder = Recorder(monitor)
+    sampler = asyncio.create_task(recorder.sample_loop())
+    control = aiohttp.ClientSession()
+    try:
+        await monitor.run_monitoring()
+        # прогрев: все сайты успевают пройти хотя бы одну проверку, память меряется на нём
+        await asyncio.sleep(args.warmup)
+        memory_per_site = (tracemalloc.get_traced_memory()[0] - memory_before) / args.sites
+        tracemalloc.stop()
+
+        # счётчики общие на всю ферму, спрашиваем через любой адрес
+        await farm_stats(control, addresses[0], reset=True)
+        checks_before, write_before, batches_before = db.checks_written, db.write_seconds, db.batches
+        recorder.reset()
+        recorder.recording = True
+        started = perf_counter()
+        await asyncio.sleep(args.duration)
+        elapsed = perf_counter() - started
+        recorder.recording = False
+        farm = await farm_stats(control, addresses[0])
+    finally:
+        sampler.cancel()
+        await control.close()
+        await monitor.stop_monitoring()
+        await db.close()
+
+    probes = len(recorder.elapsed_ms)
+    server_requests = farm["requests"]
+    server_ms = farm["server_ms"]
+    checks = db.checks_written - checks_before
+    write_seconds = db.write_seconds - write_before
+    client_mean = sum(recorder.elapsed_ms) / probes if probes else None
+    server_mean = server_ms / server_requests if server_requests else None
+    return {
+        "params": vars(args) | {"farm": asdict(profile)},
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": {
+            "duration_s": round(elapsed, 3),
+            "checks_per_sec": round(probes / elapsed, 2),
+            "expected_checks_per_sec": round(args.sites / args.interval, 2),
+            "probes": probes,
+            "server_requests": server_requests,
+            "server_errors": farm["errors"],
+            "drift_ms": percentiles(recorder.drift_ms),
+            "probe_latency_ms": percentiles(recorder.elapsed_ms),
+            "server_latency_mean_ms": round(server_mean, 3) if server_mean is not None else None,
+            # время проверки сверх времени ответа фермы: планировщик, лимиты, клиент, разбор ответа
+            "probe_overhead_mean_ms": round(client_mean - server_mean, 3)
+            if client_mean is not None and server_mean is not None else None,
+            "db_rows": checks,
+            "db_rows_per_sec": round(checks / elapsed, 2),
+            "db_write_cpu_rows_per_sec": round(checks / write_seconds, 1) if write_seconds else None,
+            "db_batches": db.batches - batches_before,
+            "db_queue_depth_max": recorder.queue_depth_max,
+            "sketch_bytes_total": db.sketch_bytes,
+            "memory_per_site_bytes": round(memory_per_site),
+            "loop_lag_ms": percentiles(recorder.loop_lag_ms),
+            "notifications": bot.messages,
+        },
+    }
+
+
+def farm_profile(args) -> FarmProfile:
+    return FarmProfile(sites=args.sites, hosts=args.hosts, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                       error_rate=args.error_rate, slow_body_rate=args.slow_body_rate,
+                       slow_chunk_delay_ms=args.slow_chunk_delay_ms, body_bytes=args.body_bytes, seed=args.seed)
+
+
+def compare(current: dict, previous: dict) -> None:
+    """Печатает изменение числовых результатов относительно прошлого прогона."""
+    def flatten(results, prefix=""):
+        for key, value in results.items():
+            if isinstance(value, dict):
+                yield from flatten(value, f"{prefix}{key}.")
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield f"{prefix}{key}", value
+
+    before = dict(flatten(previous["results"]))
+    print(f"\nСравнение с прогоном {previous['environment']['started_at']}:")
+    for key, value in flatten(current["results"]):
+        old = before.get(key)
+        if old is None:
+            continue
+        change = f"{(value - old) / old * 100:+.1f}%" if old else "—"
+        print(f"  {key:<32} {old:>12} -> {value:<12} {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк SiteMonitor против локальной фермы сайтов")
+    parser.add_argument("--sites", type=int, default=1000, help="число виртуальных сайтов")
+    parser.add_argument("--interval", type=int, default=10, help="интервал проверки сайта, сек")
+    parser.add_argument("--timeout", type=int, default=10, help="таймаут проверки, сек")
+    parser.add_argument("--duration", type=float, default=30, help="длительность замера, сек")
+    parser.add_argument("--warmup", type=float, default=None, help="прогрев перед замером, сек (по умолчанию — интервал)")
+    parser.add_argument("--workers", type=int, default=config.probe_workers, help="воркеров планировщика")
+    parser.add_argument("--hosts", type=int, default=32, help="адресов 127.0.0.x, по которым разложены сайты")
+    parser.add_argument("--host-concurrency", type=int, default=config.host_concurrency)
+    parser.add_argument("--host-rate", type=float, default=1000, help="запросов в секунду на хост (в проде HOST_RATE)")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--slow-body-rate", type=float, default=0.05)
+    parser.add_argument("--slow-chunk-delay-ms", type=float, default=50)
+    parser.add_argument("--body-bytes", type=int, default=2048)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="куда сохранить JSON (по умолчанию benchmarks/results/bench-<время>.json)")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+    if args.warmup is None:
+        args.warmup = float(args.interval)
+    logging.basicConfig(level=logging.ERROR, format="%(asctime)s %(name)s - %(levelname)s - %(message)s")
+
+    # ферма в отдельном процессе, чтобы её event loop не делил CPU с мониторингом
+    context = multiprocessing.get_context("spawn")
+    parent, child = context.Pipe()
+    farm = context.Process(target=run_farm, args=(asdict(farm_profile(args)), child), daemon=True)
+    farm.start()
+    try:
+        addresses = parent.recv()
+        report = asyncio.run(run(args, addresses))
+    finally:
+        parent.send("stop")
+        farm.join(timeout=10)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"bench-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(report["results"], ensure_ascii=False, indent=2))
+    print(f"\nРезультат сохранён в {output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
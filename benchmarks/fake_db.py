@@ -0,0 +1,90 @@
+from datetime import datetime
+from time import perf_counter
+from typing import Dict, List
+
+import metrics
+import rollups
+from database import Database, _STOP
+
+
+class InMemoryDatabase(Database):
+    """
+    Database без MySQL для бенчмарков. Очередь, пакетная запись, свёртка агрегатов
+    и скетчей остаются настоящими — подменяются только обращения к серверу, поэтому
+    замер пропускной способности записи показывает собственные расходы мониторинга.
+    """
+
+    def __init__(self, loop, sites: List[dict]) -> None:
+        super().__init__(loop)
+        self.sites: Dict[int, dict] = {row["id"]: row for row in sites}
+        self.checks_written = 0
+        self.batches = 0
+        self.write_seconds = 0.0
+        self.sketch_bytes = 0
+        self.rollup_rows: Dict[str, int] = {g: 0 for g in rollups.GRANULARITIES}
+
+    async def create_pool(self):
+        pass
+
+    async def create_tables(self):
+        pass
+
+    async def get_sites(self):
+        return list(self.sites.values())
+
+    async def get_sites_changed_since(self, watermark: datetime | None):
+        if watermark is None:
+            return await self.get_sites()
+        return [row for row in self.sites.values() if row["updated_at"] >= watermark]
+
+    async def get_site_ids(self) -> set:
+        return set(self.sites)
+
+    async def get_last_states(self, streak_limit: int = 20):
+        return []
+
+    async def set_enabled(self, site_id: int, enabled: bool) -> int:
+        row = self.sites.get(site_id)
+        if row is None:
+            return 0
+        row["enabled"] = int(enabled)
+        row["updated_at"] = datetime.now()
+        return 1
+
+    async def _write_checks(self, batch):
+        started = perf_counter()
+        for granularity, buckets in rollups.aggregate_checks(batch).items():
+            self.rollup_rows[granularity] += len(buckets)
+        self.sketches.add_checks(batch)
+        self.write_seconds += perf_counter() - started
+        self.checks_written += len(batch)
+        self.batches += 1
+        metrics.DB_FLUSH_ROWS.inc(amount=len(batch))
+        return True
+
+    async def flush_sketches(self):
+        self._sketches_flushed_at = self.loop.time()
+        started = perf_counter()
+        for items in self.sketches.take_dirty().values():
+            self.sketch_bytes += sum(len(s.to_bytes()) for _, _, s in items)
+        self.write_seconds += perf_counter() - started
+
+    async def close(self):
+        if self._writer_task is not None:
+            await self._checks_queue.put(_STOP)
+            await self._writer_task
+            self._writer_task = None
+        await self.flush_sketches()
+
+
+def site_rows(urls: List[str], check_interval: int, timeout: int) -> List[dict]:
+    """Строки таблицы sites для виртуальных сайтов фермы."""
+    now = datetime.now()
+    return [
+        {
+            "id": i + 1, "name": f"bench-{i}", "url": url, "check_interval": check_interval,
+            "timeout": timeout, "expected_status": 200, "enabled": 1,
+            "created_at": now, "updated_at": now,
+        }
+        for i, url in enumerate(urls)
+    ]
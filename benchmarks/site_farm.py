@@ -0,0 +1,117 @@
+import asyncio
+import random
+import zlib
+from dataclasses import dataclass
+from time import perf_counter
+from typing import List, Tuple
+
+from aiohttp import web
+
+
+@dataclass
+class FarmProfile:
+    """Поведение виртуальных сайтов фермы."""
+    sites: int = 1000
+    # сайты раскладываются по адресам 127.0.0.1..127.0.0.<hosts>, чтобы лимиты на хост не были узким местом
+    hosts: int = 32
+    latency_ms: float = 50.0
+    jitter_ms: float = 20.0
+    # доля ответов 500
+    error_rate: float = 0.02
+    # доля сайтов, отдающих тело медленно, кусками с паузами
+    slow_body_rate: float = 0.05
+    slow_chunk_delay_ms: float = 50.0
+    slow_chunks: int = 8
+    body_bytes: int = 2048
+    seed: int = 1
+
+    def host_of(self, index: int) -> str:
+        return f"127.0.0.{1 + index % self.hosts}"
+
+    def is_slow(self, index: int) -> bool:
+        # детерминированно по номеру сайта, одинаково в ферме и в отчёте
+        return (zlib.crc32(f"{self.seed}:{index}".encode()) % 10_000) / 10_000 < self.slow_body_rate
+
+
+class SiteFarm:
+    """
+    Локальная ферма сайтов на aiohttp: сайт номер i отвечает на /s/<i> с заданной
+    задержкой, долей ошибок и, для части сайтов, медленным телом. Считает запросы
+    и собственное время обработки, чтобы отделить накладные расходы клиента.
+    """
+
+    def __init__(self, profile: FarmProfile) -> None:
+        self.profile = profile
+        self.body = b"x" * profile.body_bytes
+        self._random = random.Random(profile.seed)
+        self._runner = None
+        self.requests = 0
+        self.errors = 0
+        self.server_ms = 0.0
+
+    async def start(self) -> List[Tuple[str, int]]:
+        app = web.Application()
+        app.router.add_get("/s/{index}", self._handle)
+        app.router.add_get("/_stats", self._stats)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        addresses = []
+        for k in range(min(self.profile.hosts, self.profile.sites)):
+            host = self.profile.host_of(k)
+            site = web.TCPSite(self._runner, host, 0, backlog=1024)
+            await site.start()
+            addresses.append((host, self._runner.addresses[-1][1]))
+        return addresses
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        started = perf_counter()
+        profile = self.profile
+        index = int(request.match_info["index"])
+        delay = max(0.0, profile.latency_ms + self._random.uniform(-profile.jitter_ms, profile.jitter_ms))
+        await asyncio.sleep(delay / 1000)
+        status = 500 if self._random.random() < profile.error_rate else 200
+        try:
+            if not profile.is_slow(index):
+                return web.Response(status=status, body=self.body)
+            response = web.StreamResponse(status=status)
+            response.content_length = len(self.body)
+            await response.prepare(request)
+            chunk = -(-len(self.body) // profile.slow_chunks)
+            for offset in range(0, len(self.body), chunk):
+                if offset:
+                    await asyncio.sleep(profile.slow_chunk_delay_ms / 1000)
+                await response.write(self.body[offset:offset + chunk])
+            await response.write_eof()
+            return response
+        except ConnectionResetError:
+            # клиент закрыл соединение, не дочитав тело (ответ 500, остановка бенчмарка)
+            return web.Response(status=status)
+        finally:
+            self.requests += 1
+            self.errors += status != 200
+            self.server_ms += (perf_counter() - started) * 1000
+
+    async def _stats(self, request: web.Request) -> web.Response:
+        stats = {"requests": self.requests, "errors": self.errors, "server_ms": self.server_ms}
+        if request.query.get("reset"):
+            self.requests = self.errors = 0
+            self.server_ms = 0.0
+        return web.json_response(stats)
+
+
+def run_farm(profile_fields: dict, conn) -> None:
+    """Точка входа отдельного процесса: поднимает ферму, шлёт адреса в conn и работает до сигнала из conn."""
+
+    async def main():
+        farm = SiteFarm(FarmProfile(**profile_fields))
+        conn.send(await farm.start())
+        loop = asyncio.get_running_loop()
+        # conn.recv() блокирующий, ждём его в потоке
+        await loop.run_in_executor(None, conn.recv)
+        await farm.stop()
+
+    asyncio.run(main())
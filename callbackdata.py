@@ -1,8 +1,22 @@
 from aiogram.filters.callback_data import CallbackData
 
-class SitesList(CallbackData, prefix="siteslist"):
-    name: str
+# Telegram ограничивает callback_data 64 байтами, поэтому сайты передаются по id,
+# а фильтр и поиск — короткими кодами
 
-class SiteAction(CallbackData, prefix="SiteAction"):
-    name: str
-    action: str
\ No newline at end of file
+class SitesPage(CallbackData, prefix="sp"):
+    page: int = 0
+    # a — все, d — упавшие, o — выключенные (site_list.FILTERS)
+    flt: str = "a"
+    # номер поискового запроса /find, 0 — без поиска
+    q: int = 0
+
+class SitesList(CallbackData, prefix="sl"):
+    id: int
+    # страница списка, на которую ведёт кнопка «К списку»
+    page: int = 0
+    flt: str = "a"
+    q: int = 0
+
+class SiteAction(CallbackData, prefix="sa"):
+    id: int
+    action: str
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import matplotlib
+matplotlib.use("Agg")  # без GUI-бэкенда, рендер возможен в дочернем процессе
+from matplotlib.figure import Figure
+
+import config
+
+logger = logging.getLogger(__name__)
+
+FIGSIZE = (10, 5)
+DPI = 100
+
+
+def downsample_lttb(xs: Sequence[float], ys: Sequence[float], threshold: int) -> Tuple[List[float], List[float]]:
+    """
+    Largest-Triangle-Three-Buckets: оставляет threshold точек, сохраняя форму ряда
+    (пики и провалы не сглаживаются, в отличие от простого усреднения).
+    """
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(xs), list(ys)
+
+    out_x = [xs[0]]
+    out_y = [ys[0]]
+    bucket = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # среднее следующего бакета — третья вершина треугольника
+        nxt_start = int((i + 1) * bucket) + 1
+        nxt_end = min(int((i + 2) * bucket) + 1, n)
+        span = nxt_end - nxt_start
+        avg_x = sum(xs[nxt_start:nxt_end]) / span
+        avg_y = sum(ys[nxt_start:nxt_end]) / span
+
+        start = int(i * bucket) + 1
+        end = int((i + 1) * bucket) + 1
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        out_x.append(xs[best])
+        out_y.append(ys[best])
+        a = best
+    out_x.append(xs[-1])
+    out_y.append(ys[-1])
+    return out_x, out_y
+
+
+def render_response_time(filename: str, timestamps: List[float], values: List[float], title: str) -> str:
+    """
+    Рисует график времени отклика в файл. Выполняется в пуле процессов,
+    поэтому использует объектный API Figure вместо глобального состояния pyplot.
+    """
+    width_px = int(FIGSIZE[0] * DPI)
+    timestamps, values = downsample_lttb(timestamps, values, width_px)
+    times = [datetime.fromtimestamp(t) for t in timestamps]
+
+    fig = Figure(figsize=FIGSIZE, dpi=DPI)
+    ax = fig.add_subplot()
+    # маркеры только для редких рядов, иначе они сливаются в сплошную полосу
+    marker = "o" if len(times) <= 200 else None
+    ax.plot(times, values, marker=marker, linestyle="-", label="Response time (ms)")
+    ax.set_title(title)
+    ax.set_xlabel("Дата")
+    ax.set_ylabel("Время отклика (мс)")
+    ax.tick_params(axis="x", labelrotation=45)
+    ax.grid(True)
+    ax.legend()
+    fig.tight_layout()
+    fig.savefig(filename)
+    return filename
+
+
+class ChartRenderer:
+    """
+    Рендер графиков в пуле процессов с кэшем.
+    Ключ кэша — (site_id, окно) и id последней проверки: пока новых проверок нет,
+    повторный запрос сразу возвращает готовый файл. Каждый рендер пишет свой файл
+    (имя с id проверки или случайное, запись через временный файл и os.replace),
+    поэтому отправляемый файл не перезаписывает параллельный рендер. Вытесненные из
+    кэша файлы удаляются через STALE_FILE_GRACE секунд, когда их отправка уже закончилась.
+    """
+
+    STALE_FILE_GRACE = 60.0
+
+    def __init__(self, workers: int = None, directory: str = None) -> None:
+        self.workers = config.chart_workers if workers is None else workers
+        self.directory = config.chart_dir if directory is None else directory
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._cache: Dict[Tuple[int, int], Tuple[Optional[int], str]] = {}
+
+    def cached(self, site_id: int, days: int, latest_check_id: Optional[int]) -> Optional[str]:
+        entry = self._cache.get((site_id, days))
+        if entry and entry[0] == latest_check_id and os.path.exists(entry[1]):
+            return entry[1]
+        return None
+
+    async def render(self, site_id: int, days: int, latest_check_id: Optional[int],
+                     timestamps: List[float], values: List[float], title: str, cache: bool = True) -> str:
+        """
+        Рендерит график в новый файл. cache=False — разовый файл (например, для отчёта),
+        он не попадает в кэш, и после отправки его удаляет вызывающий через discard().
+        """
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        os.makedirs(self.directory, exist_ok=True)
+        suffix = latest_check_id if cache else uuid.uuid4().hex
+        filename = os.path.join(self.directory, f"response_time_{site_id}_{days}d_{suffix}.png")
+        tmp = os.path.join(self.directory, f".{uuid.uuid4().hex}.png")
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._pool, render_response_time, tmp, timestamps, values, title)
+            os.replace(tmp, filename)
+        except BaseException:
+            self._remove(tmp)
+            raise
+        if cache:
+            old = self._cache.get((site_id, days))
+            self._cache[(site_id, days)] = (latest_check_id, filename)
+            if old is not None and old[1] != filename:
+                self._remove_later(old[1])
+        return filename
+
+    def invalidate(self, site_id: int) -> None:
+        for key in [k for k in self._cache if k[0] == site_id]:
+            self._remove_later(self._cache.pop(key)[1])
+
+    def discard(self, filename: Optional[str]) -> None:
+        """Удаляет разовый файл графика после отправки."""
+        if filename:
+            self._remove(filename)
+
+    def _remove_later(self, filename: str) -> None:
+        try:
+            asyncio.get_running_loop().call_later(self.STALE_FILE_GRACE, self._remove, filename)
+        except RuntimeError:
+            self._remove(filename)
+
+    @staticmethod
+    def _remove(filename: str) -> None:
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Не удалось удалить файл графика {filename}: {e}")
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
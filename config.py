@@ -18,3 +18,104 @@ admin_id = 0
 # Настройки логирования
 log_file = os.getenv('LOG_FILE', 'app.log')
 log_level = os.getenv('LOG_LEVEL', 'INFO')
+
+# Настройки HTTP-клиента проверок
+http_limit = int(os.getenv('HTTP_LIMIT', 1000))
+http_limit_per_host = int(os.getenv('HTTP_LIMIT_PER_HOST', 10))
+http_keepalive_timeout = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', 75))
+# DNS-кэш: TTL по умолчанию (если TTL записи неизвестен) и его границы, секунды
+dns_cache_ttl = int(os.getenv('DNS_CACHE_TTL', 300))
+dns_cache_min_ttl = int(os.getenv('DNS_CACHE_MIN_TTL', 5))
+dns_cache_max_ttl = int(os.getenv('DNS_CACHE_MAX_TTL', 3600))
+dns_cache_max_entries = int(os.getenv('DNS_CACHE_MAX_ENTRIES', 50000))
+# вежливость к хостам: одновременных проверок и запросов в секунду на хост (0 — без ограничения)
+host_concurrency = int(os.getenv('HOST_CONCURRENCY', 4))
+host_rate = float(os.getenv('HOST_RATE', 10))
+host_burst = int(os.getenv('HOST_BURST', 10))
+# одинаковые цели (URL, режим, статус, таймаут), проверенные не раньше этого числа секунд назад,
+# получают готовый результат без нового запроса
+coalesce_window = float(os.getenv('COALESCE_WINDOW', 1.0))
+# лимит тела ответа по умолчанию для режима проверки с Range, байт
+probe_max_body_bytes = int(os.getenv('PROBE_MAX_BODY_BYTES', 65536))
+# сколько байт хвоста предыдущего чанка учитывать при поиске регулярок в теле ответа
+content_regex_window = int(os.getenv('CONTENT_REGEX_WINDOW', 4096))
+
+# Планировщик проверок: максимум одновременных проверок
+probe_workers = int(os.getenv('PROBE_WORKERS', 100))
+
+# Пакетная запись результатов проверок
+checks_batch_size = int(os.getenv('CHECKS_BATCH_SIZE', 500))
+checks_flush_interval = float(os.getenv('CHECKS_FLUSH_INTERVAL', 1.0))
+checks_queue_size = int(os.getenv('CHECKS_QUEUE_SIZE', 20000))
+# повторы записи пачки при ошибке БД: число попыток и пауза (удваивается до CHECKS_RETRY_MAX_DELAY)
+checks_write_retries = int(os.getenv('CHECKS_WRITE_RETRIES', 5))
+checks_retry_delay = float(os.getenv('CHECKS_RETRY_DELAY', 0.5))
+checks_retry_max_delay = float(os.getenv('CHECKS_RETRY_MAX_DELAY', 30))
+
+# Скетчи перцентилей отклика: относительная точность квантилей и как часто сбрасывать их в БД (сек)
+sketch_relative_accuracy = float(os.getenv('SKETCH_RELATIVE_ACCURACY', 0.01))
+sketch_flush_interval = float(os.getenv('SKETCH_FLUSH_INTERVAL', 60))
+
+# Хранение истории (в днях, 0 — хранить всегда).
+# Сырые проверки по умолчанию не удаляются: включайте RAW_RETENTION_DAYS после manage.py backfill-rollups
+raw_retention_days = int(os.getenv('RAW_RETENTION_DAYS', 0))
+rollup_retention_days = {
+    'minute': int(os.getenv('ROLLUP_MINUTE_RETENTION_DAYS', 7)),
+    'hour': int(os.getenv('ROLLUP_HOUR_RETENTION_DAYS', 400)),
+    'day': int(os.getenv('ROLLUP_DAY_RETENTION_DAYS', 0)),
+}
+retention_batch_size = int(os.getenv('RETENTION_BATCH_SIZE', 5000))
+retention_batch_pause = float(os.getenv('RETENTION_BATCH_PAUSE', 0.2))
+retention_interval_hours = float(os.getenv('RETENTION_INTERVAL_HOURS', 6))
+
+# Экспорт CSV
+export_dir = os.getenv('EXPORT_DIR', 'exports')
+export_compress = os.getenv('EXPORT_COMPRESS', '0') == '1'
+export_chunk_size = int(os.getenv('EXPORT_CHUNK_SIZE', 5000))
+
+# Графики
+chart_workers = int(os.getenv('CHART_WORKERS', 2))
+chart_dir = os.getenv('CHART_DIR', 'charts')
+
+# Список сайтов в боте: сайтов на странице и сколько поисковых запросов /find помнить
+sites_page_size = int(os.getenv('SITES_PAGE_SIZE', 20))
+sites_search_limit = int(os.getenv('SITES_SEARCH_LIMIT', 256))
+
+# Как часто подтягивать изменения таблицы sites из БД, секунды (0 — не подтягивать)
+config_sync_interval = float(os.getenv('CONFIG_SYNC_INTERVAL', 10))
+
+# Сколько последних проверок читать на сайт при восстановлении серии сбоев после перезапуска
+warm_start_streak_limit = int(os.getenv('WARM_START_STREAK_LIMIT', 20))
+
+# Адаптивный интервал проверок (для сайтов с включённым режимом):
+# перепроверка после первого сбоя, рост интервала до check_interval * ADAPTIVE_MAX_FACTOR
+adaptive_min_interval = int(os.getenv('ADAPTIVE_MIN_INTERVAL', 5))
+adaptive_max_factor = float(os.getenv('ADAPTIVE_MAX_FACTOR', 8))
+adaptive_flap_threshold = float(os.getenv('ADAPTIVE_FLAP_THRESHOLD', 3))
+adaptive_flap_decay = float(os.getenv('ADAPTIVE_FLAP_DECAY', 0.9))
+
+# Отправка в Telegram: лимиты Bot API (~30 сообщений/с всего, ~1/с в один чат)
+telegram_global_rate = float(os.getenv('TELEGRAM_GLOBAL_RATE', 30))
+telegram_chat_rate = float(os.getenv('TELEGRAM_CHAT_RATE', 1))
+telegram_chat_burst = int(os.getenv('TELEGRAM_CHAT_BURST', 3))
+# сколько токенов в ведре чата и в общем ведре отчёты оставляют нетронутыми для оповещений
+telegram_alert_reserve = float(os.getenv('TELEGRAM_ALERT_RESERVE', 1))
+notify_queue_size = int(os.getenv('NOTIFY_QUEUE_SIZE', 1000))
+notify_max_retries = int(os.getenv('NOTIFY_MAX_RETRIES', 5))
+# Группировка оповещений: окно, с какого числа событий слать сводку,
+# и какая доля упавших сайтов считается проблемой на стороне мониторинга
+alert_window = float(os.getenv('ALERT_WINDOW', 10))
+alert_group_min = int(os.getenv('ALERT_GROUP_MIN', 3))
+alert_local_ratio = float(os.getenv('ALERT_LOCAL_RATIO', 0.6))
+alert_local_min_sites = int(os.getenv('ALERT_LOCAL_MIN_SITES', 5))
+
+# Шардирование проверок между несколькими экземплярами (через аренды в БД)
+sharding_enabled = os.getenv('SHARDING_ENABLED', '0') == '1'
+instance_id = os.getenv('INSTANCE_ID')
+shard_count = int(os.getenv('SHARD_COUNT', 64))
+lease_ttl = float(os.getenv('LEASE_TTL', 15))
+heartbeat_interval = float(os.getenv('HEARTBEAT_INTERVAL', 5))
+
+# HTTP-эндпоинт метрик Prometheus (0 — выключен)
+metrics_host = os.getenv('METRICS_HOST', '0.0.0.0')
+metrics_port = int(os.getenv('METRICS_PORT', 0))
@@ -0,0 +1,193 @@
+import json
+import re
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+
+import config
+
+
+class LiteralScanner:
+    """
+    Поиск строк-шаблонов скомпилированной альтернативой экранированных строк:
+    сам поиск идёт в C-коде re, на Python — только найденные совпадения. Найденные строки
+    из альтернативы убираются, поэтому совпадений на Python не больше, чем шаблонов.
+    Состояние между вызовами — хвост из (длина самого длинного шаблона − 1) байт — хранит
+    вызывающий, поэтому совпадение, разрезанное границей чанков, всё равно находится.
+    """
+
+    def __init__(self, patterns: List[bytes]) -> None:
+        self._indices: Dict[bytes, List[int]] = {}
+        for index, pattern in enumerate(patterns):
+            if pattern:
+                self._indices.setdefault(pattern, []).append(index)
+        # длинные строки раньше: из совпадающих в одной позиции альтернатива выберет самую длинную
+        self._literals = sorted(self._indices, key=len, reverse=True)
+        self._keep = max(map(len, self._literals), default=1) - 1
+        self._regexes: Dict[tuple, re.Pattern] = {}
+
+    def _regex(self, literals: tuple) -> re.Pattern:
+        regex = self._regexes.get(literals)
+        if regex is None:
+            regex = self._regexes[literals] = re.compile(b"|".join(re.escape(p) for p in literals))
+        return regex
+
+    def feed(self, tail: bytes, data: bytes, found: set) -> bytes:
+        """Ищет шаблоны в tail + data, добавляет индексы найденных в found и возвращает новый хвост."""
+        remaining = tuple(p for p in self._literals if not found.issuperset(self._indices[p]))
+        if not remaining:
+            return b""
+        window = tail + data if tail else data
+        pos = 0
+        while remaining:
+            match = self._regex(remaining).search(window, pos)
+            if match is None:
+                break
+            literal = match.group()
+            # более короткие шаблоны, начинающиеся там же, — префиксы найденного
+            hits = [p for p in remaining if literal.startswith(p)]
+            for p in hits:
+                found.update(self._indices[p])
+            remaining = tuple(p for p in remaining if p not in hits)
+            # следующее совпадение может начинаться внутри найденного
+            pos = match.start() + 1
+        return window[-self._keep:] if self._keep else b""
+
+
+@dataclass
+class ContentRules:
+    """
+    Правила проверки содержимого ответа.
+    contains / not_contains — строки, regex / not_regex — регулярные выражения,
+    max_bytes — максимальный допустимый размер тела (0 — без ограничения).
+    """
+    contains: List[str] = field(default_factory=list)
+    not_contains: List[str] = field(default_factory=list)
+    regex: List[str] = field(default_factory=list)
+    not_regex: List[str] = field(default_factory=list)
+    max_bytes: int = 0
+
+    def __post_init__(self) -> None:
+        self._scanner = None
+        self._patterns = None
+
+    def __bool__(self) -> bool:
+        return bool(self.contains or self.not_contains or self.regex or self.not_regex or self.max_bytes)
+
+    def to_json(self) -> Optional[str]:
+        if not self:
+            return None
+        return json.dumps({k: v for k, v in asdict(self).items() if v}, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, raw) -> Optional["ContentRules"]:
+        if not raw:
+            return None
+        data = json.loads(raw) if isinstance(raw, (str, bytes)) else raw
+        return cls(**{k: data[k] for k in ("contains", "not_contains", "regex", "not_regex", "max_bytes") if k in data})
+
+    @classmethod
+    def parse(cls, text: str) -> "ContentRules":
+        """
+        Разбирает правила из сообщения, по одному в строке:
+        +строка — должна быть, -строка — не должна быть,
+        ~regex — должно совпасть, !~regex — не должно совпасть, max=N — лимит тела в байтах.
+        """
+        rules = cls()
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("!~"):
+                rules.not_regex.append(re.compile(line[2:]).pattern)
+            elif line.startswith("~"):
+                rules.regex.append(re.compile(line[1:]).pattern)
+            elif line.startswith("+"):
+                rules.contains.append(line[1:])
+            elif line.startswith("-"):
+                rules.not_contains.append(line[1:])
+            elif line.lower().startswith("max="):
+                rules.max_bytes = int(line[4:])
+            else:
+                raise ValueError(f"Непонятное правило: {line}")
+        return rules
+
+    def describe(self) -> str:
+        parts = [f"+{s}" for s in self.contains] + [f"-{s}" for s in self.not_contains]
+        parts += [f"~{s}" for s in self.regex] + [f"!~{s}" for s in self.not_regex]
+        if self.max_bytes:
+            parts.append(f"max={self.max_bytes}")
+        return ", ".join(parts)
+
+    def matcher(self) -> "ContentMatcher":
+        # поиск строк и регулярки компилируются один раз на сайт, матчер — на каждую проверку
+        if self._scanner is None:
+            literals = [s.encode("utf-8") for s in self.contains + self.not_contains]
+            self._scanner = LiteralScanner(literals)
+            self._patterns = [re.compile(p.encode("utf-8")) for p in self.regex + self.not_regex]
+        return ContentMatcher(self, self._scanner, self._patterns)
+
+
+class ContentMatcher:
+    """
+    Проверка правил по чанкам тела. feed() возвращает True, как только исход решён
+    и дальше читать не нужно; итог — в error (None — правила выполнены).
+    Регулярки ищутся в окне из хвоста предыдущих данных и нового чанка,
+    поэтому совпадение длиннее config.content_regex_window может быть пропущено.
+    """
+
+    def __init__(self, rules: ContentRules, scanner: LiteralScanner, patterns: List[re.Pattern]) -> None:
+        self.rules = rules
+        self._scanner = scanner
+        self._patterns = patterns
+        self._literal_tail = b""
+        self._found_literals: set = set()
+        self._found_regex: set = set()
+        self._tail = b""
+        self.size = 0
+        self.error: Optional[str] = None
+        self.done = False
+
+    def feed(self, chunk: bytes) -> bool:
+        if self.done:
+            return True
+        rules = self.rules
+        self.size += len(chunk)
+        if rules.max_bytes and self.size > rules.max_bytes:
+            return self._fail(f"тело больше {rules.max_bytes} байт")
+
+        self._literal_tail = self._scanner.feed(self._literal_tail, chunk, self._found_literals)
+        n_required = len(rules.contains)
+        for index in self._found_literals:
+            if index >= n_required:
+                return self._fail(f"найдено запрещённое «{rules.not_contains[index - n_required]}»")
+
+        if self._patterns:
+            window = self._tail + chunk
+            n_regex = len(rules.regex)
+            for index, pattern in enumerate(self._patterns):
+                if index not in self._found_regex and pattern.search(window):
+                    if index >= n_regex:
+                        return self._fail(f"совпал запрещённый шаблон «{rules.not_regex[index - n_regex]}»")
+                    self._found_regex.add(index)
+            self._tail = window[-config.content_regex_window:] if config.content_regex_window > 0 else b""
+
+        # всё обязательное найдено, а запретов и лимита нет — дальше читать незачем
+        if (not rules.not_contains and not rules.not_regex and not rules.max_bytes
+                and len(self._found_literals) == n_required and len(self._found_regex) == len(rules.regex)):
+            self.done = True
+        return self.done
+
+    def finish(self) -> Optional[str]:
+        """Вызывается в конце тела (или по достижении лимита чтения): проверяет обязательные правила."""
+        if not self.done:
+            self.done = True
+            missing = [s for i, s in enumerate(self.rules.contains) if i not in self._found_literals]
+            missing += [p for i, p in enumerate(self.rules.regex) if i not in self._found_regex]
+            if missing:
+                self.error = "не найдено: " + ", ".join(f"«{m}»" for m in missing)
+        return self.error
+
+    def _fail(self, error: str) -> bool:
+        self.error = error
+        self.done = True
+        return True
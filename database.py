@@ -1,14 +1,45 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager
+from time import perf_counter
 import aiomysql
 import config
-from datetime import datetime
+import metrics
+import rollups
+import sketch
+from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
+# маркер остановки фонового flusher'а
+_STOP = object()
+
+
+def bucket_tables() -> list[str]:
+    """Таблицы агрегатов и скетчей: у всех ключ (site_id, bucket_start, ...)"""
+    return ([rollups.table_name(g) for g in rollups.GRANULARITIES]
+            + [sketch.table_name(g) for g in sketch.GRANULARITIES])
+
 
 class Database:
     def __init__(self, loop):
         self.loop = loop
+        self._checks_queue: asyncio.Queue | None = None
+        self._writer_task: asyncio.Task | None = None
+        # скетчи текущих бакетов копятся в памяти и пишутся отдельными строками этого процесса
+        self.sketches = sketch.SketchStore()
+        self._sketch_writer = sketch.writer_id()
+        self._sketches_flushed_at = 0.0
+        metrics.gauge("monitor_db_write_queue_depth", "Проверок в очереди на запись",
+                      callback=lambda: self._checks_queue.qsize() if self._checks_queue else 0)
+
+    @asynccontextmanager
+    async def _acquire(self):
+        # соединение из пула с замером времени ожидания
+        started = perf_counter()
+        async with self.pool.acquire() as conn:
+            metrics.DB_POOL_WAIT.observe(perf_counter() - started)
+            yield conn
     async def create_pool(self):
         # создаём пул подключений к БД
         self.pool = await aiomysql.create_pool(
@@ -21,7 +52,7 @@ class Database:
         )
     async def create_tables(self):
         # создаём необходимые таблицы, если их нет
-        async with self.pool.acquire() as conn:
+        async with self._acquire() as conn:
             async with conn.cursor() as cur:
                 await cur.execute(
                     """
@@ -35,6 +66,14 @@ class Database:
                         check_interval INT NOT NULL DEFAULT 60,
                         timeout INT NOT NULL DEFAULT 10,
                         expected_status INT NOT NULL DEFAULT 200,
+                        cold_connection TINYINT(1) NOT NULL DEFAULT 0,
+                        fresh_dns TINYINT(1) NOT NULL DEFAULT 0,
+                        probe_mode VARCHAR(16) NOT NULL DEFAULT 'get',
+                        max_body_bytes INT NOT NULL DEFAULT 65536,
+                        content_rules JSON NULL,
+                        adaptive TINYINT(1) NOT NULL DEFAULT 0,
+                        min_interval INT NULL,
+                        max_interval INT NULL,
                         created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
                         updated_at TIMESTAMP NULL DEFAULT NULL ON UPDATE CURRENT_TIMESTAMP
                     );
@@ -51,18 +90,121 @@ class Database:
                         is_ok TINYINT(1) NOT NULL,
                         response_time_ms INT NULL,
                         error TEXT NULL,
+                        dns_ms INT NULL,
+                        connect_ms INT NULL,
+                        ttfb_ms INT NULL,
+                        INDEX idx_checks_site_time (site_id, checked_at),
                         CONSTRAINT fk_checks_site FOREIGN KEY (site_id) REFERENCES sites(id) ON DELETE CASCADE
                     );
                     """
                 )
+                hist_columns = ",\n".join(f"{c} INT NOT NULL DEFAULT 0" for c in rollups.HIST_COLUMNS)
+                phase_columns = ",\n".join(f"{c} BIGINT NOT NULL DEFAULT 0" for c in rollups.PHASE_COLUMNS)
+                for granularity in rollups.GRANULARITIES:
+                    await cur.execute(
+                        f"""
+                        CREATE TABLE IF NOT EXISTS {rollups.table_name(granularity)} (
+                            site_id BIGINT NOT NULL,
+                            bucket_start DATETIME NOT NULL,
+                            cnt INT NOT NULL DEFAULT 0,
+                            ok_cnt INT NOT NULL DEFAULT 0,
+                            sum_ms BIGINT NOT NULL DEFAULT 0,
+                            min_ms INT NULL,
+                            max_ms INT NULL,
+                            {hist_columns},
+                            {phase_columns},
+                            PRIMARY KEY (site_id, bucket_start),
+                            FOREIGN KEY (site_id) REFERENCES sites(id) ON DELETE CASCADE
+                        );
+                        """
+                    )
+                for granularity in sketch.GRANULARITIES:
+                    await cur.execute(
+                        f"""
+                        CREATE TABLE IF NOT EXISTS {sketch.table_name(granularity)} (
+                            site_id BIGINT NOT NULL,
+                            bucket_start DATETIME NOT NULL,
+                            writer VARCHAR(128) NOT NULL,
+                            cnt INT NOT NULL DEFAULT 0,
+                            sketch BLOB NOT NULL,
+                            PRIMARY KEY (site_id, bucket_start, writer),
+                            FOREIGN KEY (site_id) REFERENCES sites(id) ON DELETE CASCADE
+                        );
+                        """
+                    )
+                await cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS monitor_instances (
+                        instance_id VARCHAR(128) PRIMARY KEY,
+                        heartbeat_at TIMESTAMP(3) NOT NULL
+                    );
+                    """
+                )
+                await cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS leases (
+                        name VARCHAR(64) PRIMARY KEY,
+                        owner VARCHAR(128) NULL,
+                        expires_at TIMESTAMP(3) NULL
+                    );
+                    """
+                )
+                # миграции для уже существующих установок
+                await self._ensure_column(cur, "sites", "cold_connection", "TINYINT(1) NOT NULL DEFAULT 0")
+                await self._ensure_column(cur, "sites", "fresh_dns", "TINYINT(1) NOT NULL DEFAULT 0")
+                await self._ensure_column(cur, "sites", "probe_mode", "VARCHAR(16) NOT NULL DEFAULT 'get'")
+                await self._ensure_column(cur, "sites", "max_body_bytes", "INT NOT NULL DEFAULT 65536")
+                await self._ensure_column(cur, "sites", "content_rules", "JSON NULL")
+                await self._ensure_column(cur, "sites", "adaptive", "TINYINT(1) NOT NULL DEFAULT 0")
+                await self._ensure_column(cur, "sites", "min_interval", "INT NULL")
+                await self._ensure_column(cur, "sites", "max_interval", "INT NULL")
+                await self._ensure_index(cur, "checks", "idx_checks_site_time", "site_id, checked_at")
+                # синхронизация конфигурации идёт по водяному знаку updated_at, у новых строк он тоже должен быть
+                await cur.execute("UPDATE sites SET updated_at = created_at WHERE updated_at IS NULL")
+                await self._ensure_index(cur, "sites", "idx_sites_updated", "updated_at")
+                for column in ("dns_ms", "connect_ms", "ttfb_ms"):
+                    await self._ensure_column(cur, "checks", column, "INT NULL")
+                for granularity in rollups.GRANULARITIES:
+                    for column in rollups.PHASE_COLUMNS:
+                        await self._ensure_column(cur, rollups.table_name(granularity), column, "BIGINT NOT NULL DEFAULT 0")
+                # первичный ключ начинается с site_id: очистке по времени нужен свой индекс по bucket_start
+                for table in bucket_tables():
+                    await self._ensure_index(cur, table, f"idx_{table}_bucket", "bucket_start")
                 await conn.commit()
 
+    async def _ensure_column(self, cur, table: str, column: str, definition: str):
+        # MySQL не поддерживает ADD COLUMN IF NOT EXISTS, проверяем через information_schema
+        await cur.execute(
+            """
+            SELECT COUNT(*) AS cnt FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+            """,
+            (table, column)
+        )
+        row = await cur.fetchone()
+        if not row["cnt"]:
+            await cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            logger.info(f"Добавлена колонка {table}.{column}")
+
+    async def _ensure_index(self, cur, table: str, index: str, columns: str):
+        await cur.execute(
+            """
+            SELECT COUNT(*) AS cnt FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+            """,
+            (table, index)
+        )
+        row = await cur.fetchone()
+        if not row["cnt"]:
+            await cur.execute(f"CREATE INDEX {index} ON {table} ({columns})")
+            logger.info(f"Создан индекс {table}.{index}")
+
     async def update_notify_settings(self, site_name: str, notify_on_down: bool, notify_on_recovery: bool) -> bool:
         """
         Обновляет настройки уведомлений для сайта по его имени.
         Возвращает True, если обновление прошло успешно, иначе False.
         """
-        async with self.pool.acquire() as conn:
+        async with self._acquire() as conn:
             async with conn.cursor() as cur:
                 await cur.execute(
                     """
@@ -80,30 +222,62 @@ class Database:
                 return cur.rowcount > 0 
 
     async def get_sites(self):
-        async with self.pool.acquire() as conn:
+        async with self._acquire() as conn:
             async with conn.cursor() as cur:
                 await cur.execute("SELECT * FROM sites")
                 result = await cur.fetchall()
         return result
     
+    async def get_sites_changed_since(self, watermark: datetime | None):
+        """Строки sites, изменённые не раньше watermark (по индексу idx_sites_updated)."""
+        if watermark is None:
+            return await self.get_sites()
+        async with self._acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT * FROM sites WHERE updated_at >= %s", (watermark,))
+                return await cur.fetchall()
+
+    async def get_site_ids(self) -> set:
+        async with self._acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT id FROM sites")
+                return {row["id"] for row in await cur.fetchall()}
+
+    async def set_enabled(self, site_id: int, enabled: bool) -> int:
+        async with self._acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "UPDATE sites SET enabled = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
+                    (int(enabled), site_id)
+                )
+                await conn.commit()
+                return cur.rowcount
+
     async def add_site(self,site):
-        sql = """INSERT INTO sites (name, url, enabled, check_interval, timeout, expected_status) 
-                VALUES (%s, %s, %s, %s, %s, %s);"""
-        async with self.pool.acquire() as conn:
+        sql = """INSERT INTO sites (name, url, enabled, check_interval, timeout, expected_status, cold_connection, fresh_dns,
+                                   probe_mode, max_body_bytes, content_rules, adaptive, min_interval, max_interval, updated_at) 
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP);"""
+        async with self._acquire() as conn:
             async with conn.cursor() as cur:
-                await cur.execute(sql,(site.name, site.url, site.enabled, site.check_interval, site.timeout, site.expected_status,))
+                await cur.execute(sql,(site.name, site.url, site.enabled, site.check_interval, site.timeout, site.expected_status, int(site.cold_connection), int(site.fresh_dns),
+                                      site.probe_mode, site.max_body_bytes,
+                                      site.content_rules.to_json() if site.content_rules else None,
+                                      int(site.adaptive), site.min_interval, site.max_interval,))
                 await conn.commit()
                 return cur.lastrowid
     async def delete_site_by_name(self,name):
         query = "DELETE FROM sites WHERE name = %s"
-        async with self.pool.acquire() as conn:
+        async with self._acquire() as conn:
             async with conn.cursor() as cur:
                 await cur.execute(query, (name,))
                 await conn.commit()
                 return cur.rowcount
     async def update_site(
         self, old_name: str, name: str, url: str, check_interval: int, timeout: int,expected_status: int,
-        enabled: int = 1, notify_on_down: int = 1, notify_on_recovery: int = 1
+        enabled: int = 1, notify_on_down: int = 1, notify_on_recovery: int = 1, cold_connection: int = 0,
+        fresh_dns: int = 0, probe_mode: str = "get", max_body_bytes: int = 65536,
+        content_rules: str | None = None, adaptive: int = 0, min_interval: int | None = None,
+        max_interval: int | None = None
     ) -> int:
         query = """
         UPDATE sites
@@ -115,63 +289,643 @@ class Database:
             enabled = %s,
             notify_on_down = %s,
             notify_on_recovery = %s,
+            cold_connection = %s,
+            fresh_dns = %s,
+            probe_mode = %s,
+            max_body_bytes = %s,
+            content_rules = %s,
+            adaptive = %s,
+            min_interval = %s,
+            max_interval = %s,
             updated_at = CURRENT_TIMESTAMP
         WHERE name = %s
         """
-        async with self.pool.acquire() as conn:
+        async with self._acquire() as conn:
             async with conn.cursor() as cur:
                 await cur.execute(
                     query,
-                    (name, url, check_interval, timeout, expected_status, enabled, notify_on_down, notify_on_recovery, old_name)
+                    (name, url, check_interval, timeout, expected_status, enabled, notify_on_down, notify_on_recovery, cold_connection, fresh_dns,
+                     probe_mode, max_body_bytes, content_rules, adaptive, min_interval, max_interval, old_name)
                 )
                 await conn.commit()
                 return cur.rowcount
-    async def get_site_id(self,name):
+    async def add_check(self, site_id: int, status_code: int | None,
+                    is_ok: bool, response_time_ms: float | None, error: str | None = None,
+                    dns_ms: float | None = None, connect_ms: float | None = None, ttfb_ms: float | None = None):
+        """
+        Ставит результат проверки в очередь на запись.
+        Пишет фоновый flusher пачками; если БД не успевает и очередь заполнена,
+        вызов ждёт освобождения места.
+        """
+        self._ensure_writer()
+        await self._checks_queue.put((site_id, datetime.now(), status_code, int(is_ok), response_time_ms, error,
+                                      dns_ms, connect_ms, ttfb_ms))
+
+    def _ensure_writer(self):
+        if self._writer_task is not None and self._writer_task.done():
+            # упавший flusher перезапускаем, накопленная очередь сохраняется
+            if not self._writer_task.cancelled() and self._writer_task.exception() is not None:
+                logger.error(f"Фоновая запись проверок остановилась с ошибкой: {self._writer_task.exception()}")
+            self._writer_task = None
+        if self._writer_task is None:
+            if self._checks_queue is None:
+                self._checks_queue = asyncio.Queue(maxsize=config.checks_queue_size)
+            self._writer_task = asyncio.create_task(self._flush_checks_loop())
+
+    async def _flush_checks_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._checks_queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stop = False
+            deadline = loop.time() + config.checks_flush_interval
+            # копим пачку до порога по размеру или по времени
+            while len(batch) < config.checks_batch_size:
+                if self._checks_queue.empty():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._checks_queue.get(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = self._checks_queue.get_nowait()
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            started = perf_counter()
+            await self._write_checks_with_retry(batch)
+            metrics.DB_FLUSH.observe(perf_counter() - started)
+            if loop.time() - self._sketches_flushed_at >= config.sketch_flush_interval:
+                await self.flush_sketches()
+            if stop:
+                return
+
+    async def _write_checks_with_retry(self, batch):
+        """
+        Пишет пачку, при ошибке повторяет с растущей паузой. После checks_write_retries
+        неудачных попыток пачка отбрасывается, чтобы очередь не стояла вечно.
+        """
+        delay = config.checks_retry_delay
+        for attempt in range(config.checks_write_retries + 1):
+            if await self._write_checks(batch):
+                return True
+            if attempt < config.checks_write_retries:
+                metrics.DB_FLUSH_ERRORS.inc("retry")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, config.checks_retry_max_delay)
+        metrics.DB_FLUSH_ERRORS.inc("dropped")
+        logger.error(f"Пачка проверок ({len(batch)} шт.) отброшена после {config.checks_write_retries + 1} попыток")
+        return False
+
+    async def _write_checks(self, batch) -> bool:
         query = """
-        SELECT id FROM sites WHERE name = %s;
+        INSERT INTO checks (site_id, checked_at, status_code, is_ok, response_time_ms, error,
+                            dns_ms, connect_ms, ttfb_ms)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
         """
-        async with self.pool.acquire() as conn:
+        conn = None
+        try:
+            async with self._acquire() as conn:
                 async with conn.cursor() as cur:
-                    try:
-                        await cur.execute(query,(name,))
-                        result = await cur.fetchone()
-                        return result
-                    except Exception as e:
-                        logger.error(f"Ошибка при получении id сайта: {e}")  
-                        return None
-    async def add_check(self, name: str, status_code: int | None,
-                    is_ok: bool, response_time_ms: float | None, error: str | None = None):
-        site_id = await self.get_site_id(name)
-        site_id = site_id['id']
+                    batch = await self._drop_orphans(cur, batch)
+                    if batch:
+                        # executemany сворачивает INSERT ... VALUES в один многострочный запрос
+                        await cur.executemany(query, batch)
+                        # агрегаты обновляются в той же транзакции, что и сырые проверки
+                        for granularity, buckets in rollups.aggregate_checks(batch).items():
+                            await self._upsert_rollups(cur, granularity, buckets)
+                    await conn.commit()
+        except Exception as e:
+            await self._rollback(conn)
+            logger.error(f"Ошибка при добавлении записей в checks ({len(batch)} шт.): {e}")
+            return False
+        self.sketches.add_checks(batch)
+        metrics.DB_FLUSH_ROWS.inc(amount=len(batch))
+        logger.debug(f"Записано проверок: {len(batch)}")
+        return True
+
+    @staticmethod
+    async def _drop_orphans(cur, batch):
+        """
+        Убирает из пачки проверки удалённых сайтов (остались в очереди или в идущей проверке):
+        одна такая строка нарушила бы внешний ключ и сорвала запись всей пачки.
+        FOR SHARE не даёт удалить сайт до конца транзакции записи.
+        """
+        site_ids = {row[0] for row in batch}
+        placeholders = ", ".join(["%s"] * len(site_ids))
+        await cur.execute(f"SELECT id FROM sites WHERE id IN ({placeholders}) FOR SHARE", tuple(site_ids))
+        existing = {row["id"] for row in await cur.fetchall()}
+        if len(existing) == len(site_ids):
+            return batch
+        kept = [row for row in batch if row[0] in existing]
+        logger.warning(f"Отброшено проверок удалённых сайтов: {len(batch) - len(kept)} "
+                       f"(site_id {sorted(site_ids - existing)})")
+        return kept
+
+    @staticmethod
+    async def _rollback(conn):
+        if conn is None:
+            return
+        try:
+            await conn.rollback()
+        except Exception as e:
+            # соединение уже порвано — транзакцию откатит сервер
+            logger.warning(f"Не удалось откатить транзакцию: {e}")
+
+    async def _upsert_rollups(self, cur, granularity: str, buckets):
+        if not buckets:
+            return
+        columns = ("site_id", "bucket_start", "cnt", "ok_cnt", "sum_ms", "min_ms", "max_ms") + rollups.HIST_COLUMNS + rollups.PHASE_COLUMNS
+        additive = ("cnt", "ok_cnt", "sum_ms") + rollups.HIST_COLUMNS + rollups.PHASE_COLUMNS
+        updates = [f"{c} = {c} + VALUES({c})" for c in additive]
+        updates.append("min_ms = IF(min_ms IS NULL OR VALUES(min_ms) < min_ms, COALESCE(VALUES(min_ms), min_ms), min_ms)")
+        updates.append("max_ms = IF(max_ms IS NULL OR VALUES(max_ms) > max_ms, COALESCE(VALUES(max_ms), max_ms), max_ms)")
+        query = f"""
+        INSERT INTO {rollups.table_name(granularity)} ({", ".join(columns)})
+        VALUES ({", ".join(["%s"] * len(columns))})
+        ON DUPLICATE KEY UPDATE {", ".join(updates)}
+        """
+        rows = [
+            (site_id, start, r.cnt, r.ok_cnt, r.sum_ms, r.min_ms, r.max_ms, *r.hist, *r.phases)
+            for (site_id, start), r in buckets.items()
+        ]
+        await cur.executemany(query, rows)
+
+    async def flush_sketches(self):
+        """
+        Пишет изменённые скетчи текущих бакетов. У каждого процесса свои строки (writer),
+        поэтому запись — простая замена, а скетчи разных экземпляров и запусков сливаются при чтении.
+        """
+        self._sketches_flushed_at = asyncio.get_running_loop().time()
+        dirty = self.sketches.take_dirty()
+        if not any(dirty.values()):
+            return
+        conn = None
+        try:
+            async with self._acquire() as conn:
+                async with conn.cursor() as cur:
+                    for granularity, items in dirty.items():
+                        if not items:
+                            continue
+                        query = f"""
+                        INSERT INTO {sketch.table_name(granularity)} (site_id, bucket_start, writer, cnt, sketch)
+                        VALUES (%s, %s, %s, %s, %s)
+                        ON DUPLICATE KEY UPDATE cnt = VALUES(cnt), sketch = VALUES(sketch)
+                        """
+                        rows = [(site_id, start, self._sketch_writer, s.count, s.to_bytes()) for site_id, start, s in items]
+                        await cur.executemany(query, rows)
+                    await conn.commit()
+        except Exception as e:
+            await self._rollback(conn)
+            # скетчи вернутся в память и запишутся при следующем сбросе
+            self.sketches.restore(dirty)
+            logger.error(f"Ошибка при записи скетчей отклика: {e}")
+
+    async def close(self):
+        """Дописывает очередь проверок и скетчи, закрывает пул"""
+        if self._writer_task is not None:
+            # если flusher упал, поднимаем его снова: иначе put(_STOP) в полную очередь не вернётся
+            self._ensure_writer()
+            await self._checks_queue.put(_STOP)
+            await self._writer_task
+            self._writer_task = None
+        await self.flush_sketches()
+        self.pool.close()
+        await self.pool.wait_closed()
+
+    async def iter_site_checks(self, site_ids: list[int], since: datetime, until: datetime | None = None,
+                               chunk_size: int = None):
+        """
+        Потоково отдаёт проверки сайтов пачками по chunk_size строк.
+        Используется небуферизованный серверный курсор, поэтому результат не
+        загружается в память целиком. Соединение занято до конца итерации.
+        """
+        chunk_size = chunk_size or config.export_chunk_size
+        placeholders = ", ".join(["%s"] * len(site_ids))
+        query = f"""
+        SELECT site_id, checked_at, status_code, is_ok, response_time_ms, error, dns_ms, connect_ms, ttfb_ms
+        FROM checks
+        WHERE site_id IN ({placeholders}) AND checked_at >= %s
+        """
+        params = [*site_ids, since]
+        if until is not None:
+            query += " AND checked_at < %s"
+            params.append(until)
+        query += " ORDER BY site_id, checked_at"
+        async with self._acquire() as conn:
+            async with conn.cursor(aiomysql.SSDictCursor) as cur:
+                await cur.execute(query, params)
+                while True:
+                    rows = await cur.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
+
+    async def get_latest_check_id(self, site_id: int):
+        """id последней проверки сайта (обратный проход по индексу site_id, checked_at)"""
+        async with self._acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT id FROM checks WHERE site_id = %s ORDER BY checked_at DESC, id DESC LIMIT 1",
+                    (site_id,)
+                )
+                row = await cur.fetchone()
+                return row["id"] if row else None
+
+    async def get_last_states(self, streak_limit: int = 20):
+        """
+        Последнее известное состояние всех сайтов одним запросом: последняя проверка
+        и число сбоев подряд (не больше streak_limit). Для каждого сайта LATERAL читает
+        streak_limit последних проверок обратным проходом по idx_checks_site_time,
+        поэтому стоимость не зависит от размера истории. Проверки с одинаковым checked_at
+        упорядочиваются по id, чтобы последняя проверка и серия сбоев были однозначны.
+        """
         query = """
-        INSERT INTO checks (site_id, status_code, is_ok, response_time_ms, error)
-        VALUES (%s, %s, %s, %s, %s)
+        SELECT site_id,
+               MAX(CASE WHEN rn = 1 THEN checked_at END) AS checked_at,
+               MAX(CASE WHEN rn = 1 THEN status_code END) AS status_code,
+               MAX(CASE WHEN rn = 1 THEN is_ok END) AS is_ok,
+               MAX(CASE WHEN rn = 1 THEN response_time_ms END) AS response_time_ms,
+               SUM(oks = 0) AS failures
+        FROM (
+            SELECT s.id AS site_id, r.checked_at, r.status_code, r.is_ok, r.response_time_ms,
+                   ROW_NUMBER() OVER w AS rn,
+                   SUM(r.is_ok) OVER w AS oks
+            FROM sites s
+            JOIN LATERAL (
+                SELECT c.id, c.checked_at, c.status_code, c.is_ok, c.response_time_ms
+                FROM checks c
+                WHERE c.site_id = s.id
+                ORDER BY c.checked_at DESC, c.id DESC
+                LIMIT %s
+            ) r ON TRUE
+            WINDOW w AS (PARTITION BY s.id ORDER BY r.checked_at DESC, r.id DESC ROWS UNBOUNDED PRECEDING)
+        ) recent
+        GROUP BY site_id
         """
-        async with self.pool.acquire() as conn:
+        async with self._acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, (streak_limit,))
+                return await cur.fetchall()
+
+    async def get_rollup_stats(self, site_id: int, granularity: str, since: datetime, until: datetime | None = None):
+        """
+        Суммарные счётчики и гистограмма по агрегатам сайта за период
+        """
+        where = "site_id = %s AND bucket_start >= %s"
+        params = [site_id, rollups.bucket_start(since, granularity)]
+        if until is not None:
+            where += " AND bucket_start < %s"
+            params.append(until)
+        hist_sums = ", ".join(f"COALESCE(SUM({c}), 0) AS {c}" for c in rollups.HIST_COLUMNS + rollups.PHASE_COLUMNS)
+        query = f"""
+        SELECT COALESCE(SUM(cnt), 0) AS total, COALESCE(SUM(ok_cnt), 0) AS ok,
+               COALESCE(SUM(sum_ms), 0) AS sum_ms, MIN(min_ms) AS min_ms, MAX(max_ms) AS max_ms,
+               {hist_sums}
+        FROM {rollups.table_name(granularity)}
+        WHERE {where}
+        """
+        async with self._acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, params)
+                return await cur.fetchone()
+
+    async def get_rollup_stats_all(self, granularity: str, since: datetime):
+        """
+        То же, что get_rollup_stats, но сразу для всех сайтов одним запросом: {site_id: row}.
+        Условие только по bucket_start: диапазон читается по индексу idx_<таблица>_bucket.
+        """
+        hist_sums = ", ".join(f"COALESCE(SUM({c}), 0) AS {c}" for c in rollups.HIST_COLUMNS + rollups.PHASE_COLUMNS)
+        query = f"""
+        SELECT site_id, COALESCE(SUM(cnt), 0) AS total, COALESCE(SUM(ok_cnt), 0) AS ok,
+               COALESCE(SUM(sum_ms), 0) AS sum_ms, MIN(min_ms) AS min_ms, MAX(max_ms) AS max_ms,
+               {hist_sums}
+        FROM {rollups.table_name(granularity)}
+        WHERE bucket_start >= %s
+        GROUP BY site_id
+        """
+        async with self._acquire() as conn:
             async with conn.cursor() as cur:
-                try:
-                    await cur.execute(query, (site_id, status_code, int(is_ok), response_time_ms, error))
+                await cur.execute(query, (rollups.bucket_start(since, granularity),))
+                return {row["site_id"]: row for row in await cur.fetchall()}
+
+    async def get_latency_sketch(self, site_id: int, granularity: str, since: datetime, until: datetime | None = None):
+        """
+        Скетч времени отклика сайта за период: слияние строк всех бакетов и всех писателей.
+        Скетчи текущих бакетов этого процесса, ещё не сброшенные в БД, берутся из памяти.
+        """
+        where = "site_id = %s AND bucket_start >= %s"
+        params = [site_id, rollups.bucket_start(since, granularity)]
+        if until is not None:
+            where += " AND bucket_start < %s"
+            params.append(until)
+        query = f"SELECT writer, bucket_start, sketch FROM {sketch.table_name(granularity)} WHERE {where}"
+        async with self._acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, params)
+                rows = await cur.fetchall()
+        merged = self._merge_sketch_rows([(site_id, r) for r in rows], granularity, since, until, site_id)
+        return merged.get(site_id)
+
+    async def get_latency_sketches_all(self, granularity: str, since: datetime):
+        """
+        То же, что get_latency_sketch, но для всех сайтов одним запросом: {site_id: скетч}.
+        Диапазон по bucket_start читается по индексу idx_<таблица>_bucket.
+        """
+        query = f"""
+        SELECT site_id, writer, bucket_start, sketch FROM {sketch.table_name(granularity)}
+        WHERE bucket_start >= %s
+        """
+        async with self._acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, (rollups.bucket_start(since, granularity),))
+                rows = await cur.fetchall()
+        return self._merge_sketch_rows([(r["site_id"], r) for r in rows], granularity, since, None)
+
+    def _merge_sketch_rows(self, rows, granularity: str, since: datetime, until: datetime | None,
+                           only_site: int | None = None):
+        result = {}
+        for site_id, row in rows:
+            # своя строка отстаёт от памяти: если бакет ещё в памяти, берём скетч оттуда
+            if row["writer"] == self._sketch_writer and self.sketches.get(granularity, site_id, row["bucket_start"]):
+                continue
+            try:
+                part = sketch.LatencySketch.from_bytes(row["sketch"])
+            except Exception as e:
+                logger.error(f"Повреждённый скетч сайта {site_id} за {row['bucket_start']}: {e}")
+                continue
+            self._merge_into(result, site_id, part)
+        start = rollups.bucket_start(since, granularity)
+        for site_id, bucket, part in self.sketches.items(granularity):
+            if only_site is not None and site_id != only_site:
+                continue
+            if bucket >= start and (until is None or bucket < until):
+                self._merge_into(result, site_id, part)
+        return result
+
+    @staticmethod
+    def _merge_into(result: dict, site_id: int, part):
+        merged = result.get(site_id)
+        if merged is None:
+            merged = result[site_id] = sketch.LatencySketch(part.accuracy)
+        merged.merge(part)
+
+    async def get_rollup_series_all(self, granularity: str, since: datetime):
+        """
+        Ряды агрегатов всех сайтов за период одним запросом: {site_id: [rows]}.
+        Диапазон по bucket_start читается по индексу idx_<таблица>_bucket, сортируются только найденные строки.
+        """
+        query = f"""
+        SELECT site_id, bucket_start, cnt, ok_cnt,
+               CASE WHEN ok_cnt > 0 THEN sum_ms / ok_cnt END AS avg_ms, max_ms
+        FROM {rollups.table_name(granularity)}
+        WHERE bucket_start >= %s
+        ORDER BY site_id, bucket_start
+        """
+        series = {}
+        async with self._acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, (rollups.bucket_start(since, granularity),))
+                for row in await cur.fetchall():
+                    series.setdefault(row["site_id"], []).append(row)
+        return series
+
+    async def get_rollup_series(self, site_id: int, granularity: str, since: datetime, until: datetime | None = None):
+        """
+        Ряд агрегатов сайта за период: bucket_start, cnt, ok_cnt, avg_ms, max_ms
+        """
+        query = f"""
+        SELECT bucket_start, cnt, ok_cnt,
+               CASE WHEN ok_cnt > 0 THEN sum_ms / ok_cnt END AS avg_ms, max_ms
+        FROM {rollups.table_name(granularity)}
+        WHERE site_id = %s AND bucket_start >= %s
+        """
+        params = [site_id, rollups.bucket_start(since, granularity)]
+        if until is not None:
+            query += " AND bucket_start < %s"
+            params.append(until)
+        query += " ORDER BY bucket_start ASC"
+        async with self._acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, params)
+                return await cur.fetchall()
+
+    async def backfill_rollups(self, since: datetime | None = None) -> int:
+        """
+        Пересчитывает агрегаты из сырых проверок. Идёт по суткам, чтобы не держать
+        длинные блокировки на checks. Возвращает число обработанных суток.
+        """
+        async with self._acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT MIN(checked_at) AS first, MAX(checked_at) AS last FROM checks")
+                bounds = await cur.fetchone()
+        if not bounds or bounds["first"] is None:
+            return 0
+        start = rollups.bucket_start(max(since or bounds["first"], bounds["first"]), "day")
+        formats = {"minute": "%%Y-%%m-%%d %%H:%%i:00", "hour": "%%Y-%%m-%%d %%H:00:00", "day": "%%Y-%%m-%%d 00:00:00"}
+        hist_exprs = []
+        lower = None
+        for column, upper in zip(rollups.HIST_COLUMNS, rollups.LATENCY_BUCKETS_MS + (None,)):
+            cond = ["is_ok = 1", "response_time_ms IS NOT NULL"]
+            if lower is not None:
+                cond.append(f"response_time_ms > {lower}")
+            if upper is not None:
+                cond.append(f"response_time_ms <= {upper}")
+            hist_exprs.append(f"SUM({' AND '.join(cond)}) AS {column}")
+            lower = upper
+        phase_exprs = []
+        for phase in rollups.PHASES:
+            phase_exprs.append(f"COALESCE(SUM({phase}_ms), 0)")
+            phase_exprs.append(f"COUNT({phase}_ms)")
+        columns = ("cnt", "ok_cnt", "sum_ms", "min_ms", "max_ms") + rollups.HIST_COLUMNS + rollups.PHASE_COLUMNS
+        windows = 0
+        while start <= bounds["last"]:
+            end = start + timedelta(days=1)
+            async with self._acquire() as conn:
+                async with conn.cursor() as cur:
+                    for granularity in rollups.GRANULARITIES:
+                        await cur.execute(
+                            f"""
+                            INSERT INTO {rollups.table_name(granularity)}
+                                (site_id, bucket_start, {", ".join(columns)})
+                            SELECT site_id, DATE_FORMAT(checked_at, '{formats[granularity]}') AS b,
+                                   COUNT(*), SUM(is_ok),
+                                   COALESCE(SUM(CASE WHEN is_ok = 1 THEN response_time_ms END), 0),
+                                   MIN(CASE WHEN is_ok = 1 THEN response_time_ms END),
+                                   MAX(CASE WHEN is_ok = 1 THEN response_time_ms END),
+                                   {", ".join(hist_exprs)},
+                                   {", ".join(phase_exprs)}
+                            FROM checks
+                            WHERE checked_at >= %s AND checked_at < %s
+                            GROUP BY site_id, b
+                            ON DUPLICATE KEY UPDATE {", ".join(f"{c} = VALUES({c})" for c in columns)}
+                            """,
+                            (start, end)
+                        )
                     await conn.commit()
-                    logger.info(f"Добавлена запись о проверке сайта {site_id}")
-                except Exception as e:
-                    logger.error(f"Ошибка при добавлении записи в checks: {e}")
-    
-    async def get_checks_since(self, since: datetime):
+            windows += 1
+            logger.info(f"Агрегаты пересчитаны за {start:%Y-%m-%d %H:%M} — {end:%Y-%m-%d %H:%M}")
+            start = end
+        return windows
+
+    async def first_unrolled_day(self, cutoff: datetime):
         """
-        Получить все проверки сайтов, начиная с указанной даты
+        Первые сутки до cutoff, сырые проверки которых ещё не свёрнуты в дневные агрегаты
+        (агрегата нет или в нём меньше проверок). None — всё до cutoff уже в агрегатах.
         """
-        async with self.pool.acquire() as conn:
-            async with conn.cursor(aiomysql.DictCursor) as cur:
+        async with self._acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    f"""
+                    SELECT MIN(c.day) AS day
+                    FROM (
+                        SELECT site_id, DATE(checked_at) AS day, COUNT(*) AS cnt
+                        FROM checks
+                        WHERE checked_at < %s
+                        GROUP BY site_id, day
+                    ) c
+                    LEFT JOIN {rollups.table_name("day")} r ON r.site_id = c.site_id AND r.bucket_start = c.day
+                    WHERE r.cnt IS NULL OR r.cnt < c.cnt
+                    """,
+                    (cutoff,)
+                )
+                row = await cur.fetchone()
+                return row["day"] if row else None
+
+    async def purge_batch(self, table: str, column: str, cutoff: datetime, limit: int, order_by: str | None = None) -> int:
+        """
+        Удаляет не больше limit строк старше cutoff одной короткой транзакцией.
+        Возвращает число удалённых строк.
+        """
+        query = f"DELETE FROM {table} WHERE {column} < %s"
+        if order_by:
+            query += f" ORDER BY {order_by}"
+        query += " LIMIT %s"
+        async with self._acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, (cutoff, limit))
+                await conn.commit()
+                return cur.rowcount
+
+    async def get_expired_partitions(self, table: str, cutoff: datetime) -> list[str]:
+        """
+        Партиции RANGE (UNIX_TIMESTAMP(...)), все строки которых старше cutoff.
+        Для непартиционированной таблицы возвращает пустой список.
+        """
+        async with self._acquire() as conn:
+            async with conn.cursor() as cur:
                 await cur.execute(
                     """
-                    SELECT c.id, c.site_id, s.name AS site_name, c.checked_at,
-                           c.status_code, c.is_ok, c.response_time_ms, c.error
-                    FROM checks c
-                    JOIN sites s ON c.site_id = s.id
-                    WHERE c.checked_at >= %s
-                    ORDER BY c.checked_at ASC
+                    SELECT partition_name, partition_description
+                    FROM information_schema.partitions
+                    WHERE table_schema = DATABASE() AND table_name = %s
+                      AND partition_method = 'RANGE' AND partition_name IS NOT NULL
+                    ORDER BY partition_ordinal_position
                     """,
-                    (since,)
+                    (table,)
                 )
                 rows = await cur.fetchall()
-                return rows
+        expired = []
+        for row in rows:
+            bound = row["partition_description"]
+            if not bound or not bound.isdigit():
+                # MAXVALUE или выражение, которое мы не умеем сравнивать
+                break
+            if int(bound) > cutoff.timestamp():
+                break
+            expired.append(row["partition_name"])
+        return expired
+
+    async def drop_partitions(self, table: str, partitions: list[str]):
+        async with self._acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(f"ALTER TABLE {table} DROP PARTITION {', '.join(partitions)}")
+
+    # Аренды шардов. Время истечения считается по часам MySQL (NOW(3)),
+    # чтобы расхождение часов между хостами не влияло на владение.
+
+    async def heartbeat(self, instance_id: str):
+        async with self._acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    INSERT INTO monitor_instances (instance_id, heartbeat_at) VALUES (%s, NOW(3))
+                    ON DUPLICATE KEY UPDATE heartbeat_at = NOW(3)
+                    """,
+                    (instance_id,)
+                )
+                await conn.commit()
+
+    async def get_live_instances(self, ttl: float) -> list[str]:
+        async with self._acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    SELECT instance_id FROM monitor_instances
+                    WHERE heartbeat_at > NOW(3) - INTERVAL %s SECOND
+                    ORDER BY instance_id
+                    """,
+                    (ttl,)
+                )
+                return [row["instance_id"] for row in await cur.fetchall()]
+
+    async def ensure_leases(self, names: list[str]):
+        async with self._acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.executemany("INSERT IGNORE INTO leases (name) VALUES (%s)", [(n,) for n in names])
+                await conn.commit()
+
+    async def claim_leases(self, owner: str, names: list[str], ttl: float) -> int:
+        """Берёт или продлевает свободные, просроченные и свои аренды из names"""
+        if not names:
+            return 0
+        placeholders = ", ".join(["%s"] * len(names))
+        async with self._acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    f"""
+                    UPDATE leases
+                    SET owner = %s, expires_at = NOW(3) + INTERVAL %s SECOND
+                    WHERE name IN ({placeholders})
+                      AND (owner IS NULL OR owner = %s OR expires_at < NOW(3))
+                    """,
+                    (owner, ttl, *names, owner)
+                )
+                await conn.commit()
+                return cur.rowcount
+
+    async def release_leases(self, owner: str, names: list[str] | None = None):
+        """Отпускает аренды владельца (все или только names)"""
+        query = "UPDATE leases SET owner = NULL, expires_at = NULL WHERE owner = %s"
+        params = [owner]
+        if names is not None:
+            if not names:
+                return
+            query += f" AND name IN ({', '.join(['%s'] * len(names))})"
+            params.extend(names)
+        async with self._acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, params)
+                if names is None:
+                    await cur.execute("DELETE FROM monitor_instances WHERE instance_id = %s", (owner,))
+                await conn.commit()
+
+    async def get_held_leases(self, owner: str) -> list[str]:
+        async with self._acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT name FROM leases WHERE owner = %s AND expires_at > NOW(3)",
+                    (owner,)
+                )
+                return [row["name"] for row in await cur.fetchall()]
+
+    async def get_leases(self):
+        async with self._acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT name, owner, expires_at FROM leases ORDER BY name")
+                return await cur.fetchall()
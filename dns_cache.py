@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import socket
+from time import monotonic, perf_counter
+from typing import Dict, List, Tuple
+
+from aiohttp.abc import AbstractResolver, ResolveResult
+from aiohttp.resolver import DefaultResolver
+
+import config
+import metrics
+
+try:
+    import aiodns
+except ImportError:  # aiodns не обязателен (pip install .[dns]): без него TTL записи берётся из настроек
+    aiodns = None
+
+logger = logging.getLogger(__name__)
+
+DNS_RESOLVE = metrics.histogram("monitor_dns_resolve_seconds", "Время резолва имени (промахи кэша)")
+DNS_CACHE = metrics.counter("monitor_dns_cache_total", "Обращения к DNS-кэшу", ("result",))
+
+
+class CachingResolver(AbstractResolver):
+    """
+    Общий для всех проверок DNS-кэш.
+    С aiodns имя резолвится одним запросом getaddrinfo, который сразу отдаёт и адреса,
+    и их TTL; записи живут в пределах dns_cache_min_ttl..dns_cache_max_ttl.
+    Без aiodns (или с переданным resolver) адреса даёт resolver, а TTL — dns_cache_ttl.
+    Одновременные запросы одного имени схлопываются в один резолв.
+    """
+
+    def __init__(self, resolver: AbstractResolver = None) -> None:
+        # свой резолвер aiodns создаётся лениво: ему нужен запущенный event loop
+        self._use_dns = resolver is None and aiodns is not None
+        self._dns = None
+        self._resolver = resolver or (None if self._use_dns else DefaultResolver())
+        self._cache: Dict[Tuple[str, int], Tuple[float, List[ResolveResult]]] = {}
+        self._pending: Dict[Tuple[str, int], asyncio.Future] = {}
+
+    async def resolve(self, host: str, port: int = 0, family: socket.AddressFamily = socket.AF_INET) -> List[ResolveResult]:
+        key = (host, family)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > monotonic():
+            DNS_CACHE.inc("hit")
+            return self._with_port(cached[1], port)
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            DNS_CACHE.inc("shared")
+            return self._with_port(await asyncio.shield(pending), port)
+
+        DNS_CACHE.inc("miss")
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            started = perf_counter()
+            if self._use_dns:
+                addrs, ttl = await self._resolve_with_ttl(host, family)
+            else:
+                addrs, ttl = await self._resolver.resolve(host, 0, family), config.dns_cache_ttl
+            DNS_RESOLVE.observe(perf_counter() - started)
+            self._store(key, addrs, min(max(ttl, config.dns_cache_min_ttl), config.dns_cache_max_ttl))
+            future.set_result(addrs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # исключение уже пробрасывается вызывающему, ожидающих может и не быть
+            future.exception()
+            raise
+        finally:
+            del self._pending[key]
+        return self._with_port(addrs, port)
+
+    async def close(self) -> None:
+        if self._resolver is not None:
+            await self._resolver.close()
+        if self._dns is not None:
+            self._dns.cancel()
+            self._dns = None
+
+    def _store(self, key, addrs: List[ResolveResult], ttl: float) -> None:
+        now = monotonic()
+        if len(self._cache) >= config.dns_cache_max_entries:
+            for k in [k for k, (expires, _) in self._cache.items() if expires <= now]:
+                del self._cache[k]
+            if len(self._cache) >= config.dns_cache_max_entries:
+                # просроченных нет — вытесняем запись, которая истекла бы первой
+                del self._cache[min(self._cache, key=lambda k: self._cache[k][0])]
+        self._cache[key] = (now + ttl, addrs)
+
+    async def _resolve_with_ttl(self, host: str, family: int) -> Tuple[List[ResolveResult], float]:
+        """Адреса и наименьший TTL из них одним запросом через aiodns."""
+        if self._dns is None:
+            self._dns = aiodns.DNSResolver()
+        try:
+            response = await self._dns.getaddrinfo(host, family=family, port=0, type=socket.SOCK_STREAM)
+        except aiodns.error.DNSError as e:
+            # как у резолверов aiohttp: коннектор превращает OSError в ClientConnectorDNSError
+            raise OSError(None, e.args[1] if len(e.args) > 1 else "DNS lookup failed") from e
+        addrs = [
+            ResolveResult(hostname=host, host=node.addr[0].decode("ascii"), port=0, family=node.family,
+                          proto=0, flags=socket.AI_NUMERICHOST | socket.AI_NUMERICSERV)
+            for node in response.nodes
+        ]
+        if not addrs:
+            raise OSError(None, "DNS lookup failed")
+        return addrs, min(node.ttl for node in response.nodes)
+
+    @staticmethod
+    def _with_port(addrs: List[ResolveResult], port: int) -> List[ResolveResult]:
+        return [{**addr, "port": port} for addr in addrs]
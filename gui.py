@@ -1,6 +1,7 @@
 from aiogram.utils.keyboard import InlineKeyboardBuilder, InlineKeyboardMarkup, InlineKeyboardButton
-from callbackdata import SitesList, SiteAction
+from callbackdata import SitesList, SitesPage, SiteAction
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+from http_client import PROBE_MODES
 
 
 def menu():
@@ -18,27 +19,43 @@ def menu():
     kb.adjust(2)
     return kb.as_markup()
 
-def sites_list(sites):
+STATE_ICONS = {"up": "🟢", "down": "🔴", "off": "⏸"}
+
+def sites_page(sites, page, pages, flt, query, states, filters):
     kb = InlineKeyboardBuilder()
-    for site in sites:
-        enabled = "🟢" if site.enabled else "🔴"
+    for site, state in zip(sites, states):
         kb.button(
-        text= f"{enabled} {site.name}",
-        callback_data=SitesList(name=site.name))
+        text= f"{STATE_ICONS[state]} {site.name}",
+        callback_data=SitesList(id=site.id, page=page, flt=flt, q=query))
     kb.adjust(2)
+    if pages > 1:
+        nav = []
+        if page > 0:
+            nav.append(InlineKeyboardButton(text="◀️", callback_data=SitesPage(page=page - 1, flt=flt, q=query).pack()))
+        nav.append(InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data=SitesPage(page=page, flt=flt, q=query).pack()))
+        if page < pages - 1:
+            nav.append(InlineKeyboardButton(text="▶️", callback_data=SitesPage(page=page + 1, flt=flt, q=query).pack()))
+        kb.row(*nav)
+    # смена фильтра начинает с первой страницы и сохраняет поиск
+    kb.row(*(
+        InlineKeyboardButton(text=f"✅ {text}" if code == flt else text, callback_data=SitesPage(flt=code, q=query).pack())
+        for code, text in filters.items()
+    ))
+    kb.row(InlineKeyboardButton(text="🏠 Главная", callback_data="menu"))
     return kb.as_markup()
 
-def site_action(site):
+def site_action(site, back: SitesPage = None):
     if site.enabled:
-        enable_button = InlineKeyboardButton(text="🔴 Отключить мониторинг", callback_data=SiteAction(name=site.name, action="onoff").pack())
+        enable_button = InlineKeyboardButton(text="🔴 Отключить мониторинг", callback_data=SiteAction(id=site.id, action="onoff").pack())
     else:
-        enable_button = InlineKeyboardButton(text="🟢 Включить мониторинг", callback_data=SiteAction(name=site.name, action="onoff").pack())
+        enable_button = InlineKeyboardButton(text="🟢 Включить мониторинг", callback_data=SiteAction(id=site.id, action="onoff").pack())
     return InlineKeyboardMarkup(inline_keyboard=[
-        [enable_button,InlineKeyboardButton(text="🔔 Настройка уведомлений", callback_data=SiteAction(name=site.name, action="settingsnotif").pack())],
-        [InlineKeyboardButton(text="📊 Получить отчет", callback_data=SiteAction(name=site.name, action="report").pack()),InlineKeyboardButton(text="📊 Экспорт отчета", callback_data=SiteAction(name=site.name, action="export").pack())],
-        [InlineKeyboardButton(text="⚙️ Редактировать", callback_data=SiteAction(name=site.name, action="edit").pack()),
-         InlineKeyboardButton(text="🗑️ Удалить сайт", callback_data=SiteAction(name=site.name, action="delete").pack())],
-        [InlineKeyboardButton(text="🏠 Главная", callback_data="menu")]
+        [enable_button,InlineKeyboardButton(text="🔔 Настройка уведомлений", callback_data=SiteAction(id=site.id, action="settingsnotif").pack())],
+        [InlineKeyboardButton(text="📊 Получить отчет", callback_data=SiteAction(id=site.id, action="report").pack()),InlineKeyboardButton(text="📊 Экспорт отчета", callback_data=SiteAction(id=site.id, action="export").pack())],
+        [InlineKeyboardButton(text="⚙️ Редактировать", callback_data=SiteAction(id=site.id, action="edit").pack()),
+         InlineKeyboardButton(text="🗑️ Удалить сайт", callback_data=SiteAction(id=site.id, action="delete").pack())],
+        [InlineKeyboardButton(text="📋 К списку", callback_data=(back or SitesPage()).pack()),
+         InlineKeyboardButton(text="🏠 Главная", callback_data="menu")]
         
     ])
 
@@ -54,13 +71,13 @@ def notification(site):
         up_text = "🔴 Уведомление о восстановлении"
     kb.button(
         text = down_text,
-        callback_data=SiteAction(name=site.name,action="notifdown"))
+        callback_data=SiteAction(id=site.id,action="notifdown"))
     kb.button(
         text= up_text,
-        callback_data=SiteAction(name=site.name,action="notifrecovery"))
+        callback_data=SiteAction(id=site.id,action="notifrecovery"))
     kb.button(
         text= 'Назад',
-        callback_data=SitesList(name=site.name))
+        callback_data=SitesList(id=site.id))
     kb.adjust(2)
     return kb.as_markup()
 
@@ -72,4 +89,14 @@ def skip_kb() -> ReplyKeyboardMarkup:
         ],
         resize_keyboard=True,
         one_time_keyboard=True
-    )
\ No newline at end of file
+    )
+
+def probe_mode_kb(skip: bool = False) -> ReplyKeyboardMarkup:
+    keyboard = [[KeyboardButton(text=label)] for label in PROBE_MODES.values()]
+    if skip:
+        keyboard.append([KeyboardButton(text="⏭️ Пропустить")])
+    return ReplyKeyboardMarkup(
+        keyboard=keyboard,
+        resize_keyboard=True,
+        one_time_keyboard=True
+    )
@@ -4,6 +4,8 @@ from aiogram.fsm.context import FSMContext
 import utils
 from site_monitor import SiteConfig
 import gui
+import config
+from http_client import PROBE_RANGE
 router = Router()
 
 class AddSiteStates(StatesGroup):
@@ -12,6 +14,8 @@ class AddSiteStates(StatesGroup):
     waiting_for_check_interval = State()
     waiting_for_timeout = State()
     waiting_for_expected_status = State()
+    waiting_for_probe_mode = State()
+    waiting_for_max_body_bytes = State()
 
 @router.callback_query(F.data=='addsite')
 async def listsites(callback_query: types.CallbackQuery, state: FSMContext):
@@ -53,15 +57,43 @@ async def process_timeout(message: types.Message, state: FSMContext):
     await message.answer("Введите ожидаемый HTTP-статус (например, 200):")
     await state.set_state(AddSiteStates.waiting_for_expected_status)
 
-# Получаем ожидаемый статус и сохраняем сайт
+# Получаем ожидаемый статус
 @router.message(AddSiteStates.waiting_for_expected_status)
 async def process_expected_status(message: types.Message, state: FSMContext):
     if not message.text.isdigit():
         await message.answer("Пожалуйста, введите число.")
         return
     await state.update_data(expected_status=int(message.text))
+    await message.answer("Выберите режим проверки:", reply_markup=gui.probe_mode_kb())
+    await state.set_state(AddSiteStates.waiting_for_probe_mode)
 
+# Получаем режим проверки
+@router.message(AddSiteStates.waiting_for_probe_mode)
+async def process_probe_mode(message: types.Message, state: FSMContext):
+    mode = utils.probe_mode_from_label(message.text)
+    if mode is None:
+        await message.answer("Выберите режим кнопкой.", reply_markup=gui.probe_mode_kb())
+        return
+    await state.update_data(probe_mode=mode)
+    if mode == PROBE_RANGE:
+        await message.answer("Сколько байт тела скачивать (например, 65536):", reply_markup=types.ReplyKeyboardRemove())
+        await state.set_state(AddSiteStates.waiting_for_max_body_bytes)
+        return
+    await save_site(message, state)
+
+# Получаем лимит тела для режима range
+@router.message(AddSiteStates.waiting_for_max_body_bytes)
+async def process_max_body_bytes(message: types.Message, state: FSMContext):
+    if not message.text.isdigit() or int(message.text) == 0:
+        await message.answer("Пожалуйста, введите положительное число.")
+        return
+    await state.update_data(max_body_bytes=int(message.text))
+    await save_site(message, state)
+
+# Сохраняем сайт
+async def save_site(message: types.Message, state: FSMContext):
     data = await state.get_data()
+    await state.clear()
     # Создаём объект SiteConfig
     
     new_site = SiteConfig(
@@ -69,7 +101,9 @@ async def process_expected_status(message: types.Message, state: FSMContext):
         url=data["url"],
         check_interval=data["check_interval"],
         timeout=data["timeout"],
-        expected_status=data["expected_status"]
+        expected_status=data["expected_status"],
+        probe_mode=data["probe_mode"],
+        max_body_bytes=data.get("max_body_bytes", config.probe_max_body_bytes)
     )
     await message.bot.monitor.add_site(new_site)
     text = utils.format_site_info(new_site)
@@ -5,6 +5,10 @@ import utils
 import gui
 from site_monitor import SiteConfig
 import callbackdata as cb
+from http_client import PROBE_RANGE
+from content_rules import ContentRules
+import re
+from dataclasses import replace
 
 router = Router()
 
@@ -15,11 +19,19 @@ class EditSiteStates(StatesGroup):
     waiting_for_new_check_interval = State()
     waiting_for_new_timeout = State()
     waiting_for_new_expected_status = State()
+    waiting_for_new_probe_mode = State()
+    waiting_for_new_max_body_bytes = State()
+    waiting_for_new_content_rules = State()
+    waiting_for_new_adaptive = State()
 
 
 @router.callback_query(cb.SiteAction.filter(F.action=="edit"))
 async def edit_site_start(callback_query: types.CallbackQuery, callback_data: cb.SiteAction, state: FSMContext):
-    site_name = callback_data.name
+    site = callback_query.bot.monitor.get_site_by_id(callback_data.id)
+    if site is None:
+        await callback_query.message.edit_text('Сайт не найден', reply_markup=gui.menu())
+        return
+    site_name = site.name
     await state.clear()
     await state.update_data(editing_site=site_name)
 
@@ -80,7 +92,7 @@ async def edit_site_timeout(message: types.Message, state: FSMContext):
     await state.set_state(EditSiteStates.waiting_for_new_expected_status)
 
 
-# новый expected_status и сохранение
+# новый expected_status
 @router.message(EditSiteStates.waiting_for_new_expected_status)
 async def edit_site_expected_status(message: types.Message, state: FSMContext):
     text = message.text.strip()
@@ -90,28 +102,124 @@ async def edit_site_expected_status(message: types.Message, state: FSMContext):
             return
         await state.update_data(new_expected_status=int(text))
 
+    await message.answer("Выберите новый режим проверки или «Пропустить»:", reply_markup=gui.probe_mode_kb(skip=True))
+    await state.set_state(EditSiteStates.waiting_for_new_probe_mode)
+
+
+# новый probe_mode
+@router.message(EditSiteStates.waiting_for_new_probe_mode)
+async def edit_site_probe_mode(message: types.Message, state: FSMContext):
+    text = message.text.strip()
+    if text != "⏭️ Пропустить":
+        mode = utils.probe_mode_from_label(text)
+        if mode is None:
+            await message.answer("Выберите режим кнопкой или «Пропустить».", reply_markup=gui.probe_mode_kb(skip=True))
+            return
+        await state.update_data(new_probe_mode=mode)
+        if mode == PROBE_RANGE:
+            await message.answer("Введите лимит тела в байтах или «Пропустить»:", reply_markup=gui.skip_kb())
+            await state.set_state(EditSiteStates.waiting_for_new_max_body_bytes)
+            return
+
+    await ask_content_rules(message, state)
+
+
+# новый max_body_bytes
+@router.message(EditSiteStates.waiting_for_new_max_body_bytes)
+async def edit_site_max_body_bytes(message: types.Message, state: FSMContext):
+    text = message.text.strip()
+    if text != "⏭️ Пропустить":
+        if not text.isdigit() or int(text) == 0:
+            await message.answer("Введите положительное число или «Пропустить».")
+            return
+        await state.update_data(new_max_body_bytes=int(text))
+
+    await ask_content_rules(message, state)
+
+
+async def ask_content_rules(message: types.Message, state: FSMContext):
+    await message.answer(
+        "Введите правила проверки содержимого, по одному в строке:\n"
+        "<code>+текст</code> — должен быть в ответе\n"
+        "<code>-текст</code> — не должен быть в ответе\n"
+        "<code>~regex</code> / <code>!~regex</code> — должно / не должно совпасть\n"
+        "<code>max=N</code> — максимальный размер тела, байт\n"
+        "Отправьте «0», чтобы убрать правила, или нажмите «Пропустить».",
+        parse_mode="HTML", reply_markup=gui.skip_kb()
+    )
+    await state.set_state(EditSiteStates.waiting_for_new_content_rules)
+
+
+# новые content_rules
+@router.message(EditSiteStates.waiting_for_new_content_rules)
+async def edit_site_content_rules(message: types.Message, state: FSMContext):
+    text = message.text.strip()
+    if text == "0":
+        await state.update_data(new_content_rules=None)
+    elif text != "⏭️ Пропустить":
+        try:
+            rules = ContentRules.parse(text)
+        except (ValueError, re.error) as e:
+            await message.answer(f"Ошибка в правилах: {e}. Попробуйте ещё раз или «Пропустить».")
+            return
+        await state.update_data(new_content_rules=rules.to_json())
+
+    await message.answer(
+        "Адаптивный интервал: после первого сбоя сайт перепроверяется быстро, "
+        "упавший и «мигающий» — реже.\n"
+        "Введите границы интервала в секундах как <code>мин-макс</code> (например, 5-600), "
+        "«1» — включить с границами по умолчанию, «0» — выключить, или нажмите «Пропустить».",
+        parse_mode="HTML", reply_markup=gui.skip_kb()
+    )
+    await state.set_state(EditSiteStates.waiting_for_new_adaptive)
+
+
+# новый адаптивный режим
+@router.message(EditSiteStates.waiting_for_new_adaptive)
+async def edit_site_adaptive(message: types.Message, state: FSMContext):
+    text = message.text.strip()
+    if text == "0":
+        await state.update_data(new_adaptive=(False, None, None))
+    elif text == "1":
+        await state.update_data(new_adaptive=(True, None, None))
+    elif text != "⏭️ Пропустить":
+        low, _, high = text.partition("-")
+        if not (low.strip().isdigit() and high.strip().isdigit()) or not 0 < int(low) <= int(high):
+            await message.answer("Введите границы как «мин-макс», «1», «0» или «Пропустить».")
+            return
+        await state.update_data(new_adaptive=(True, int(low), int(high)))
+
+    await save_site(message, state)
+
+
+# сохранение
+async def save_site(message: types.Message, state: FSMContext):
     data = await state.get_data()
     site_name = data["editing_site"]
 
     monitor = message.bot.monitor
-    for site in monitor.sites:
-        if site.name == site_name:
-            # применяем только те поля, что реально есть в data
-            if "new_name" in data: site.name = data["new_name"]
-            if "new_url" in data: site.url = data["new_url"]
-            if "new_check_interval" in data: site.check_interval = data["new_check_interval"]
-            if "new_timeout" in data: site.timeout = data["new_timeout"]
-            if "new_expected_status" in data: site.expected_status = data["new_expected_status"]
-
-            await monitor.update_site(site_name,site)
-            text = utils.format_site_info(site)
-            await message.answer(
-                f"✅ Сайт обновлён!\n{text}",
-                parse_mode="HTML",
-                disable_web_page_preview=True,
-                reply_markup=gui.site_action(site)
-            )
-            break
+    site = monitor.get_site(site_name)
+    if site is not None:
+        # применяем только те поля, что реально есть в data; монитор сам решит, что перепланировать
+        changes = {}
+        if "new_name" in data: changes["name"] = data["new_name"]
+        if "new_url" in data: changes["url"] = data["new_url"]
+        if "new_check_interval" in data: changes["check_interval"] = data["new_check_interval"]
+        if "new_timeout" in data: changes["timeout"] = data["new_timeout"]
+        if "new_expected_status" in data: changes["expected_status"] = data["new_expected_status"]
+        if "new_probe_mode" in data: changes["probe_mode"] = data["new_probe_mode"]
+        if "new_max_body_bytes" in data: changes["max_body_bytes"] = data["new_max_body_bytes"]
+        if "new_content_rules" in data: changes["content_rules"] = ContentRules.from_json(data["new_content_rules"])
+        if "new_adaptive" in data: changes["adaptive"], changes["min_interval"], changes["max_interval"] = data["new_adaptive"]
+
+        site = await monitor.update_site(site_name, replace(site, **changes))
+        text = utils.format_site_info(site)
+        await message.answer(
+            f"✅ Сайт обновлён!\n{text}",
+            parse_mode="HTML",
+            disable_web_page_preview=True,
+            reply_markup=gui.site_action(site)
+        )
     else:
         await message.answer("⚠️ Сайт не найден.")
 
@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta
 from aiogram import F, Router, types
-from aiogram.filters import Command, CommandStart
+from aiogram.filters import Command, CommandObject, CommandStart
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 import gui
@@ -26,73 +27,113 @@ async def menu(callback_query: types.CallbackQuery):
 
 @router.callback_query(F.data=='listsites')
 async def listsites(callback_query: types.CallbackQuery):
-    if len(callback_query.bot.monitor.sites) == 0:
+    await show_sites_page(callback_query, cb.SitesPage())
+
+
+@router.callback_query(cb.SitesPage.filter())
+async def sites_page(callback_query: types.CallbackQuery, callback_data: cb.SitesPage):
+    await show_sites_page(callback_query, callback_data)
+
+
+async def show_sites_page(callback_query: types.CallbackQuery, page: cb.SitesPage):
+    monitor = callback_query.bot.monitor
+    if len(monitor.sites) == 0:
         await callback_query.message.edit_text('Нет сайтов для мониторинга', reply_markup=gui.menu())
-    else:
-        await callback_query.message.edit_text('Сайты:', reply_markup=gui.sites_list(callback_query.bot.monitor.sites))
+        return
+    query = page.q
+    if query and monitor.site_lists.query(query) is None:
+        await callback_query.answer('Поиск устарел, повторите /find')
+        query = 0
+    text, markup = monitor.sites_page(page.flt, query, page.page)
+    try:
+        await callback_query.message.edit_text(text, reply_markup=markup)
+    except TelegramBadRequest:
+        # нажата кнопка текущей страницы — сообщение не изменилось
+        await callback_query.answer()
+
+
+@router.message(Command("find"))
+async def find_sites(message: types.Message, command: CommandObject):
+    if not command.args:
+        await message.answer("Использование: /find <начало названия сайта>")
+        return
+    monitor = message.bot.monitor
+    text, markup = monitor.sites_page(query=monitor.site_lists.search(command.args))
+    await message.answer(text, reply_markup=markup)
 
 
 @router.callback_query(cb.SitesList.filter())
 async def listsites_action(callback_query: types.CallbackQuery, callback_data: cb.SitesList):
-    site = next((s for s in callback_query.bot.monitor.sites if s.name == callback_data.name), None)
+    site = callback_query.bot.monitor.get_site_by_id(callback_data.id)
     if site is None:
-        await callback_query.message.edit_text('Сайт с таким именем не найден', reply_markup=gui.menu())
+        await callback_query.message.edit_text('Сайт не найден', reply_markup=gui.menu())
         return
     text = utils.format_site_info(site)
-    await callback_query.message.edit_text(text, parse_mode="HTML", disable_web_page_preview=True,reply_markup=gui.site_action(site))
+    back = cb.SitesPage(page=callback_data.page, flt=callback_data.flt, q=callback_data.q)
+    await callback_query.message.edit_text(text, parse_mode="HTML", disable_web_page_preview=True,reply_markup=gui.site_action(site, back))
 
 
 @router.callback_query(cb.SiteAction.filter(F.action=='delete'))
 async def siteaction(callback_query: types.CallbackQuery, callback_data: cb.SiteAction):
-    await callback_query.bot.monitor.delete_site(callback_data.name)
+    site = callback_query.bot.monitor.get_site_by_id(callback_data.id)
+    if site is not None:
+        await callback_query.bot.monitor.delete_site(site.name)
     await listsites(callback_query)
 
 @router.callback_query(cb.SiteAction.filter(F.action=='onoff'))
 async def togleonoff(callback_query: types.CallbackQuery, callback_data: cb.SiteAction):
-    site = await callback_query.bot.monitor.toggle_onoff(callback_data.name)
+    monitor = callback_query.bot.monitor
+    site = monitor.get_site_by_id(callback_data.id)
+    if site is None:
+        await callback_query.message.edit_text('Сайт не найден', reply_markup=gui.menu())
+        return
+    await monitor.toggle_onoff(site.name)
     if site.enabled:
         enabled_text = f"Мониторинг включен\n\n"
     else:
         enabled_text = f"Мониторинг выключен\n\n"
-    await callback_query.bot.monitor.update_site(site.name,site)
     enabled_text+=utils.format_site_info(site)
     await callback_query.message.edit_text(enabled_text, parse_mode="HTML", disable_web_page_preview=True,reply_markup=gui.site_action(site))
 
 @router.callback_query(cb.SiteAction.filter(F.action=='settingsnotif'))
 async def settingsnotif(callback_query: types.CallbackQuery, callback_data: cb.SiteAction):
-    site = next((s for s in callback_query.bot.monitor.sites if s.name == callback_data.name), None)
-    await callback_query.message.edit_text(f'Настройка уведомлений для сайта {callback_data.name}', parse_mode="HTML", disable_web_page_preview=True,reply_markup=gui.notification(site))
+    site = callback_query.bot.monitor.get_site_by_id(callback_data.id)
+    if site is None:
+        return
+    await callback_query.message.edit_text(f'Настройка уведомлений для сайта {site.name}', parse_mode="HTML", disable_web_page_preview=True,reply_markup=gui.notification(site))
 
 @router.callback_query(cb.SiteAction.filter(F.action=='notifdown'))
 async def settingsnotifdown(callback_query: types.CallbackQuery, callback_data: cb.SiteAction):
-    site = next((s for s in callback_query.bot.monitor.sites if s.name == callback_data.name), None)
-    if site.notify_on_down:
-        site.notify_on_down = False
-    else:
-        site.notify_on_down = True
-    await callback_query.bot.monitor.update_site(site.name,site)
-    await callback_query.message.edit_text(f'Настройка уведомлений для сайта {callback_data.name}', parse_mode="HTML", disable_web_page_preview=True,reply_markup=gui.notification(site))
+    monitor = callback_query.bot.monitor
+    site = monitor.get_site_by_id(callback_data.id)
+    if site is None:
+        return
+    await monitor.set_notify_settings(site.name, notify_on_down=not site.notify_on_down)
+    await callback_query.message.edit_text(f'Настройка уведомлений для сайта {site.name}', parse_mode="HTML", disable_web_page_preview=True,reply_markup=gui.notification(site))
     
 @router.callback_query(cb.SiteAction.filter(F.action=='notifrecovery'))
 async def notifrecovery(callback_query: types.CallbackQuery, callback_data: cb.SiteAction):
-    site = next((s for s in callback_query.bot.monitor.sites if s.name == callback_data.name), None)
-    if site.notify_on_recovery:
-        site.notify_on_recovery = False
-    else:
-        site.notify_on_recovery = True
-    await callback_query.bot.monitor.update_site(site.name,site)
-    await callback_query.message.edit_text(f'Настройка уведомлений для сайта {callback_data.name}', parse_mode="HTML", disable_web_page_preview=True,reply_markup=gui.notification(site))
+    monitor = callback_query.bot.monitor
+    site = monitor.get_site_by_id(callback_data.id)
+    if site is None:
+        return
+    await monitor.set_notify_settings(site.name, notify_on_recovery=not site.notify_on_recovery)
+    await callback_query.message.edit_text(f'Настройка уведомлений для сайта {site.name}', parse_mode="HTML", disable_web_page_preview=True,reply_markup=gui.notification(site))
 @router.callback_query(cb.SiteAction.filter(F.action=='report'))
 async def notifrecovery(callback_query: types.CallbackQuery, callback_data: cb.SiteAction):
-    site = next((s for s in callback_query.bot.monitor.sites if s.name == callback_data.name), None)
+    site = callback_query.bot.monitor.get_site_by_id(callback_data.id)
+    if site is None:
+        return
     photo, report_text= await callback_query.bot.monitor.send_daily_report(site.name)
     await callback_query.bot.send_photo(chat_id=callback_query.message.chat.id, photo=photo,caption=report_text)
 
 @router.callback_query(cb.SiteAction.filter(F.action=='export'))
 async def notifrecovery(callback_query: types.CallbackQuery, callback_data: cb.SiteAction):
-    site = next((s for s in callback_query.bot.monitor.sites if s.name == callback_data.name), None)
+    site = callback_query.bot.monitor.get_site_by_id(callback_data.id)
+    if site is None:
+        return
     file_path = await callback_query.bot.monitor.export_report_csv(site.name)
     if file_path:
         input_file = FSInputFile(file_path)
         await callback_query.bot.send_document(chat_id=callback_query.message.chat.id, document=input_file)
-    #await callback_query.message.edit_text(f'Настройка уведомлений для сайта {callback_data.name}', parse_mode="HTML", disable_web_page_preview=True,reply_markup=gui.notification(site))
\ No newline at end of file
+    #await callback_query.message.edit_text(f'Настройка уведомлений для сайта {site.name}', parse_mode="HTML", disable_web_page_preview=True,reply_markup=gui.notification(site))
\ No newline at end of file
@@ -0,0 +1,306 @@
+import asyncio
+import ssl
+import logging
+from contextlib import nullcontext
+from time import perf_counter
+from types import SimpleNamespace
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+from aiohttp.resolver import DefaultResolver
+
+import config
+import metrics
+from dns_cache import CachingResolver
+from ratelimit import HostLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class ProbeTimings:
+    """
+    Фазы одного запроса, мс. Заполняются хуками трассировки aiohttp.
+    connect_ms — установка соединения (TCP и TLS для https: aiohttp выполняет их
+    одним вызовом и не даёт отдельного хука на рукопожатие). Для соединения,
+    взятого из пула, dns_ms и connect_ms остаются None.
+    """
+    __slots__ = ("dns_ms", "connect_ms", "ttfb_ms", "_dns_start", "_connect_start", "_sent")
+
+    def __init__(self) -> None:
+        self.dns_ms: Optional[float] = None
+        self.connect_ms: Optional[float] = None
+        self.ttfb_ms: Optional[float] = None
+        self._dns_start = self._connect_start = self._sent = None
+
+
+async def _on_request_start(session, ctx, params):
+    ctx.trace_request_ctx._sent = perf_counter()
+
+
+async def _on_dns_start(session, ctx, params):
+    ctx.trace_request_ctx._dns_start = perf_counter()
+
+
+async def _on_dns_end(session, ctx, params):
+    t = ctx.trace_request_ctx
+    t.dns_ms = (perf_counter() - t._dns_start) * 1000.0
+
+
+async def _on_connection_start(session, ctx, params):
+    ctx.trace_request_ctx._connect_start = perf_counter()
+
+
+async def _on_connection_end(session, ctx, params):
+    t = ctx.trace_request_ctx
+    # резолв выполняется внутри создания соединения, вычитаем его
+    t.connect_ms = (perf_counter() - t._connect_start) * 1000.0 - (t.dns_ms or 0.0)
+
+
+async def _on_headers_sent(session, ctx, params):
+    ctx.trace_request_ctx._sent = perf_counter()
+
+
+async def _on_request_end(session, ctx, params):
+    # request_end приходит, когда получены заголовки ответа
+    t = ctx.trace_request_ctx
+    t.ttfb_ms = (perf_counter() - t._sent) * 1000.0
+
+
+def _trace_config() -> aiohttp.TraceConfig:
+    trace = aiohttp.TraceConfig(trace_config_ctx_factory=_timings_ctx)
+    trace.on_request_start.append(_on_request_start)
+    trace.on_dns_resolvehost_start.append(_on_dns_start)
+    trace.on_dns_resolvehost_end.append(_on_dns_end)
+    trace.on_connection_create_start.append(_on_connection_start)
+    trace.on_connection_create_end.append(_on_connection_end)
+    trace.on_request_headers_sent.append(_on_headers_sent)
+    trace.on_request_end.append(_on_request_end)
+    return trace
+
+
+def _timings_ctx(trace_request_ctx=None):
+    # запросы без ProbeTimings пишут фазы в одноразовый объект
+    return SimpleNamespace(trace_request_ctx=trace_request_ctx if trace_request_ctx is not None else ProbeTimings())
+
+
+# Режимы проверки: сколько ответа реально скачивать
+PROBE_GET = "get"          # полный GET, тело дочитывается
+PROBE_HEAD = "head"        # HEAD, тела нет
+PROBE_HEADERS = "headers"  # GET, соединение закрывается сразу после заголовков
+PROBE_RANGE = "range"      # GET с Range и лимитом max_body_bytes
+PROBE_MODES = {
+    PROBE_GET: "GET (полный ответ)",
+    PROBE_HEAD: "HEAD",
+    PROBE_HEADERS: "GET (только заголовки)",
+    PROBE_RANGE: "GET с лимитом тела",
+}
+READ_CHUNK = 64 * 1024
+# после стольких запомненных результатов устаревшие вычищаются
+RECENT_LIMIT = 4096
+
+
+def is_expected_status(site, status: Optional[int]) -> bool:
+    if status is None:
+        return False
+    if status == site.expected_status:
+        return True
+    # на запрос с Range сервер вправе ответить 206 вместо 200
+    return site.probe_mode == PROBE_RANGE and site.expected_status == 200 and status == 206
+
+
+async def probe(session: aiohttp.ClientSession, site, timeout: aiohttp.ClientTimeout,
+                timings: ProbeTimings = None) -> Tuple[int, Optional[str]]:
+    """
+    Выполняет запрос проверки в режиме site.probe_mode.
+    Возвращает HTTP-статус и ошибку проверки содержимого (None, если правил нет или они выполнены).
+    Тело читается чанками и не накапливается; недочитанный ответ закрывается вместе
+    с соединением: дочитывать тело ради возврата соединения в пул дороже, чем открыть новое.
+    """
+    mode = site.probe_mode
+    rules = site.content_rules if mode in (PROBE_GET, PROBE_RANGE) else None
+    method = "HEAD" if mode == PROBE_HEAD else "GET"
+    headers = None
+    if mode == PROBE_RANGE:
+        headers = {"Range": f"bytes=0-{max(site.max_body_bytes, 1) - 1}"}
+    async with session.request(method, site.url, timeout=timeout, headers=headers,
+                               trace_request_ctx=timings) as response:
+        if mode == PROBE_HEADERS:
+            response.close()
+            return response.status, None
+        if mode == PROBE_HEAD:
+            return response.status, None
+
+        matcher = rules.matcher() if rules else None
+        remaining = site.max_body_bytes if mode == PROBE_RANGE else None
+        while remaining is None or remaining > 0:
+            chunk = await response.content.read(READ_CHUNK if remaining is None else min(remaining, READ_CHUNK))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            if matcher is not None and matcher.feed(chunk):
+                break
+        if not response.content.at_eof():
+            # исход уже ясен или сервер проигнорировал Range — остаток не качаем
+            response.close()
+        return response.status, matcher.finish() if matcher is not None else None
+
+
+PROBE_COALESCED = metrics.counter("monitor_probe_coalesced_total", "Проверки, получившие результат чужого запроса")
+
+
+def target_key(site) -> tuple:
+    """
+    Что именно проверяется: сайты с одинаковым ключом дают одинаковый результат,
+    поэтому их запросы можно объединять.
+    """
+    rules = site.content_rules.to_json() if getattr(site, "content_rules", None) else None
+    body_cap = site.max_body_bytes if site.probe_mode == PROBE_RANGE else None
+    return (site.url, site.probe_mode, body_cap, site.expected_status, site.timeout, rules,
+            bool(getattr(site, "cold_connection", False)), bool(getattr(site, "fresh_dns", False)))
+
+
+def target_host(site) -> Optional[str]:
+    return urlsplit(site.url).hostname
+
+
+class ProbeResult:
+    __slots__ = ("status", "error", "elapsed_ms", "timings", "finished")
+
+    def __init__(self, status: Optional[int], error: Optional[str], elapsed_ms: float,
+                 timings: ProbeTimings, finished: float) -> None:
+        self.status = status
+        self.error = error
+        self.elapsed_ms = elapsed_ms
+        self.timings = timings
+        self.finished = finished
+
+
+class HttpClient:
+    """
+    Общий HTTP-клиент мониторинга.
+    Держит один долгоживущий коннектор с keep-alive, общий SSL-контекст и общий DNS-кэш.
+    Для сайтов, которым нужен «холодный» коннект, есть сессия без keep-alive,
+    а для сайтов, где важен сам DNS, — сессия без keep-alive и без кэша имён.
+    """
+
+    def __init__(self, limit: int = None, limit_per_host: int = None,
+                 keepalive_timeout: float = None) -> None:
+        self.limit = config.http_limit if limit is None else limit
+        self.limit_per_host = config.http_limit_per_host if limit_per_host is None else limit_per_host
+        self.keepalive_timeout = config.http_keepalive_timeout if keepalive_timeout is None else keepalive_timeout
+        self.ssl_context = ssl.create_default_context()
+        self.resolver: Optional[CachingResolver] = None
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._trace = _trace_config()
+        self.limiter = HostLimiter()
+        # объединение одинаковых проверок: идущие запросы и последний результат по target_key
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self._recent: Dict[tuple, ProbeResult] = {}
+
+    def _make_session(self, mode: str) -> aiohttp.ClientSession:
+        force_close = mode != "pooled"
+        if mode == "fresh_dns":
+            # свой резолвер без кэша: каждая проверка действительно ходит в DNS
+            resolver = DefaultResolver()
+        else:
+            if self.resolver is None:
+                self.resolver = CachingResolver()
+            resolver = self.resolver
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ssl=self.ssl_context,
+            force_close=force_close,
+            keepalive_timeout=None if force_close else self.keepalive_timeout,
+            resolver=resolver,
+            use_dns_cache=False,
+        )
+        return aiohttp.ClientSession(connector=connector, trace_configs=[self._trace])
+
+    def session_for(self, site) -> aiohttp.ClientSession:
+        """
+        Возвращает сессию для сайта: общую с переиспользованием соединений,
+        «холодную», где каждое соединение закрывается после запроса, или
+        сессию со свежим резолвом имени на каждую проверку.
+        Сессии создаются лениво, т.к. им нужен запущенный event loop.
+        """
+        if getattr(site, "fresh_dns", False):
+            mode = "fresh_dns"
+        elif getattr(site, "cold_connection", False):
+            mode = "cold"
+        else:
+            mode = "pooled"
+        session = self._sessions.get(mode)
+        if session is None or session.closed:
+            session = self._sessions[mode] = self._make_session(mode)
+        return session
+
+    async def check(self, site, admitted: bool = False) -> ProbeResult:
+        """
+        Проверка сайта с учётом лимитов хоста и объединением дублей:
+        если такая же цель уже проверяется или проверялась не раньше coalesce_window
+        секунд назад, сайт получает тот же результат без своего запроса.
+        admitted — слот хоста уже занят планировщиком (ProbeScheduler с limiter), ждать его не нужно.
+        """
+        key = target_key(site)
+        pending = self._inflight.get(key)
+        if pending is not None:
+            result = await asyncio.shield(pending)
+            if result is not None:
+                PROBE_COALESCED.inc()
+                return result
+        recent = self._recent.get(key)
+        if recent is not None and perf_counter() - recent.finished <= config.coalesce_window:
+            PROBE_COALESCED.inc()
+            return recent
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        result = None
+        try:
+            result = await self._check_once(site, admitted)
+            if len(self._recent) >= RECENT_LIMIT:
+                # выбрасываем устаревшие результаты, в т.ч. целей удалённых и изменённых сайтов
+                self._recent = {k: r for k, r in self._recent.items()
+                                if result.finished - r.finished <= config.coalesce_window}
+            self._recent[key] = result
+            return result
+        finally:
+            # при отмене ожидающие получат None и проверят сами
+            future.set_result(result)
+            del self._inflight[key]
+
+    async def _check_once(self, site, admitted: bool = False) -> ProbeResult:
+        timings = ProbeTimings()
+        status = error = None
+        async with (nullcontext() if admitted else self.limiter.slot(target_host(site))):
+            started = perf_counter()
+            try:
+                status, error = await probe(self.session_for(site), site,
+                                            aiohttp.ClientTimeout(total=site.timeout), timings)
+            except asyncio.TimeoutError:
+                error = f"timeout {site.timeout}s"
+                logger.warning(f"{site.name} timeout после {site.timeout}s")
+            except aiohttp.ClientError as e:
+                error = str(e) or type(e).__name__
+                logger.warning(f"{site.name} ошибка соединения: {e}")
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                logger.error(f"{site.name} непредвиденная ошибка: {e}")
+            finished = perf_counter()
+        return ProbeResult(status, error, (finished - started) * 1000.0, timings, finished)
+
+    def forget(self, site) -> None:
+        """Сбрасывает запомненный результат цели (например, после изменения сайта)."""
+        self._recent.pop(target_key(site), None)
+
+    async def close(self) -> None:
+        for session in self._sessions.values():
+            if not session.closed:
+                await session.close()
+        self._sessions.clear()
+        if self.resolver is not None:
+            await self.resolver.close()
+            self.resolver = None
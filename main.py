@@ -10,6 +10,8 @@ from handlers import create_monitor
 from handlers import edit_monitor
 from site_monitor import SiteMonitor
 from database import Database
+from sharding import ShardCoordinator
+import metrics
 
 load_dotenv()
 token = os.getenv('BOT_TOKEN')
@@ -19,13 +21,57 @@ dp = Dispatcher(bot=bot, storage=storage)
 
 logging.basicConfig(
     filename=config.log_file,
-    filemode="w",
+    filemode="a",
     format="%(asctime)s %(name)s - %(levelname)s - %(message)s",
     level=getattr(logging, config.log_level),
     encoding="utf-8",
 )
 
 
+async def run_leader(monitor: SiteMonitor, coordinator, logger) -> None:
+    """
+    Бот и фоновые отчёты. При шардировании они работают только на ведущем экземпляре:
+    потеряв аренду ведущего, экземпляр останавливает их и снова ждёт аренду, продолжая
+    проверять свои шарды. Возвращается, когда бот остановлен (сигналом или ошибкой).
+    """
+    while True:
+        if coordinator is not None:
+            # бот и отчёты работают только на ведущем экземпляре, остальные только проверяют свои шарды
+            logger.info(f"Экземпляр {coordinator.instance_id} ожидает аренду ведущего...")
+            await coordinator.wait_leader()
+
+        # Запуск еженедельного отчета и очистки устаревшей истории
+        leader_tasks = [
+            asyncio.create_task(monitor.weekly_report_task()),
+            asyncio.create_task(monitor.retention_task()),
+        ]
+        logger.info("Запуск Telegram бота...")
+        polling = asyncio.create_task(dp.start_polling(bot, close_bot_session=False))
+        watch = asyncio.create_task(coordinator.wait_follower()) if coordinator is not None else None
+        done = set()
+        try:
+            done, _ = await asyncio.wait([polling] + ([watch] if watch else []), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if watch is not None:
+                watch.cancel()
+            for task in leader_tasks:
+                task.cancel()
+            await asyncio.gather(*leader_tasks, return_exceptions=True)
+            if not polling.done():
+                # аренда ведущего потеряна (или нас останавливают) — бот должен работать только у нового ведущего
+                logger.warning("Экземпляр больше не ведущий, останавливаю бота и отчёты")
+                try:
+                    await dp.stop_polling()
+                except RuntimeError:
+                    # опрос ещё не успел запуститься
+                    polling.cancel()
+                await asyncio.gather(polling, return_exceptions=True)
+        if polling in done:
+            # бот остановлен сам по себе: пробрасываем его ошибку или завершаемся
+            polling.result()
+            return
+
+
 async def main():
     logger = logging.getLogger("main")
     logger.info("Program start")
@@ -38,18 +84,25 @@ async def main():
     # Инициализируем мониторинг сайтов
     monitor = SiteMonitor(bot=bot, db=db)
     bot.monitor = monitor
+    metrics_runner = None
+    if config.metrics_port:
+        bot.session.middleware(metrics.TelegramMetricsMiddleware())
+        metrics_runner = await metrics.start_metrics_server()
+        asyncio.create_task(metrics.event_loop_lag_task())
+    coordinator = None
+    if config.sharding_enabled:
+        coordinator = ShardCoordinator(db, on_change=monitor.on_shards_changed)
+        monitor.coordinator = coordinator
+    # Подключаем роутеры (один раз: бот может перезапускаться при смене ведущего)
+    dp.include_router(handlers.router)
+    dp.include_router(create_monitor.router)
+    dp.include_router(edit_monitor.router)
     try:
         # Запускаем мониторинг в фоновом режиме
         monitoring_task = asyncio.create_task(monitor.run_monitoring())
-
-        #Запуск еженедельного отчета
-        asyncio.create_task(monitor.weekly_report_task())
-        # Подключаем роутер и запускаем бота
-        dp.include_router(handlers.router)
-        dp.include_router(create_monitor.router)
-        dp.include_router(edit_monitor.router)
-        logger.info("Запуск Telegram бота...")
-        await dp.start_polling(bot)
+        if coordinator is not None:
+            coordinator.start()
+        await run_leader(monitor, coordinator, logger)
     except KeyboardInterrupt:
         logger.info("Получен сигнал остановки")
     except Exception as e:
@@ -57,12 +110,19 @@ async def main():
     finally:
         # Останавливаем мониторинг
         logger.info("Остановка мониторинга...")
-        #monitor.stop_monitoring()
         monitoring_task.cancel()
         try:
             await monitoring_task
         except asyncio.CancelledError:
             pass
+        if coordinator is not None:
+            await coordinator.stop()
+        await monitor.stop_monitoring()
+        # дописываем накопленные проверки в БД
+        await db.close()
+        await bot.session.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
         logger.info("Программа завершена")
 
 
@@ -0,0 +1,63 @@
+import argparse
+import asyncio
+import logging
+from datetime import datetime
+
+from database import Database
+import config
+import retention
+
+
+async def backfill_rollups(args):
+    db = Database(asyncio.get_running_loop())
+    await db.create_pool()
+    await db.create_tables()
+    since = datetime.strptime(args.since, "%Y-%m-%d") if args.since else None
+    try:
+        days = await db.backfill_rollups(since=since)
+        print(f"Агрегаты пересчитаны, обработано суток: {days}")
+    finally:
+        await db.close()
+
+
+async def purge(args):
+    db = Database(asyncio.get_running_loop())
+    await db.create_pool()
+    try:
+        for r in await retention.apply_retention(db):
+            print(f"{r.table}: удалено строк {r.rows}, партиций {len(r.partitions)}, {r.seconds:.1f}s")
+    finally:
+        await db.close()
+
+
+async def leases(args):
+    db = Database(asyncio.get_running_loop())
+    await db.create_pool()
+    try:
+        for instance in await db.get_live_instances(config.lease_ttl):
+            print(f"экземпляр {instance}")
+        for lease in await db.get_leases():
+            print(f"{lease['name']:<12} {lease['owner'] or '-':<32} {lease['expires_at'] or ''}")
+    finally:
+        await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Служебные команды мониторинга")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill = commands.add_parser("backfill-rollups", help="пересчитать агрегаты по истории проверок")
+    backfill.add_argument("--since", help="с какой даты пересчитывать, ГГГГ-ММ-ДД (по умолчанию — вся история)")
+    backfill.set_defaults(handler=backfill_rollups)
+
+    commands.add_parser("purge", help="удалить устаревшую историю по политике хранения").set_defaults(handler=purge)
+
+    commands.add_parser("leases", help="показать живые экземпляры и владельцев шардов").set_defaults(handler=leases)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s - %(levelname)s - %(message)s")
+    asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
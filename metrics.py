@@ -0,0 +1,183 @@
+import asyncio
+import logging
+from bisect import bisect_left
+from time import perf_counter
+from typing import Callable, Dict, Sequence, Tuple
+
+from aiohttp import web
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Границы бакетов по умолчанию (секунды)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    """Монотонный счётчик. inc() — одно обращение к dict, годится для горячего пути."""
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name, self.labelnames, labels, value
+
+
+class Gauge(Counter):
+    """Текущее значение. Вместо set() можно задать callback, который вызывается только при сборе."""
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), callback: Callable = None) -> None:
+        super().__init__(name, help, labelnames)
+        self.callback = callback
+
+    def set(self, *labels, value: float) -> None:
+        self._values[labels] = value
+
+    def samples(self):
+        if self.callback is None:
+            yield from super().samples()
+            return
+        result = self.callback()
+        if isinstance(result, dict):
+            for labels, value in result.items():
+                yield self.name, self.labelnames, labels, value
+        else:
+            yield self.name, self.labelnames, (), result
+
+
+class Histogram:
+    """Гистограмма с фиксированными бакетами: observe() — bisect и два сложения."""
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [счётчики по бакетам..., +Inf], сумма
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def samples(self):
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket", self.labelnames + ("le",), labels + (le,), cumulative
+            yield f"{self.name}_sum", self.labelnames, labels, total
+            yield f"{self.name}_count", self.labelnames, labels, cumulative
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        # повторная регистрация (например, новый экземпляр монитора в тестах) заменяет старую
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            try:
+                for name, labelnames, labels, value in metric.samples():
+                    lines.append(f"{name}{_format_labels(labelnames, labels)} {value}")
+            except Exception as e:
+                logger.error(f"Ошибка сбора метрики {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help, labelnames))
+
+
+def gauge(name: str, help: str, labelnames: Sequence[str] = (), callback: Callable = None) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, labelnames, callback))
+
+
+def histogram(name: str, help: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labelnames, buckets))
+
+
+PROBE_LATENCY = histogram("monitor_probe_duration_seconds", "Длительность проверки сайта", ("site",))
+PROBES = counter("monitor_probes_total", "Число проверок по результату", ("site", "result"))
+SCHEDULER_LAG = histogram("monitor_scheduler_lag_seconds", "Отставание запуска проверки от расписания")
+DB_FLUSH = histogram("monitor_db_flush_duration_seconds", "Длительность записи пачки проверок")
+DB_FLUSH_ROWS = counter("monitor_db_flushed_rows_total", "Число записанных проверок")
+DB_FLUSH_ERRORS = counter("monitor_db_flush_errors_total", "Ошибки записи пачек проверок", ("result",))
+DB_POOL_WAIT = histogram("monitor_db_pool_wait_seconds", "Ожидание соединения из пула aiomysql")
+TELEGRAM_SEND = histogram("monitor_telegram_request_duration_seconds", "Длительность запросов к Telegram API", ("method",))
+LOOP_LAG = gauge("monitor_event_loop_lag_seconds", "Задержка event loop относительно ожидаемого пробуждения")
+
+
+class TelegramMetricsMiddleware:
+    """Request-middleware aiogram: замеряет длительность каждого запроса к Bot API."""
+
+    async def __call__(self, make_request, bot, method):
+        started = perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            TELEGRAM_SEND.observe(perf_counter() - started, type(method).__name__)
+
+
+async def event_loop_lag_task(interval: float = 0.5):
+    """Засыпает на interval и измеряет, насколько позже event loop её разбудил."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.set(value=max(0.0, loop.time() - started - interval))
+
+
+async def start_metrics_server(host: str = None, port: int = None) -> web.AppRunner:
+    """Поднимает HTTP-эндпоинт /metrics в формате Prometheus text exposition."""
+
+    async def handle(request):
+        return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    host = config.metrics_host if host is None else host
+    port = config.metrics_port if port is None else port
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,171 @@
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+from aiogram.types import FSInputFile
+
+import config
+import metrics
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_SENT = metrics.counter("monitor_notify_total", "Уведомления по результату отправки", ("result",))
+NOTIFY_RETRIES = metrics.counter("monitor_notify_retries_total", "Повторы отправки уведомлений", ("reason",))
+
+
+class _Message:
+    __slots__ = ("chat_id", "text", "photo", "parse_mode", "done")
+
+    def __init__(self, chat_id, text: str, photo: Optional[str], parse_mode: Optional[str], done: Optional[asyncio.Future]) -> None:
+        self.chat_id = chat_id
+        self.text = text
+        self.photo = photo
+        self.parse_mode = parse_mode
+        self.done = done
+
+
+class Notifier:
+    """
+    Очереди исходящих сообщений в Telegram с отдельным воркером.
+    notify() — оповещения: никогда не блокирует вызывающего (при переполнении сообщение отбрасывается).
+    send() — отчёты: ждёт места в своей очереди и подтверждения отправки.
+    Оповещения всегда уходят раньше отчётов, а отчёты не тратят последние
+    telegram_alert_reserve токенов ведра чата и общего ведра, поэтому пачка отчётов
+    не задерживает оповещение о падении.
+    Частота ограничена общим ведром токенов и ведром на каждый чат, RetryAfter и
+    сетевые ошибки повторяются до notify_max_retries раз.
+    """
+
+    def __init__(self, bot: Bot, queue_size: int = None) -> None:
+        self.bot = bot
+        size = config.notify_queue_size if queue_size is None else queue_size
+        self._alerts: asyncio.Queue = asyncio.Queue(maxsize=size)
+        self._reports: asyncio.Queue = asyncio.Queue(maxsize=size)
+        self._wakeup = asyncio.Event()
+        self._global = TokenBucket(config.telegram_global_rate, config.telegram_global_rate)
+        self._chats: Dict[object, TokenBucket] = {}
+        self._task: Optional[asyncio.Task] = None
+        metrics.gauge("monitor_notify_queue_depth", "Сообщений в очереди на отправку",
+                      callback=lambda: self._alerts.qsize() + self._reports.qsize())
+
+    def notify(self, text: str, chat_id=None, parse_mode: str = None, photo: str = None) -> bool:
+        """Ставит оповещение в очередь без ожидания. False — очередь переполнена, сообщение отброшено."""
+        self._ensure_worker()
+        try:
+            self._alerts.put_nowait(_Message(chat_id or config.admin_id, text, photo, parse_mode, None))
+            self._wakeup.set()
+            return True
+        except asyncio.QueueFull:
+            NOTIFY_SENT.inc("dropped")
+            logger.warning(f"Очередь уведомлений переполнена, сообщение отброшено: {text[:100]}")
+            return False
+
+    async def send(self, text: str, chat_id=None, parse_mode: str = None, photo: str = None) -> bool:
+        """Ставит отчёт в очередь и ждёт результата отправки."""
+        self._ensure_worker()
+        done = asyncio.get_running_loop().create_future()
+        await self._reports.put(_Message(chat_id or config.admin_id, text, photo, parse_mode, done))
+        self._wakeup.set()
+        return await done
+
+    def _ensure_worker(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._worker())
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Досылает очереди (не дольше timeout) и останавливает воркер."""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.gather(self._alerts.join(), self._reports.join()), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Не досланы {self._alerts.qsize() + self._reports.qsize()} уведомлений")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(config.telegram_chat_rate, config.telegram_chat_burst)
+        return bucket
+
+    def _report_wait(self, message: _Message) -> float:
+        """Через сколько отчёт можно отправить, не трогая запас токенов для оповещений."""
+        now = asyncio.get_running_loop().time()
+        reserve = config.telegram_alert_reserve
+        return max(self._chat_bucket(message.chat_id).wait_time(now, reserve), self._global.wait_time(now, reserve))
+
+    async def _worker(self) -> None:
+        # отчёт, взятый из очереди и ждущий токенов; пока он ждёт, оповещения уходят первыми
+        report: Optional[_Message] = None
+        try:
+            while True:
+                if not self._alerts.empty():
+                    await self._process(self._alerts, self._alerts.get_nowait(), 0.0)
+                    continue
+                if report is None and not self._reports.empty():
+                    report = self._reports.get_nowait()
+                wait = None
+                if report is not None:
+                    wait = self._report_wait(report)
+                    if wait <= 0:
+                        message, report = report, None
+                        await self._process(self._reports, message, config.telegram_alert_reserve)
+                        continue
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            if report is not None:
+                if report.done is not None and not report.done.done():
+                    report.done.cancel()
+                self._reports.task_done()
+            raise
+
+    async def _process(self, queue: asyncio.Queue, message: _Message, reserve: float) -> None:
+        try:
+            ok = await self._deliver(message, reserve)
+        except asyncio.CancelledError:
+            if message.done is not None and not message.done.done():
+                message.done.cancel()
+            raise
+        finally:
+            queue.task_done()
+        if message.done is not None and not message.done.done():
+            message.done.set_result(ok)
+
+    async def _deliver(self, message: _Message, reserve: float = 0.0) -> bool:
+        bucket = self._chat_bucket(message.chat_id)
+        for attempt in range(config.notify_max_retries + 1):
+            await bucket.acquire(reserve)
+            await self._global.acquire(reserve)
+            try:
+                if message.photo:
+                    await self.bot.send_photo(chat_id=message.chat_id, photo=FSInputFile(message.photo),
+                                              caption=message.text, parse_mode=message.parse_mode)
+                else:
+                    await self.bot.send_message(message.chat_id, message.text, parse_mode=message.parse_mode)
+                NOTIFY_SENT.inc("sent")
+                return True
+            except TelegramRetryAfter as e:
+                NOTIFY_RETRIES.inc("retry_after")
+                logger.warning(f"Telegram просит подождать {e.retry_after}s")
+                await asyncio.sleep(e.retry_after)
+            except TelegramNetworkError as e:
+                NOTIFY_RETRIES.inc("network")
+                logger.warning(f"Сетевая ошибка Telegram (попытка {attempt + 1}): {e}")
+                await asyncio.sleep(min(2 ** attempt, 30))
+            except Exception as e:
+                logger.error(f"Ошибка отправки сообщения: {e}")
+                break
+        NOTIFY_SENT.inc("failed")
+        return False
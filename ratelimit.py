@@ -0,0 +1,144 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from time import perf_counter
+from typing import Callable, Deque, Dict, Optional
+
+import config
+import metrics
+
+HOST_WAIT = metrics.histogram("monitor_host_limit_wait_seconds", "Ожидание слота по лимитам хоста перед проверкой")
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity про запас."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated: Optional[float] = None
+
+    def delay(self, now: float, reserve: float = 0.0) -> float:
+        """
+        Сколько ждать до появления токена (0 — токен есть и уже списан).
+        reserve — сколько токенов должно остаться в ведре после списания.
+        """
+        wait = self.wait_time(now, reserve)
+        if wait <= 0:
+            self.tokens -= 1
+        return wait
+
+    def wait_time(self, now: float, reserve: float = 0.0) -> float:
+        """То же, что delay(), но без списания токена."""
+        if self.updated is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        need = 1 + min(reserve, max(self.capacity - 1, 0))
+        if self.tokens >= need:
+            return 0.0
+        return (need - self.tokens) / self.rate
+
+    async def acquire(self, reserve: float = 0.0) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            wait = self.delay(loop.time(), reserve)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+
+class HostLimiter:
+    """
+    Вежливость к хостам: не больше concurrency одновременных проверок и rate запросов
+    в секунду на один хост (0 — без ограничения). Ожидание слота не входит во время отклика.
+    try_acquire() не ждёт: планировщик откладывает проверку хоста, упёршегося в лимит,
+    и не держит на ожидании воркер. slot() — ожидающий вариант для разовых проверок.
+    """
+
+    def __init__(self, concurrency: int = None, rate: float = None, burst: int = None) -> None:
+        self.concurrency = config.host_concurrency if concurrency is None else concurrency
+        self.rate = config.host_rate if rate is None else rate
+        self.burst = config.host_burst if burst is None else burst
+        self._active: Dict[str, int] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        # кто ждёт освобождения слота хоста, по порядку
+        self._waiters: Dict[str, Deque[Callable[[], bool]]] = {}
+
+    def _limited(self, host: Optional[str]) -> bool:
+        return bool(host) and (self.concurrency > 0 or self.rate > 0)
+
+    def try_acquire(self, host: Optional[str]) -> Optional[float]:
+        """
+        Занимает слот хоста без ожидания. 0 — слот занят, его нужно вернуть через release();
+        число — через сколько секунд появится токен; None — все слоты хоста заняты,
+        ждать освобождения (notify_release).
+        """
+        if not self._limited(host):
+            return 0.0
+        if self.concurrency > 0 and self._active.get(host, 0) >= self.concurrency:
+            return None
+        if self.rate > 0:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, max(self.burst, 1))
+            wait = bucket.delay(asyncio.get_running_loop().time())
+            if wait > 0:
+                return wait
+        if self.concurrency > 0:
+            self._active[host] = self._active.get(host, 0) + 1
+        return 0.0
+
+    def release(self, host: Optional[str]) -> None:
+        if not self._limited(host) or self.concurrency <= 0:
+            return
+        active = self._active.get(host, 0) - 1
+        if active > 0:
+            self._active[host] = active
+        else:
+            self._active.pop(host, None)
+        self._wake(host)
+
+    def _wake(self, host: str) -> None:
+        waiters = self._waiters.get(host)
+        while waiters:
+            if waiters.popleft()():
+                break
+        if not waiters:
+            self._waiters.pop(host, None)
+
+    def notify_release(self, host: str, callback: Callable[[], bool]) -> None:
+        """
+        callback вызывается, когда у хоста освободится слот. Он возвращает False,
+        если ожидание уже не нужно, — тогда будится следующий ожидающий.
+        """
+        self._waiters.setdefault(host, deque()).append(callback)
+
+    @asynccontextmanager
+    async def slot(self, host: Optional[str]):
+        if not self._limited(host):
+            yield
+            return
+        started = perf_counter()
+        loop = asyncio.get_running_loop()
+        while True:
+            wait = self.try_acquire(host)
+            if wait == 0:
+                break
+            if wait is not None:
+                await asyncio.sleep(wait)
+                continue
+            waiter = loop.create_future()
+            self.notify_release(host, lambda waiter=waiter: not waiter.done() and (waiter.set_result(None) or True))
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # освобождение досталось нам, но мы уходим — передаём его следующему
+                    self._wake(host)
+                raise
+        HOST_WAIT.observe(perf_counter() - started)
+        try:
+            yield
+        finally:
+            self.release(host)
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from time import perf_counter
+from typing import Dict, List, Optional
+
+import config
+import rollups
+import sketch
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RetentionPolicy:
+    """Сколько дней хранить сырые проверки и агрегаты. 0 — хранить без ограничений."""
+    raw_days: int = config.raw_retention_days
+    rollup_days: Dict[str, int] = field(default_factory=lambda: dict(config.rollup_retention_days))
+    batch_size: int = config.retention_batch_size
+    batch_pause: float = config.retention_batch_pause
+
+
+@dataclass
+class PurgeResult:
+    table: str
+    rows: int = 0
+    partitions: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+
+async def purge_table(db, table: str, column: str, days: int, policy: RetentionPolicy,
+                      order_by: Optional[str] = None) -> PurgeResult:
+    """
+    Чистит одну таблицу: сначала сбрасывает целиком устаревшие партиции (если таблица
+    партиционирована по времени), затем удаляет остаток небольшими пачками с паузами,
+    чтобы не блокировать вставку новых проверок.
+    """
+    result = PurgeResult(table)
+    started = perf_counter()
+    cutoff = datetime.now() - timedelta(days=days)
+
+    partitions = await db.get_expired_partitions(table, cutoff)
+    if partitions:
+        await db.drop_partitions(table, partitions)
+        result.partitions = partitions
+
+    while True:
+        deleted = await db.purge_batch(table, column, cutoff, policy.batch_size, order_by)
+        result.rows += deleted
+        if deleted < policy.batch_size:
+            break
+        await asyncio.sleep(policy.batch_pause)
+
+    result.seconds = perf_counter() - started
+    return result
+
+
+async def apply_retention(db, policy: RetentionPolicy = None) -> List[PurgeResult]:
+    """Применяет политику хранения ко всем таблицам и возвращает итоги по каждой."""
+    policy = policy or RetentionPolicy()
+    results = []
+    if policy.raw_days:
+        # сырые проверки, ещё не свёрнутые в агрегаты (до backfill-rollups), удалять нельзя — отчёты их потеряют
+        unrolled = await db.first_unrolled_day(datetime.now() - timedelta(days=policy.raw_days))
+        if unrolled is not None:
+            logger.error(f"Сырые проверки не удаляются: с {unrolled} они не свёрнуты в агрегаты, "
+                         f"выполните python manage.py backfill-rollups")
+        else:
+            # id растёт вместе с checked_at, поэтому удаление идёт по первичному ключу с начала таблицы
+            results.append(await purge_table(db, "checks", "checked_at", policy.raw_days, policy, order_by="id"))
+    for granularity, days in policy.rollup_days.items():
+        if days:
+            # удаление идёт с начала индекса idx_<таблица>_bucket, а не перебором таблицы по первичному ключу
+            results.append(await purge_table(db, rollups.table_name(granularity), "bucket_start", days, policy,
+                                             order_by="bucket_start"))
+            if granularity in sketch.GRANULARITIES:
+                # скетчи живут столько же, сколько агрегаты той же гранулярности
+                results.append(await purge_table(db, sketch.table_name(granularity), "bucket_start", days, policy,
+                                                 order_by="bucket_start"))
+    for r in results:
+        dropped = f", партиций: {len(r.partitions)}" if r.partitions else ""
+        logger.info(f"Очистка {r.table}: удалено строк {r.rows}{dropped} за {r.seconds:.1f}s")
+    return results
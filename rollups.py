@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Гранулярности агрегатов: имя -> длина бакета
+GRANULARITIES = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+# Верхние границы бакетов гистограммы времени отклика (мс), последний бакет — всё, что больше
+LATENCY_BUCKETS_MS = (50, 100, 200, 300, 500, 750, 1000, 2000, 5000, 10000)
+HIST_COLUMNS = tuple(f"h{i}" for i in range(len(LATENCY_BUCKETS_MS) + 1))
+
+# Фазы запроса: по каждой храним сумму и число замеров (фаза есть не у каждой проверки)
+PHASES = ("dns", "connect", "ttfb")
+PHASE_COLUMNS = tuple(c for p in PHASES for c in (f"{p}_sum_ms", f"{p}_cnt"))
+
+
+def table_name(granularity: str) -> str:
+    return f"checks_rollup_{granularity}"
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    """Начало бакета, в который попадает момент ts."""
+    if granularity == "minute":
+        return ts.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Неизвестная гранулярность: {granularity}")
+
+
+def hist_index(response_time_ms: float) -> int:
+    for i, bound in enumerate(LATENCY_BUCKETS_MS):
+        if response_time_ms <= bound:
+            return i
+    return len(LATENCY_BUCKETS_MS)
+
+
+def pick_granularity(since: datetime, until: Optional[datetime] = None) -> str:
+    """
+    Самый грубый агрегат, которого ещё хватает для окна:
+    до 6 часов — минутный, до 90 дней — часовой, дальше — дневной.
+    """
+    span = (until or datetime.now()) - since
+    if span <= timedelta(hours=6):
+        return "minute"
+    if span <= timedelta(days=90):
+        return "hour"
+    return "day"
+
+
+class Rollup:
+    """Счётчики одного бакета: число проверок, успешных, сумма/мин/макс и гистограмма отклика."""
+    __slots__ = ("cnt", "ok_cnt", "sum_ms", "min_ms", "max_ms", "hist", "phases")
+
+    def __init__(self) -> None:
+        self.cnt = 0
+        self.ok_cnt = 0
+        self.sum_ms = 0
+        self.min_ms: Optional[int] = None
+        self.max_ms: Optional[int] = None
+        self.hist = [0] * len(HIST_COLUMNS)
+        self.phases = [0] * len(PHASE_COLUMNS)
+
+    def add(self, is_ok: bool, response_time_ms: Optional[float], phases: Sequence[Optional[float]] = ()) -> None:
+        self.cnt += 1
+        for i, value in enumerate(phases):
+            if value is not None:
+                self.phases[2 * i] += int(round(value))
+                self.phases[2 * i + 1] += 1
+        if not is_ok:
+            return
+        self.ok_cnt += 1
+        # задержка считается только по успешным проверкам, как и среднее в отчёте
+        if response_time_ms is None:
+            return
+        ms = int(round(response_time_ms))
+        self.sum_ms += ms
+        self.min_ms = ms if self.min_ms is None else min(self.min_ms, ms)
+        self.max_ms = ms if self.max_ms is None else max(self.max_ms, ms)
+        self.hist[hist_index(ms)] += 1
+
+
+def aggregate_checks(rows: Iterable[Tuple]) -> Dict[str, Dict[Tuple[int, datetime], Rollup]]:
+    """
+    Сворачивает пачку проверок (site_id, checked_at, status_code, is_ok, response_time_ms,
+    error, dns_ms, connect_ms, ttfb_ms)
+    в бакеты всех гранулярностей.
+    """
+    result: Dict[str, Dict[Tuple[int, datetime], Rollup]] = {g: {} for g in GRANULARITIES}
+    for row in rows:
+        site_id, checked_at, _status_code, is_ok, response_time_ms = row[:5]
+        phases = row[6:6 + len(PHASES)]
+        for granularity, buckets in result.items():
+            key = (site_id, bucket_start(checked_at, granularity))
+            rollup = buckets.get(key)
+            if rollup is None:
+                rollup = buckets[key] = Rollup()
+            rollup.add(bool(is_ok), response_time_ms, phases)
+    return result
+
+
+def percentile_from_hist(hist: List[int], q: float, max_ms: Optional[float] = None) -> Optional[float]:
+    """
+    Оценка перцентиля по гистограмме: верхняя граница бакета, в который попадает q.
+    Для последнего (открытого) бакета используется max_ms, если он известен.
+    """
+    total = sum(hist)
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for i, count in enumerate(hist):
+        seen += count
+        if seen >= rank:
+            break
+    if i < len(LATENCY_BUCKETS_MS):
+        return float(LATENCY_BUCKETS_MS[i])
+    return float(max_ms if max_ms is not None else LATENCY_BUCKETS_MS[-1])
+
+
+def phase_averages(row) -> Dict[str, Optional[float]]:
+    """Средние длительности фаз по просуммированной строке агрегата."""
+    result = {}
+    for phase in PHASES:
+        cnt = int(row.get(f"{phase}_cnt") or 0)
+        result[phase] = float(row[f"{phase}_sum_ms"]) / cnt if cnt else None
+    return result
@@ -0,0 +1,241 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import zlib
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+import config
+import metrics
+from ratelimit import HOST_WAIT, HostLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    """Запись в куче планировщика. Отменённая запись просто помечается и пропускается."""
+    __slots__ = ("due", "seq", "key", "site", "cancelled", "planned", "host", "deferred_at")
+
+    def __init__(self, due: float, seq: int, key, site) -> None:
+        self.due = due
+        self.seq = seq
+        self.key = key
+        self.site = site
+        self.cancelled = False
+        # время по расписанию; due может сдвинуться, пока хост упирается в лимиты
+        self.planned = due
+        # хост, слот которого занят под эту проверку
+        self.host = None
+        self.deferred_at: Optional[float] = None
+
+    def __lt__(self, other: "_Entry") -> bool:
+        return (self.due, self.seq) < (other.due, other.seq)
+
+
+def jitter(key, interval: float) -> float:
+    """Детерминированное смещение старта в пределах интервала, одинаковое между перезапусками."""
+    if interval <= 0:
+        return 0.0
+    return (zlib.crc32(str(key).encode("utf-8")) % 10_000) / 10_000 * interval
+
+
+class ProbeScheduler:
+    """
+    Единый планировщик проверок.
+    Хранит время следующей проверки всех сайтов в куче, один диспетчер
+    выбирает наступившие проверки и отдаёт их ограниченному пулу воркеров.
+    Следующий запуск считается от запланированного времени, а не от окончания
+    проверки, поэтому интервал не «уплывает». Интервал может меняться от проверки
+    к проверке (адаптивный режим), он запрашивается у interval(site).
+    Лимиты хоста (limiter) проверяются до передачи воркеру: проверка хоста, у которого
+    нет свободного слота или токена, откладывается до его освобождения, а воркер
+    тем временем проверяет другие хосты.
+    """
+
+    def __init__(self, probe: Callable[[object], Awaitable[None]], workers: int = None,
+                 interval: Callable[[object], float] = None, limiter: HostLimiter = None,
+                 host: Callable[[object], Optional[str]] = None) -> None:
+        self.probe = probe
+        # интервал до следующей проверки; по умолчанию фиксированный check_interval
+        self.interval = interval or (lambda site: site.check_interval)
+        self.workers = config.probe_workers if workers is None else workers
+        self.limiter = limiter
+        self.host = host
+        self._heap: List[_Entry] = []
+        self._entries: Dict[object, _Entry] = {}
+        self._inflight: Set[object] = set()
+        # записи, ждущие освобождения слота своего хоста
+        self._parked: Set[_Entry] = set()
+        self._seq = itertools.count()
+        self._queue: Optional[asyncio.Queue] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self.lag_ms: Dict[object, float] = {}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def schedule(self, key, site, delay: float = None) -> None:
+        """
+        Ставит сайт в расписание (или переставляет, если он уже там).
+        Без delay первая проверка разносится по интервалу детерминированным джиттером.
+        """
+        self.unschedule(key)
+        if delay is None:
+            delay = jitter(key, site.check_interval)
+        self._push(key, site, self._now() + delay)
+
+    def unschedule(self, key) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry.cancelled = True
+        self.lag_ms.pop(key, None)
+
+    def _push(self, key, site, due: float) -> None:
+        entry = _Entry(due, next(self._seq), key, site)
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        # будим диспетчер, только если новая запись стала ближайшей
+        if self._wakeup is not None and self._heap[0] is entry:
+            self._wakeup.set()
+
+    def _now(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.workers)
+        self._wakeup = asyncio.Event()
+        self._tasks.append(asyncio.create_task(self._dispatch()))
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # не начатые проверки возвращают слоты хостов, отложенные снова ждут в куче
+        while self._queue is not None and not self._queue.empty():
+            entry = self._queue.get_nowait()
+            self._inflight.discard(entry.key)
+            self._release(entry)
+            self._requeue(entry, entry.due)
+        for entry in list(self._parked):
+            self._parked.discard(entry)
+            self._requeue(entry, entry.due)
+
+    async def _dispatch(self) -> None:
+        while True:
+            while self._heap and self._heap[0].cancelled:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = self._heap[0].due - self._now()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            entry = heapq.heappop(self._heap)
+            if entry.key in self._inflight:
+                # предыдущая проверка ещё идёт — откладываем, не запуская параллельно
+                self._push(entry.key, entry.site, self._now() + min(1.0, entry.site.check_interval))
+                continue
+            if not self._admit(entry):
+                continue
+            self._inflight.add(entry.key)
+            # очередь ограничена числом воркеров: если все заняты, диспетчер ждёт
+            try:
+                await self._queue.put(entry)
+            except asyncio.CancelledError:
+                self._inflight.discard(entry.key)
+                self._release(entry)
+                self._requeue(entry, entry.due)
+                raise
+
+    def _admit(self, entry: _Entry) -> bool:
+        """Занимает слот хоста; если хост упёрся в лимит, откладывает запись и возвращает False."""
+        if self.limiter is None or self.host is None:
+            return True
+        host = self.host(entry.site)
+        wait = self.limiter.try_acquire(host)
+        if wait == 0:
+            entry.host = host
+            if entry.deferred_at is not None:
+                HOST_WAIT.observe(self._now() - entry.deferred_at)
+                entry.deferred_at = None
+            return True
+        if entry.deferred_at is None:
+            entry.deferred_at = self._now()
+        if wait is None:
+            self._parked.add(entry)
+            self.limiter.notify_release(host, lambda: self._unpark(entry))
+        else:
+            self._requeue(entry, self._now() + wait)
+        return False
+
+    def _unpark(self, entry: _Entry) -> bool:
+        if entry not in self._parked:
+            return False
+        self._parked.discard(entry)
+        if entry.cancelled:
+            return False
+        self._requeue(entry, entry.due)
+        return True
+
+    def _requeue(self, entry: _Entry, due: float) -> None:
+        """Возвращает в кучу уже вынутую запись, сохраняя время по расписанию."""
+        if entry.cancelled:
+            return
+        entry.due = due
+        heapq.heappush(self._heap, entry)
+        if self._wakeup is not None and self._heap[0] is entry:
+            self._wakeup.set()
+
+    def _release(self, entry: _Entry) -> None:
+        if entry.host is not None:
+            self.limiter.release(entry.host)
+            entry.host = None
+
+    async def _worker(self) -> None:
+        while True:
+            entry = await self._queue.get()
+            lag = self._now() - entry.planned
+            self.lag_ms[entry.key] = lag * 1000.0
+            metrics.SCHEDULER_LAG.observe(lag)
+            try:
+                if not entry.cancelled:
+                    await self.probe(entry.site)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка проверки {entry.key}: {e}")
+            finally:
+                self._inflight.discard(entry.key)
+                self._release(entry)
+                self._queue.task_done()
+            # перепланируем только если запись не отменили и не заменили за время проверки
+            if self._entries.get(entry.key) is entry and entry.site.enabled:
+                next_due = entry.planned + self.interval(entry.site)
+                now = self._now()
+                if next_due < now:
+                    # проверка или очередь отстали больше чем на интервал — не догоняем пачкой
+                    next_due = now
+                self._push(entry.key, entry.site, next_due)
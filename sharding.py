@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import os
+import socket
+from typing import Awaitable, Callable, List, Optional, Set
+
+import config
+
+logger = logging.getLogger(__name__)
+
+LEADER_LEASE = "leader"
+
+
+def shard_of(site_id: int, shard_count: int) -> int:
+    return site_id % shard_count
+
+
+def assign_shards(shard_count: int, instances: List[str], instance_id: str) -> Set[int]:
+    """
+    Доля шардов экземпляра при данном составе живых экземпляров.
+    Раскладка детерминирована, поэтому все экземпляры сходятся к одному разбиению
+    без переговоров; аренды в БД лишь гарантируют, что шард не возьмут двое сразу.
+    """
+    members = sorted(set(instances))
+    if instance_id not in members:
+        return set()
+    position = members.index(instance_id)
+    return {shard for shard in range(shard_count) if shard % len(members) == position}
+
+
+def default_instance_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class ShardCoordinator:
+    """
+    Делит сайты между несколькими экземплярами мониторинга через аренды в БД.
+    Каждый экземпляр шлёт heartbeat, вычисляет свою долю шардов, продлевает аренды
+    своих шардов и отпускает лишние. Аренда «leader» определяет экземпляр, который
+    запускает Telegram-бота и фоновые отчёты.
+    """
+
+    def __init__(self, db, on_change: Callable[[Set[int], Set[int]], Awaitable[None]] = None,
+                 instance_id: str = None, shard_count: int = None) -> None:
+        self.db = db
+        self.on_change = on_change
+        self.instance_id = instance_id or config.instance_id or default_instance_id()
+        self.shard_count = config.shard_count if shard_count is None else shard_count
+        self.owned: Set[int] = set()
+        self.is_leader = False
+        self._leader_event = asyncio.Event()
+        self._follower_event = asyncio.Event()
+        self._follower_event.set()
+        # когда аренды экземпляра последний раз подтверждены в БД
+        self._renewed_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def owns(self, site_id: Optional[int]) -> bool:
+        return site_id is not None and shard_of(site_id, self.shard_count) in self.owned
+
+    async def wait_leader(self) -> None:
+        await self._leader_event.wait()
+
+    async def wait_follower(self) -> None:
+        """Ждёт, пока экземпляр не перестанет быть ведущим."""
+        await self._follower_event.wait()
+
+    def _set_leader(self, is_leader: bool) -> None:
+        self.is_leader = is_leader
+        if is_leader and not self._leader_event.is_set():
+            logger.info(f"{self.instance_id} стал ведущим экземпляром")
+            self._leader_event.set()
+            self._follower_event.clear()
+        elif not is_leader and self._leader_event.is_set():
+            logger.warning(f"{self.instance_id} потерял аренду ведущего")
+            self._leader_event.clear()
+            self._follower_event.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.db.release_leases(self.instance_id)
+        except Exception as e:
+            logger.error(f"Не удалось освободить аренды {self.instance_id}: {e}")
+
+    async def _run(self) -> None:
+        await self.db.ensure_leases([f"shard:{i}" for i in range(self.shard_count)] + [LEADER_LEASE])
+        while True:
+            try:
+                await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка координации шардов: {e}")
+                # аренды не удалось продлить: после их истечения шарды и роль ведущего может взять другой экземпляр
+                if self._renewed_at is None or asyncio.get_running_loop().time() - self._renewed_at >= config.lease_ttl:
+                    await self._drop_leases()
+            await asyncio.sleep(config.heartbeat_interval)
+
+    async def _drop_leases(self) -> None:
+        """Перестаёт считать своими истёкшие аренды: снимает роль ведущего и отдаёт шарды."""
+        self._set_leader(False)
+        if not self.owned:
+            return
+        lost, self.owned = self.owned, set()
+        logger.warning(f"{self.instance_id}: аренды истекли, шардов -{len(lost)}")
+        if self.on_change is not None:
+            try:
+                await self.on_change(set(), lost)
+            except Exception as e:
+                logger.error(f"Не удалось снять с проверки сайты истёкших шардов: {e}")
+
+    async def tick(self) -> None:
+        ttl = config.lease_ttl
+        await self.db.heartbeat(self.instance_id)
+        live = await self.db.get_live_instances(ttl)
+        target = assign_shards(self.shard_count, live, self.instance_id)
+
+        release = [f"shard:{i}" for i in self.owned - target]
+        if release:
+            await self.db.release_leases(self.instance_id, release)
+        # аренду ведущего пытаются взять все, достаётся первому, дальше он её продлевает
+        claimed_at = asyncio.get_running_loop().time()
+        await self.db.claim_leases(self.instance_id, [f"shard:{i}" for i in target] + [LEADER_LEASE], ttl)
+        held = await self.db.get_held_leases(self.instance_id)
+        owned = {int(name.split(":", 1)[1]) for name in held if name.startswith("shard:")}
+
+        self._renewed_at = claimed_at
+        self._set_leader(LEADER_LEASE in held)
+
+        gained, lost = owned - self.owned, self.owned - owned
+        self.owned = owned
+        if gained or lost:
+            logger.info(
+                f"{self.instance_id}: живых экземпляров {len(live)}, шардов {len(owned)} "
+                f"(+{len(gained)} / -{len(lost)})"
+            )
+            if self.on_change is not None:
+                await self.on_change(gained, lost)
@@ -0,0 +1,131 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import adaptive
+import config
+import gui
+
+FILTER_ALL = "a"
+FILTER_DOWN = "d"
+FILTER_OFF = "o"
+FILTERS = {
+    FILTER_ALL: "Все",
+    FILTER_DOWN: "🔴 Упавшие",
+    FILTER_OFF: "⏸ Выключенные",
+}
+
+
+def site_state(site) -> str:
+    """Состояние сайта для списка: off — выключен, down — подтверждённо упал, up — работает."""
+    if not site.enabled:
+        return "off"
+    if site.consecutive_failures >= adaptive.DOWN_THRESHOLD:
+        return "down"
+    return "up"
+
+
+def matches(site, flt: str, prefix: Optional[str]) -> bool:
+    if prefix and not site.name.casefold().startswith(prefix):
+        return False
+    if flt == FILTER_DOWN:
+        return site_state(site) == "down"
+    if flt == FILTER_OFF:
+        return site_state(site) == "off"
+    return True
+
+
+class SiteListKeyboards:
+    """
+    Постраничный список сайтов в боте с кэшем.
+    Для каждой пары (фильтр, поиск) кэшируется упорядоченный список id и готовые страницы.
+    invalidate() сбрасывает только то, что задел изменившийся сайт: страницу, на которой
+    он стоит, или весь список, если сайт в него вошёл, выпал из него или сменил имя
+    (от имени зависит порядок).
+    """
+
+    def __init__(self, page_size: int = None, search_limit: int = None) -> None:
+        self.page_size = config.sites_page_size if page_size is None else page_size
+        self.search_limit = config.sites_search_limit if search_limit is None else search_limit
+        # (фильтр, поиск) -> (id по порядку, позиция каждого id)
+        self._lists: Dict[Tuple[str, int], Tuple[List[int], Dict[int, int]]] = {}
+        # (фильтр, поиск) -> {номер страницы: (текст, клавиатура)}
+        self._pages: Dict[Tuple[str, int], Dict[int, tuple]] = {}
+        # поисковые запросы /find: номер -> префикс (номер уходит в callback_data вместо текста)
+        self._queries: "OrderedDict[int, str]" = OrderedDict()
+        self._tokens: Dict[str, int] = {}
+        self._next_token = 1
+
+    def search(self, prefix: str) -> int:
+        """Номер поискового запроса по префиксу имени; старые запросы вытесняются."""
+        prefix = prefix.strip().casefold()[:64]
+        token = self._tokens.get(prefix)
+        if token is not None:
+            self._queries.move_to_end(token)
+            return token
+        token = self._next_token
+        self._next_token += 1
+        self._queries[token] = prefix
+        self._tokens[prefix] = token
+        while len(self._queries) > self.search_limit:
+            old, old_prefix = self._queries.popitem(last=False)
+            del self._tokens[old_prefix]
+            for key in [k for k in self._lists if k[1] == old]:
+                self._drop(key)
+        return token
+
+    def query(self, token: int) -> Optional[str]:
+        """Префикс поиска по номеру; None — запрос забыт (вытеснен или бот перезапущен)."""
+        return self._queries.get(token) if token else None
+
+    def render(self, sites_by_id: Dict[int, object], flt: str = FILTER_ALL, token: int = 0, page: int = 0):
+        """Текст и клавиатура страницы списка. Номер страницы приводится к допустимому."""
+        if flt not in FILTERS:
+            flt = FILTER_ALL
+        key = (flt, token)
+        entry = self._lists.get(key)
+        if entry is None:
+            prefix = self.query(token)
+            selected = [site for site in sites_by_id.values() if matches(site, flt, prefix)]
+            selected.sort(key=lambda site: site.name.casefold())
+            ids = [site.id for site in selected]
+            entry = self._lists[key] = (ids, {site_id: i for i, site_id in enumerate(ids)})
+            self._pages[key] = {}
+        ids = entry[0]
+        pages = max(1, -(-len(ids) // self.page_size))
+        page = min(max(page, 0), pages - 1)
+        cached = self._pages[key].get(page)
+        if cached is None:
+            chunk = [sites_by_id[site_id] for site_id in ids[page * self.page_size:(page + 1) * self.page_size]]
+            text = self._title(flt, self.query(token), len(ids), page, pages)
+            markup = gui.sites_page(chunk, page, pages, flt, token, [site_state(site) for site in chunk], FILTERS)
+            cached = self._pages[key][page] = (text, markup)
+        return cached
+
+    @staticmethod
+    def _title(flt: str, prefix: Optional[str], total: int, page: int, pages: int) -> str:
+        text = f"Сайты ({FILTERS[flt].lower()}): {total}"
+        if prefix:
+            text += f", имя начинается с «{prefix}»"
+        if pages > 1:
+            text += f"\nСтраница {page + 1} из {pages}"
+        return text
+
+    def invalidate(self, site, renamed: bool = False, removed: bool = False) -> None:
+        """Сайт добавлен, удалён, переименован, включён/выключен, упал или восстановился."""
+        for key in list(self._lists):
+            flt, token = key
+            ids, positions = self._lists[key]
+            was_member = site.id in positions
+            is_member = not removed and matches(site, flt, self.query(token))
+            if was_member != is_member or (renamed and is_member):
+                self._drop(key)
+            elif was_member:
+                self._pages[key].pop(positions[site.id] // self.page_size, None)
+
+    def clear(self) -> None:
+        self._lists.clear()
+        self._pages.clear()
+
+    def _drop(self, key: Tuple[str, int]) -> None:
+        self._lists.pop(key, None)
+        self._pages.pop(key, None)
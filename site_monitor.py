@@ -1,5 +1,4 @@
 import asyncio
-import aiohttp
 import logging
 from aiogram.types import FSInputFile
 from datetime import datetime, timedelta
@@ -8,9 +7,23 @@ from dataclasses import dataclass
 from aiogram import Bot
 from time import perf_counter
 from database import Database
+from content_rules import ContentRules
+from http_client import HttpClient, PROBE_GET, is_expected_status, target_host, target_key
+from scheduler import ProbeScheduler, jitter
+from charts import ChartRenderer
+from site_list import SiteListKeyboards
+from notifier import Notifier
+from alerts import AlertAggregator
+from sharding import ShardCoordinator, shard_of
+import adaptive
+import metrics
+import rollups
+import sketch
+import retention
 import config
-import matplotlib.pyplot as plt
 import csv
+import gzip
+import os
 logger = logging.getLogger(__name__)
 
 
@@ -30,153 +43,415 @@ class SiteConfig:
     last_response_time_ms: Optional[float] = None
     consecutive_failures: int = 0
     notify_on_failure: bool = True
+    cold_connection: bool = False  # новое соединение (DNS + TCP + TLS) на каждую проверку
+    fresh_dns: bool = False  # резолвить имя заново на каждую проверку, минуя общий DNS-кэш
+    probe_mode: str = PROBE_GET  # get / head / headers / range, см. http_client.PROBE_MODES
+    max_body_bytes: int = config.probe_max_body_bytes  # лимит тела для режима range
+    content_rules: Optional[ContentRules] = None  # проверки тела ответа, см. content_rules.py
+    adaptive: bool = False  # адаптивный интервал, см. adaptive.py
+    min_interval: Optional[int] = None  # границы адаптивного интервала, None — по умолчанию
+    max_interval: Optional[int] = None
+    flap_score: float = 0.0  # оценка частоты смены состояния, не хранится в БД
+    id: Optional[int] = None  # первичный ключ в таблице sites
+
+# поля конфигурации, которые хранятся в sites и синхронизируются с БД
+SITE_FIELDS = ("name", "url", "check_interval", "timeout", "expected_status", "enabled",
+               "notify_on_down", "notify_on_recovery", "cold_connection", "fresh_dns", "probe_mode",
+               "max_body_bytes", "content_rules", "adaptive", "min_interval", "max_interval")
+# изменение этих полей требует перепланировать проверку
+RESCHEDULE_FIELDS = {"url", "timeout", "check_interval"}
+
 
 class SiteMonitor:
-    def __init__(self, bot:Bot, db:Database) -> None:
+    def __init__(self, bot:Bot, db:Database, coordinator: Optional[ShardCoordinator] = None) -> None:
         self.bot = bot
         self.db = db
-        self.sites: List[SiteConfig] = []
+        # при шардировании проверяем только сайты из своих шардов
+        self.coordinator = coordinator
+        self._sites_by_name: Dict[str, SiteConfig] = {}
+        self._sites_by_id: Dict[int, SiteConfig] = {}
         self.running = False
-        self.site_tasks: dict[str, asyncio.Task] = {}
+        self._sync_watermark: Optional[datetime] = None
+        self._sync_task: Optional[asyncio.Task] = None
+        self.http = HttpClient()
+        # лимиты хоста проверяет планировщик до передачи проверки воркеру
+        self.scheduler = ProbeScheduler(self.check_site_availability, interval=adaptive.next_interval,
+                                        limiter=self.http.limiter, host=target_host)
+        self.charts = ChartRenderer()
+        self.site_lists = SiteListKeyboards()
+        # уведомления уходят через очередь, проверка не ждёт Telegram
+        self.notifier = Notifier(bot)
+        self.alerts = AlertAggregator(self.notifier, self._monitored_sites)
+        metrics.gauge("monitor_probes_in_flight", "Проверок выполняется прямо сейчас",
+                      callback=lambda: self.scheduler.in_flight)
+        metrics.gauge("monitor_site_scheduler_lag_seconds", "Отставание последнего запуска проверки сайта", ("site",),
+                      callback=self._lag_by_site)
+
+    @property
+    def sites(self) -> List[SiteConfig]:
+        return list(self._sites_by_name.values())
+
+    def get_site(self, name: str) -> Optional[SiteConfig]:
+        return self._sites_by_name.get(name)
+
+    def get_site_by_id(self, site_id: int) -> Optional[SiteConfig]:
+        return self._sites_by_id.get(site_id)
+
+    def sites_page(self, flt: str = "a", query: int = 0, page: int = 0):
+        """Текст и клавиатура страницы списка сайтов для бота (из кэша SiteListKeyboards)"""
+        return self.site_lists.render(self._sites_by_id, flt, query, page)
+
+    def _monitored_sites(self) -> List[SiteConfig]:
+        # сайты, которые сейчас проверяет этот экземпляр
+        return [site for site in self._sites_by_name.values() if site.enabled and site.id in self.scheduler]
+
+    def _register_site(self, site: SiteConfig) -> None:
+        self._sites_by_name[site.name] = site
+        if site.id is not None:
+            self._sites_by_id[site.id] = site
+        self.site_lists.invalidate(site)
+
+    def _unregister_site(self, site: SiteConfig) -> None:
+        self._sites_by_name.pop(site.name, None)
+        if site.id is not None:
+            self._sites_by_id.pop(site.id, None)
+        self.site_lists.invalidate(site, removed=True)
+
     async def check_site_availability(self, site: SiteConfig) -> None:
-        """Выполняет проверку сайта"""
-        while self.running and site.enabled:
-            timeout = aiohttp.ClientTimeout(total=site.timeout)
-            start_time = perf_counter()
-            status_ok = False
-            response_status = None
-            try:
-                async with aiohttp.ClientSession(timeout=timeout) as session:
-                    async with session.get(site.url) as response:
-                        response_status = response.status
-            except asyncio.TimeoutError:
-                logger.warning(f"{site.name} timeout после {site.timeout}s")
-            except aiohttp.ClientError as e:
-                logger.warning(f"{site.name} ошибка соединения: {e}")
-            except Exception as e:
-                logger.error(f"{site.name} непредвиденная ошибка: {e}")
-            finally:
-                elapsed_ms = (perf_counter() - start_time) * 1000.0
-                site.last_response_time_ms = elapsed_ms
-                site.last_check = datetime.now()
-                if response_status is not None and response_status == site.expected_status:
-                    status_ok = True
-
-                site.last_status = status_ok
-                if status_ok:
-                    if site.consecutive_failures >= 3:
-                        if site.notify_on_recovery:
-                            await self.bot.send_message(config.admin_id,f"{site.name} восстановлен, ответ {response_status}, {elapsed_ms:.0f} ms")
-                        logger.info(f"{site.name} восстановлен, ответ {response_status}, {elapsed_ms:.0f} ms")
-                    else:
-                        logger.debug(f"{site.name} OK, ответ {response_status}, {elapsed_ms:.0f} ms")
-                    site.consecutive_failures = 0
-                    await self.db.add_check(site.name,response_status,True,elapsed_ms)
-                else:
-                    site.consecutive_failures += 1
-                    
-
-                    status_info = response_status if response_status is not None else 'нет ответа'
-                    logger.warning(
-                        f"{site.name} сбой #{site.consecutive_failures},  статус {status_info}, {elapsed_ms:.0f} ms"
-                    )
-                    if site.consecutive_failures == 3 and site.notify_on_down:
-                        await self.bot.send_message(config.admin_id,f"{site.name} сбой, статус {status_info}, {elapsed_ms:.0f} ms")
-                    if status_info == 'нет ответа':
-                        status_info = None
-                    await self.db.add_check(site.name,status_info,False,elapsed_ms)
-            await asyncio.sleep(site.check_interval)
+        """
+        Выполняет одну проверку сайта. Расписанием проверок управляет ProbeScheduler,
+        слоты хоста он занимает до вызова, запрос (с объединением одинаковых целей) — HttpClient.check
+        """
+        result = await self.http.check(site, admitted=True)
+        response_status, error, elapsed_ms, timings = result.status, result.error, result.elapsed_ms, result.timings
+        site.last_response_time_ms = elapsed_ms
+        site.last_check = datetime.now()
+        # ответ с ожидаемым статусом, но не прошедший правила содержимого, — тоже сбой
+        status_ok = is_expected_status(site, response_status) and error is None
+
+        adaptive.record_result(site, site.last_status, status_ok)
+        site.last_status = status_ok
+        metrics.PROBE_LATENCY.observe(elapsed_ms / 1000.0, site.name)
+        metrics.PROBES.inc(site.name, "ok" if status_ok else "fail")
+        if status_ok:
+            if site.consecutive_failures >= 3:
+                if site.notify_on_recovery:
+                    self.alerts.recovered(site, f"{site.name} восстановлен, ответ {response_status}, {elapsed_ms:.0f} ms")
+                logger.info(f"{site.name} восстановлен, ответ {response_status}, {elapsed_ms:.0f} ms")
+            else:
+                logger.debug(f"{site.name} OK, ответ {response_status}, {elapsed_ms:.0f} ms")
+            recovered = site.consecutive_failures >= 3
+            site.consecutive_failures = 0
+            if recovered:
+                self.site_lists.invalidate(site)
+            await self.db.add_check(site.id,response_status,True,elapsed_ms,
+                                    dns_ms=timings.dns_ms, connect_ms=timings.connect_ms, ttfb_ms=timings.ttfb_ms)
+        else:
+            site.consecutive_failures += 1
+            
+
+            status_info = response_status if response_status is not None else 'нет ответа'
+            details = f", {error}" if error and response_status is not None else ""
+            logger.warning(
+                f"{site.name} сбой #{site.consecutive_failures},  статус {status_info}{details}, {elapsed_ms:.0f} ms"
+            )
+            if site.consecutive_failures == 3:
+                self.site_lists.invalidate(site)
+                if site.notify_on_down:
+                    self.alerts.down(site, f"{site.name} сбой, статус {status_info}{details}, {elapsed_ms:.0f} ms")
+            if status_info == 'нет ответа':
+                status_info = None
+            await self.db.add_check(site.id,status_info,False,elapsed_ms,error,
+                                    dns_ms=timings.dns_ms, connect_ms=timings.connect_ms, ttfb_ms=timings.ttfb_ms)
+    @staticmethod
+    def _site_from_row(row) -> SiteConfig:
+        return SiteConfig(row["url"], row["name"], row["check_interval"], row["timeout"], row["expected_status"],
+                          bool(row["enabled"]),
+                          notify_on_down=bool(row.get("notify_on_down", 1)),
+                          notify_on_recovery=bool(row.get("notify_on_recovery", 1)),
+                          cold_connection=bool(row.get("cold_connection", 0)),
+                          fresh_dns=bool(row.get("fresh_dns", 0)),
+                          probe_mode=row.get("probe_mode") or PROBE_GET,
+                          max_body_bytes=row.get("max_body_bytes") or config.probe_max_body_bytes,
+                          content_rules=ContentRules.from_json(row.get("content_rules")),
+                          adaptive=bool(row.get("adaptive", 0)),
+                          min_interval=row.get("min_interval"), max_interval=row.get("max_interval"),
+                          id=row["id"])
+
+    def _advance_watermark(self, rows) -> None:
+        for row in rows:
+            updated = row.get("updated_at") or row.get("created_at")
+            if updated is not None and (self._sync_watermark is None or updated > self._sync_watermark):
+                self._sync_watermark = updated
+
     async def load_sites(self) -> List[SiteConfig]:
         sites_db = await self.db.get_sites()
-        sites = [SiteConfig(site["url"], site["name"], site["check_interval"], site["timeout"], site["expected_status"], site["enabled"]) for site in sites_db]
-        self.sites = sites
+        self._sites_by_name.clear()
+        self._sites_by_id.clear()
+        self.site_lists.clear()
+        self._sync_watermark = None
+        for row in sites_db:
+            self._register_site(self._site_from_row(row))
+        self._advance_watermark(sites_db)
         return self.sites
     async def add_site(self, site):
-        await self.db.add_site(site)
-        self.sites.append(site)
-        self._start_site_task(site)
+        site.id = await self.db.add_site(site)
+        existing = self._sites_by_id.get(site.id)
+        if existing is not None:
+            # синхронизация успела подхватить строку раньше нас
+            self._apply_changes(existing, site)
+            return
+        self._register_site(site)
+        if site.enabled:
+            self._start_site_task(site)
     async def delete_site(self,name):
         deleted = await self.db.delete_site_by_name(name)
-        if deleted:
-            self.sites = [s for s in self.sites if s.name != name]
-            self._stop_site_task(name)
-    
-                    
+        site = self._sites_by_name.get(name)
+        if deleted and site:
+            self._remove_site(site)
+
+    def _remove_site(self, site: SiteConfig) -> None:
+        self._unregister_site(site)
+        self.charts.invalidate(site.id)
+        self._stop_site_task(site)
+
+    def _apply_changes(self, site: SiteConfig, new: SiteConfig) -> set:
+        """
+        Переносит изменённые поля конфигурации в объект сайта на месте.
+        Перепланирует проверку только при смене URL, таймаута или интервала;
+        включение и выключение лишь ставит в расписание или снимает с него —
+        уже идущая проверка при этом не прерывается.
+        """
+        changed = {f for f in SITE_FIELDS if getattr(site, f) != getattr(new, f)}
+        if not changed:
+            return changed
+        self.http.forget(site)
+        if "name" in changed:
+            self._sites_by_name.pop(site.name, None)
+        for f in changed:
+            setattr(site, f, getattr(new, f))
+        if "name" in changed:
+            self._sites_by_name[site.name] = site
+        self.charts.invalidate(site.id)
+        if changed & {"name", "enabled"}:
+            self.site_lists.invalidate(site, renamed="name" in changed)
+
+        if "enabled" in changed:
+            if site.enabled:
+                self._start_site_task(site)
+            else:
+                self._stop_site_task(site)
+        elif site.enabled and changed & RESCHEDULE_FIELDS:
+            self._stop_site_task(site)
+            self._start_site_task(site)
+        logger.info(f"{site.name}: изменены {', '.join(sorted(changed))}")
+        return changed
+
     async def update_site(self, site_name:str, updated_site: SiteConfig):
         """
-        Обновляет сайт в self.sites и в БД
+        Сохраняет новую конфигурацию сайта в БД и применяет изменения на месте
         """
-        for i, site in enumerate(self.sites):
-            if site.name == updated_site.name:
-                # Обновляем локально
-                self.sites[i] = updated_site
-
-                # Перезапускаем таск
-                self._stop_site_task(site.name)
-                if updated_site.enabled:
-                    self._start_site_task(updated_site)
-
-                # Обновляем в БД
-                await self.db.update_site(
-                    old_name=site_name,
-                    name=updated_site.name,
-                    url=updated_site.url,
-
-                    check_interval=updated_site.check_interval,
-                    timeout=updated_site.timeout,
-                    expected_status=updated_site.expected_status,
-                    enabled=int(updated_site.enabled),
-                    notify_on_down = int(updated_site.notify_on_down),
-                    notify_on_recovery = int(updated_site.notify_on_recovery)
-                )
-                break
+        site = self._sites_by_name.get(site_name)
+        if site is None:
+            return
+        await self.db.update_site(
+            old_name=site_name,
+            name=updated_site.name,
+            url=updated_site.url,
+
+            check_interval=updated_site.check_interval,
+            timeout=updated_site.timeout,
+            expected_status=updated_site.expected_status,
+            enabled=int(updated_site.enabled),
+            notify_on_down = int(updated_site.notify_on_down),
+            notify_on_recovery = int(updated_site.notify_on_recovery),
+            cold_connection = int(updated_site.cold_connection),
+            fresh_dns = int(updated_site.fresh_dns),
+            probe_mode = updated_site.probe_mode,
+            max_body_bytes = updated_site.max_body_bytes,
+            content_rules = updated_site.content_rules.to_json() if updated_site.content_rules else None,
+            adaptive = int(updated_site.adaptive),
+            min_interval = updated_site.min_interval,
+            max_interval = updated_site.max_interval
+        )
+        self._apply_changes(site, updated_site)
+        return site
     async def toggle_onoff(self, site_name):
-        site = next((s for s in self.sites if s.name == site_name), None)
-        if site and site.enabled:
-            site.enabled = False
-            self._stop_site_task(site_name)
-        elif site and not site.enabled:
-            site.enabled = True
+        site = self._sites_by_name.get(site_name)
+        if site is None:
+            return None
+        site.enabled = not site.enabled
+        await self.db.set_enabled(site.id, site.enabled)
+        self.site_lists.invalidate(site)
+        if site.enabled:
             self._start_site_task(site)
+        else:
+            self._stop_site_task(site)
+        return site
+
+    async def set_notify_settings(self, site_name: str, notify_on_down: bool = None, notify_on_recovery: bool = None):
+        site = self._sites_by_name.get(site_name)
+        if site is None:
+            return None
+        if notify_on_down is not None:
+            site.notify_on_down = notify_on_down
+        if notify_on_recovery is not None:
+            site.notify_on_recovery = notify_on_recovery
+        await self.db.update_notify_settings(site.name, site.notify_on_down, site.notify_on_recovery)
         return site
-        
+
+    async def sync_sites(self):
+        """
+        Подтягивает изменения таблицы sites, сделанные напрямую в БД или другим экземпляром:
+        строки с updated_at не раньше водяного знака сравниваются с реестром и применяются
+        на месте, пропавшие из таблицы сайты снимаются с мониторинга.
+        """
+        rows = await self.db.get_sites_changed_since(self._sync_watermark)
+        for row in rows:
+            new = self._site_from_row(row)
+            site = self._sites_by_id.get(new.id)
+            if site is None:
+                self._register_site(new)
+                if new.enabled:
+                    self._start_site_task(new)
+                logger.info(f"{new.name}: новый сайт из БД")
+            else:
+                self._apply_changes(site, new)
+        self._advance_watermark(rows)
+
+        ids = await self.db.get_site_ids()
+        for site in [site for site in self._sites_by_id.values() if site.id not in ids]:
+            logger.info(f"{site.name}: сайт удалён из БД")
+            self._remove_site(site)
+
+    async def config_sync_task(self):
+        while True:
+            await asyncio.sleep(config.config_sync_interval)
+            try:
+                await self.sync_sites()
+            except Exception as e:
+                logger.error(f"Ошибка синхронизации конфигурации сайтов: {e}")
+
     async def run_monitoring(self):
         self.running = True
         await self.load_sites()
-        # Запускаем таски для включённых сайтов
+        await self.restore_state()
+        self.scheduler.start()
+        # Ставим в расписание включённые сайты
         for site in self.sites:
             if site.enabled:
                 self._start_site_task(site)
+        if config.config_sync_interval > 0:
+            self._sync_task = asyncio.create_task(self.config_sync_task())
+
+    async def restore_state(self):
+        """
+        Восстанавливает последнее известное состояние сайтов после перезапуска:
+        статус, время и результат последней проверки и серию сбоев. Уже упавший
+        сайт не шлёт повторное оповещение, а первая проверка планируется от last_check.
+        """
+        started = perf_counter()
+        rows = await self.db.get_last_states(config.warm_start_streak_limit)
+        restored = 0
+        for row in rows:
+            site = self._sites_by_id.get(row["site_id"])
+            if site is None:
+                continue
+            site.last_check = row["checked_at"]
+            site.last_status = bool(row["is_ok"])
+            site.last_response_time_ms = row["response_time_ms"]
+            site.consecutive_failures = int(row["failures"] or 0)
+            restored += 1
+        # серии сбоев поменяли состояние сайтов в списке
+        self.site_lists.clear()
+        logger.info(f"Восстановлено состояние {restored} сайтов за {perf_counter() - started:.2f}s")
+
+    def _first_delay(self, site) -> float:
+        """
+        Задержка первой проверки: остаток интервала от последней известной проверки.
+        Просроченные и ни разу не проверенные сайты разносятся джиттером по интервалу,
+        чтобы после долгого простоя не проверять всё разом. Джиттер считается по цели,
+        а не по сайту: дубли одного URL встают в одно время и объединяются.
+        """
+        interval = adaptive.next_interval(site)
+        if site.last_check is not None:
+            remaining = (site.last_check - datetime.now()).total_seconds() + interval
+            if remaining > 0:
+                return min(remaining, interval)
+        return jitter(target_key(site), interval)
+
+    async def stop_monitoring(self):
+        self.running = False
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            self._sync_task = None
+        await self.scheduler.stop()
+        await self.http.close()
+        self.charts.close()
+        await self.alerts.close()
+        await self.notifier.close()
 
     def _start_site_task(self, site):
-        if site.name in self.site_tasks:
+        if site.id in self.scheduler:
+            return
+        if self.coordinator is not None and not self.coordinator.owns(site.id):
             return
-        task = asyncio.create_task(self.check_site_availability(site))
-        self.site_tasks[site.name] = task
+        self.scheduler.schedule(site.id, site, delay=self._first_delay(site))
 
-    def _stop_site_task(self, name):
-        task = self.site_tasks.pop(name, None)
-        if task:
-            task.cancel()
+    def _stop_site_task(self, site):
+        self.scheduler.unschedule(site.id)
+
+    async def on_shards_changed(self, gained: set, lost: set):
+        """Ставит в расписание сайты полученных шардов и снимает сайты отданных"""
+        for site in self.sites:
+            shard = shard_of(site.id, self.coordinator.shard_count)
+            if shard in lost:
+                self._stop_site_task(site)
+            elif shard in gained and site.enabled and self.running:
+                self._start_site_task(site)
+
+    def _lag_by_site(self) -> dict:
+        return {(site.name,): lag / 1000.0 for site_id, lag in list(self.scheduler.lag_ms.items())
+                if (site := self._sites_by_id.get(site_id)) is not None}
+
+    def scheduling_lag(self, name: str) -> Optional[float]:
+        """Отставание последнего запуска проверки от расписания, мс"""
+        site = self._sites_by_name.get(name)
+        return self.scheduler.lag_ms.get(site.id) if site else None
     async def create_report(self, site_name: str, days: int = 7):
         """
         Генерация отчёта по сайту за указанное количество дней.
         """
-        site = next((s for s in self.sites if s.name == site_name), None)
+        site = self._sites_by_name.get(site_name)
         if not site:
             return "❌ Сайт не найден."
 
         since = datetime.now() - timedelta(days=days)
-        checks = await self.db.get_checks_since(since)
-        checks = [c for c in await self.db.get_checks_since(since) if c["site_name"] == site.name]
-        if not checks:
+        # читаем самый грубый агрегат, которого хватает для окна, а не сырые проверки
+        granularity = rollups.pick_granularity(since)
+        stats = await self.db.get_rollup_stats(site.id, granularity, since)
+        latency = await self.db.get_latency_sketch(site.id, sketch.granularity_for(granularity), since)
+        return self._format_report(site, since, stats, days, latency)
+
+    def _format_report(self, site: SiteConfig, since: datetime, stats: Optional[dict], days: int,
+                       latency: Optional[sketch.LatencySketch] = None) -> str:
+        if not stats or not stats["total"]:
             return f"⚠️ Нет данных мониторинга за последние {days} дней."
 
-        total = len(checks)
-        ok = sum(1 for c in checks if c["is_ok"])
+        total = int(stats["total"])
+        ok = int(stats["ok"])
         fail = total - ok
         uptime = (ok / total) * 100 if total else 0
-        avg_response = sum(c["response_time_ms"] for c in checks if c["response_time_ms"]) / ok if ok else 0
+        avg_response = float(stats["sum_ms"]) / ok if ok else 0
+        if latency is not None and latency.count:
+            # скетч даёт квантили с точностью sketch_relative_accuracy
+            p50, p90, p99 = (latency.quantile(q) for q in (0.50, 0.90, 0.99))
+            percentiles = f"📐 p50 / p90 / p99: {p50:.0f} / {p90:.0f} / {p99:.0f} ms\n"
+        else:
+            # за периоды до появления скетчей — грубая оценка по гистограмме агрегатов
+            hist = [int(stats[c]) for c in rollups.HIST_COLUMNS]
+            p50, p90, p99 = (rollups.percentile_from_hist(hist, q, stats["max_ms"]) for q in (0.50, 0.90, 0.99))
+            percentiles = f"📐 p50 / p90 / p99: ≤{p50:.0f} / ≤{p90:.0f} / ≤{p99:.0f} ms\n" if p50 is not None else ""
 
         report_text = f"📊 Отчёт о сайте <b>{site.name}</b>\n"
         report_text += f"Период: {since.strftime('%d.%m.%Y')} — {datetime.now().strftime('%d.%m.%Y')}\n\n"
@@ -184,28 +459,74 @@ class SiteMonitor:
         report_text += f"❌ Недоступен: {fail} раз\n"
         report_text += f"📈 Uptime: {uptime:.2f}%\n"
         report_text += f"⏱ Среднее время отклика: {avg_response:.0f} ms\n"
+        report_text += percentiles
+        phases = rollups.phase_averages(stats)
+        if any(v is not None for v in phases.values()):
+            dns, connect, ttfb = (f"{phases[p]:.0f}" if phases[p] is not None else "–" for p in rollups.PHASES)
+            report_text += f"🔎 DNS / соединение+TLS / TTFB: {dns} / {connect} / {ttfb} ms\n"
 
         return report_text
 
     async def send_weekly_report(self):
         """
         Отправка еженедельного отчёта.
+        Данные за неделю читаются тремя запросами на все сайты сразу, графики рендерятся
+        параллельно (не больше chart_workers одновременно), сообщения уходят через
+        Notifier с ограничением частоты.
         """
-        report_text = "📊 Еженедельный отчёт о мониторинге сайтов\n\n"
-        for site in self.sites:
-            site_report = await self.create_report(site.name, days=7)
-            report_text += site_report + "\n\n"
+        started = perf_counter()
+        days = 7
+        since = datetime.now() - timedelta(days=days)
+        granularity = rollups.pick_granularity(since)
+        stats_by_site = await self.db.get_rollup_stats_all(granularity, since)
+        series_by_site = await self.db.get_rollup_series_all(granularity, since)
+        latency_by_site = await self.db.get_latency_sketches_all(sketch.granularity_for(granularity), since)
+        fetched = perf_counter()
+
+        sites = self.sites
+        reports = {
+            site.id: self._format_report(site, since, stats_by_site.get(site.id), days, latency_by_site.get(site.id))
+            for site in sites
+        }
+        computed = perf_counter()
+
+        render_slots = asyncio.Semaphore(self.charts.workers)
+
+        async def render(site: SiteConfig):
+            file = None
+            series = series_by_site.get(site.id)
+            if series:
+                timestamps = [r["bucket_start"].timestamp() for r in series]
+                response_times = [float(r["avg_ms"] or 0) for r in series]
+                title = f"Время отклика сайта {site.name} за {days} дн."
+                try:
+                    async with render_slots:
+                        file = await self.charts.render(site.id, days, None, timestamps, response_times, title,
+                                                        cache=False)
+                except Exception as e:
+                    logger.error(f"Не удалось построить график {site.name}: {e}")
+            # темп отправки и RetryAfter соблюдает Notifier
+            try:
+                await self.notifier.send(reports[site.id], parse_mode="HTML", photo=file)
+            finally:
+                self.charts.discard(file)
 
-            #await self.bot.send_message(config.admin_id, report_text, parse_mode="HTML")
-            file = await self.plot_response_time(name=site.name)
-            photo = FSInputFile(file)
-            await self.bot.send_photo(chat_id=config.admin_id, photo=photo,caption=report_text)
+        await asyncio.gather(
+            self.notifier.send("📊 Еженедельный отчёт о мониторинге сайтов", parse_mode="HTML"),
+            *(render(site) for site in sites),
+        )
+        finished = perf_counter()
+        logger.info(
+            f"Еженедельный отчёт по {len(sites)} сайтам: {finished - started:.1f}s "
+            f"(выборка {fetched - started:.1f}s, расчёт {computed - fetched:.2f}s, "
+            f"графики и отправка {finished - computed:.1f}s)"
+        )
 
     async def send_daily_report(self,name):
         """
         Отправка ежедневного отчёта.
         """
-        site = next((s for s in self.sites if s.name == name), None)
+        site = self._sites_by_name.get(name)
         site_report = await self.create_report(site.name, days=1)
         report_text = site_report + "\n\n"
         file = await self.plot_response_time(name=site.name)
@@ -232,70 +553,112 @@ class SiteMonitor:
             except Exception as e:
                 print(f"Ошибка при отправке еженедельного отчета: {e}")
 
+    async def retention_task(self):
+        """
+        Периодически удаляет устаревшие проверки и агрегаты по политике хранения.
+        Первый запуск — через интервал, а не сразу при старте ведущего.
+        """
+        while True:
+            await asyncio.sleep(config.retention_interval_hours * 3600)
+            try:
+                results = await retention.apply_retention(self.db)
+                total = sum(r.rows for r in results)
+                seconds = sum(r.seconds for r in results)
+                logger.info(f"Очистка истории завершена: удалено строк {total} за {seconds:.1f}s")
+            except Exception as e:
+                logger.error(f"Ошибка при очистке истории: {e}")
+
     async def plot_response_time(self, name: str, days: int = 7):
         """
-        Строим график времени отклика сайта за последнюю неделю.
+        Строим график времени отклика сайта за последние days дней.
+        Рендер идёт в пуле процессов; пока у сайта нет новых проверок, отдаётся готовый файл.
         """
-        since = datetime.now() - timedelta(days=days)
-        checks = await self.db.get_checks_since(since)
+        site = self._sites_by_name.get(name)
+        if not site:
+            return None
+        latest_check_id = await self.db.get_latest_check_id(site.id)
+        filename = self.charts.cached(site.id, days, latest_check_id)
+        if filename:
+            return filename
 
-        # Фильтруем только по конкретному сайту
-        site_checks = [c for c in checks if c["site_name"] == name]
+        since = datetime.now() - timedelta(days=days)
+        granularity = rollups.pick_granularity(since)
+        series = await self.db.get_rollup_series(site.id, granularity, since)
 
-        if not site_checks:
+        if not series:
             print("Нет данных для графика")
             return None
 
-        # Подготовка данных
-        times = [c["checked_at"] for c in site_checks]
-        response_times = [c["response_time_ms"] or 0 for c in site_checks]
-        site_name = site_checks[0]["site_name"]
-
-        # Рисуем график
-        plt.figure(figsize=(10, 5))
-        plt.plot(times, response_times, marker="o", linestyle="-", label="Response time (ms)")
-        plt.title(f"Время отклика сайта {site_name} за последнюю неделю")
-        plt.xlabel("Дата")
-        plt.ylabel("Время отклика (мс)")
-        plt.xticks(rotation=45)
-        plt.grid(True)
-        plt.legend()
-
-        filename = f"response_time_{name}.png"
-        plt.tight_layout()
-        plt.savefig(filename)
-        plt.close()
-
-        return filename
-    async def export_report_csv(self, site_name: str, days: int = 7, file_path: str = None):
+        # Подготовка данных: среднее время отклика по бакету агрегата
+        timestamps = [r["bucket_start"].timestamp() for r in series]
+        response_times = [float(r["avg_ms"] or 0) for r in series]
+        title = f"Время отклика сайта {site.name} за {days} дн."
+        return await self.charts.render(site.id, days, latest_check_id, timestamps, response_times, title)
+
+    async def export_report_csv(self, site_name: str, days: int = 7, file_path: str = None, compress: bool = None):
         """
         Экспорт отчета по сайту за указанное количество дней в CSV.
         """
-        site = next((s for s in self.sites if s.name == site_name), None)
-        if not site:
-            return None
-
         since = datetime.now() - timedelta(days=days)
-        checks = await self.db.get_checks_since(since=since)
-        checks = [c for c in checks if c["site_name"] == site_name]
-        if not checks:
+        return await self.export_checks_csv([site_name], since, file_path=file_path, compress=compress)
+
+    async def export_checks_csv(self, site_names: List[str], since: datetime, until: Optional[datetime] = None,
+                                file_path: str = None, compress: bool = None):
+        """
+        Потоковый экспорт проверок одного или нескольких сайтов за произвольный период.
+        Строки читаются серверным курсором пачками и сразу пишутся в файл (при compress — в .csv.gz),
+        поэтому расход памяти не зависит от размера выгрузки.
+        """
+        sites = [self._sites_by_name[name] for name in site_names if name in self._sites_by_name]
+        if not sites:
             return None
+        names = {site.id: site.name for site in sites}
+        until_label = until or datetime.now()
+        if compress is None:
+            compress = config.export_compress
 
         if not file_path:
-            file_path = f"{site.name}_{since.strftime('%Y%m%d')}_{datetime.now().strftime('%Y%m%d')}.csv"
+            prefix = sites[0].name if len(sites) == 1 else f"{len(sites)}_sites"
+            file_path = os.path.join(
+                config.export_dir,
+                f"{prefix}_{since.strftime('%Y%m%d')}_{until_label.strftime('%Y%m%d')}.csv" + (".gz" if compress else "")
+            )
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
 
-        with open(file_path, mode="w", newline="", encoding="utf-8") as f:
+        if compress:
+            f = gzip.open(file_path, mode="wt", newline="", encoding="utf-8")
+        else:
+            f = open(file_path, mode="w", newline="", encoding="utf-8")
+        written = 0
+        try:
             writer = csv.writer(f)
             # Заголовки
-            writer.writerow(["Дата и время", "Статус код", "Доступен", "Время отклика (ms)", "Ошибка"])
-            # Данные
-            for c in checks:
-                writer.writerow([
-                    c["checked_at"].strftime("%Y-%m-%d %H:%M:%S") if c["checked_at"] else "",
-                    c.get("status_code", ""),
-                    1 if c.get("is_ok") else 0,
-                    c.get("response_time_ms", ""),
-                    c.get("error", "")
-                ])
-        return file_path
+            writer.writerow(["Сайт", "Дата и время", "Статус код", "Доступен", "Время отклика (ms)", "Ошибка",
+                             "DNS (ms)", "Соединение+TLS (ms)", "TTFB (ms)"])
+            # Данные: запись (и сжатие) выполняется в потоке, чтобы не блокировать event loop
+            async for chunk in self.db.iter_site_checks(list(names), since, until):
+                rows = [
+                    [
+                        names.get(c["site_id"], ""),
+                        c["checked_at"].strftime("%Y-%m-%d %H:%M:%S") if c["checked_at"] else "",
+                        c["status_code"] if c["status_code"] is not None else "",
+                        1 if c["is_ok"] else 0,
+                        c["response_time_ms"] if c["response_time_ms"] is not None else "",
+                        c["error"] or "",
+                        c["dns_ms"] if c["dns_ms"] is not None else "",
+                        c["connect_ms"] if c["connect_ms"] is not None else "",
+                        c["ttfb_ms"] if c["ttfb_ms"] is not None else "",
+                    ]
+                    for c in chunk
+                ]
+                await asyncio.to_thread(writer.writerows, rows)
+                written += len(rows)
+        finally:
+            f.close()
 
+        if not written:
+            os.remove(file_path)
+            return None
+        return file_path
@@ -0,0 +1,186 @@
+import math
+import os
+import socket
+import struct
+import zlib
+from datetime import datetime
+from time import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import config
+import rollups
+
+# Скетчи хранятся только для часовых и дневных бакетов: окна до 6 часов собираются из часовых
+GRANULARITIES = ("hour", "day")
+
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct("<BddQi")
+
+
+def table_name(granularity: str) -> str:
+    return f"latency_sketch_{granularity}"
+
+
+def granularity_for(rollup_granularity: str) -> str:
+    """Гранулярность скетчей для окна, под которое подобран агрегат."""
+    return "hour" if rollup_granularity == "minute" else rollup_granularity
+
+
+def writer_id() -> str:
+    """
+    Ключ строк скетчей этого процесса. Включает время запуска, чтобы после рестарта
+    (в контейнере pid часто совпадает) не перетереть скетчи прошлого запуска — они сливаются при чтении.
+    """
+    return f"{config.instance_id or socket.gethostname()}-{os.getpid()}-{int(time())}"[:128]
+
+
+class LatencySketch:
+    """
+    Скетч квантилей с логарифмическими бакетами (как DDSketch): значение v попадает
+    в бакет ceil(log_gamma(v)), gamma = (1 + a) / (1 - a), поэтому любой квантиль
+    восстанавливается с относительной ошибкой не больше a. add() — O(1), скетчи с одинаковой
+    точностью сливаются простым сложением счётчиков.
+    """
+    __slots__ = ("accuracy", "_log_gamma", "bins", "zero_count", "count", "sum")
+
+    # всё, что меньше 1 мс, считается нулём
+    MIN_VALUE = 1.0
+
+    def __init__(self, accuracy: float = None) -> None:
+        self.accuracy = config.sketch_relative_accuracy if accuracy is None else accuracy
+        self._log_gamma = math.log((1 + self.accuracy) / (1 - self.accuracy))
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        if value < self.MIN_VALUE:
+            self.zero_count += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.bins[index] = self.bins.get(index, 0) + 1
+
+    def merge(self, other: "LatencySketch") -> None:
+        if other.accuracy != self.accuracy:
+            raise ValueError(f"Нельзя слить скетчи с разной точностью: {self.accuracy} и {other.accuracy}")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0.0
+        gamma = math.exp(self._log_gamma)
+        index = None
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                break
+        # точка бакета (gamma^(i-1), gamma^i] с одинаковой относительной ошибкой до обеих границ
+        return 2 * gamma ** index / (gamma + 1)
+
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def to_bytes(self) -> bytes:
+        """Компактная запись: заголовок и счётчики подряд от минимального до максимального бакета."""
+        low = min(self.bins) if self.bins else 0
+        high = max(self.bins) if self.bins else -1
+        counts = [self.bins.get(i, 0) for i in range(low, high + 1)]
+        header = _HEADER.pack(_FORMAT_VERSION, self.accuracy, self.sum, self.zero_count, low)
+        return zlib.compress(header + struct.pack(f"<{len(counts)}I", *counts))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "LatencySketch":
+        raw = zlib.decompress(data)
+        version, accuracy, total, zero_count, low = _HEADER.unpack_from(raw)
+        if version != _FORMAT_VERSION:
+            raise ValueError(f"Неизвестная версия скетча: {version}")
+        sketch = cls(accuracy)
+        counts = struct.unpack_from(f"<{(len(raw) - _HEADER.size) // 4}I", raw, _HEADER.size)
+        sketch.bins = {low + i: c for i, c in enumerate(counts) if c}
+        sketch.zero_count = zero_count
+        sketch.count = zero_count + sum(counts)
+        sketch.sum = total
+        return sketch
+
+
+def merge_all(sketches: Iterable[LatencySketch]) -> Optional[LatencySketch]:
+    result = None
+    for sketch in sketches:
+        if result is None:
+            result = LatencySketch(sketch.accuracy)
+        result.merge(sketch)
+    return result
+
+
+class SketchStore:
+    """
+    Скетчи текущих бакетов в памяти процесса: (гранулярность, site_id, начало бакета) -> скетч.
+    Каждая успешная проверка добавляется за O(1); take_dirty() отдаёт изменённые скетчи
+    для записи в БД и забывает бакеты, которые уже закончились.
+    """
+
+    def __init__(self) -> None:
+        self._sketches: Dict[Tuple[str, int, datetime], LatencySketch] = {}
+        self._dirty = set()
+
+    def __len__(self) -> int:
+        return len(self._sketches)
+
+    def get(self, granularity: str, site_id: int, start: datetime) -> Optional[LatencySketch]:
+        return self._sketches.get((granularity, site_id, start))
+
+    def items(self, granularity: str):
+        for (g, site_id, start), value in self._sketches.items():
+            if g == granularity:
+                yield site_id, start, value
+
+    def add(self, site_id: int, checked_at: datetime, response_time_ms: float) -> None:
+        for granularity in GRANULARITIES:
+            key = (granularity, site_id, rollups.bucket_start(checked_at, granularity))
+            sketch = self._sketches.get(key)
+            if sketch is None:
+                sketch = self._sketches[key] = LatencySketch()
+            sketch.add(response_time_ms)
+            self._dirty.add(key)
+
+    def add_checks(self, rows) -> None:
+        """Пачка строк в формате очереди записи проверок; задержка учитывается только у успешных."""
+        for row in rows:
+            site_id, checked_at, _status_code, is_ok, response_time_ms = row[:5]
+            if is_ok and response_time_ms is not None:
+                self.add(site_id, checked_at, response_time_ms)
+
+    def take_dirty(self, now: datetime = None) -> Dict[str, List[Tuple[int, datetime, LatencySketch]]]:
+        now = now or datetime.now()
+        result: Dict[str, List[Tuple[int, datetime, LatencySketch]]] = {g: [] for g in GRANULARITIES}
+        for key in self._dirty:
+            granularity, site_id, start = key
+            result[granularity].append((site_id, start, self._sketches[key]))
+        self._dirty = set()
+        current = {g: rollups.bucket_start(now, g) for g in GRANULARITIES}
+        for key in [k for k in self._sketches if k[2] < current[k[0]]]:
+            del self._sketches[key]
+        return result
+
+    def restore(self, dirty: Dict[str, List[Tuple[int, datetime, LatencySketch]]]) -> None:
+        """Возвращает скетчи, которые не удалось записать, чтобы записать их в следующий раз."""
+        for granularity, items in dirty.items():
+            for site_id, start, sketch in items:
+                key = (granularity, site_id, start)
+                current = self._sketches.get(key)
+                if current is None:
+                    self._sketches[key] = sketch
+                elif current is not sketch:
+                    current.merge(sketch)
+                self._dirty.add(key)
@@ -0,0 +1,55 @@
+# tests/test_adaptive.py
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import config
+from site_monitor import SiteConfig
+import adaptive
+
+
+# ----------------------------
+# Тест 1: быстрая перепроверка, отступ для упавшего сайта, границы
+# ----------------------------
+def test_next_interval():
+    site = SiteConfig(url="https://a/", name="a", check_interval=60)
+    site.consecutive_failures = 1
+    assert adaptive.next_interval(site) == 60  # режим выключен
+
+    site.adaptive = True
+    low, high = adaptive.bounds(site)
+    assert low == config.adaptive_min_interval and high == 60 * config.adaptive_max_factor
+    assert adaptive.next_interval(site) == low
+
+    site.consecutive_failures = 0
+    assert adaptive.next_interval(site) == 60
+
+    site.consecutive_failures = 3
+    assert adaptive.next_interval(site) == 60
+    site.consecutive_failures = 5
+    assert adaptive.next_interval(site) == 240
+    site.consecutive_failures = 50
+    assert adaptive.next_interval(site) == high
+
+    site.min_interval, site.max_interval = 10, 100
+    site.consecutive_failures = 1
+    assert adaptive.next_interval(site) == 10
+    site.consecutive_failures = 50
+    assert adaptive.next_interval(site) == 100
+
+
+# ----------------------------
+# Тест 2: «мигающий» сайт проверяется реже, оценка затухает
+# ----------------------------
+def test_flapping_backoff():
+    site = SiteConfig(url="https://a/", name="a", check_interval=60, adaptive=True)
+    status = True
+    for _ in range(8):
+        adaptive.record_result(site, status, not status)
+        status = not status
+    assert site.flap_score >= config.adaptive_flap_threshold
+    assert adaptive.next_interval(site) == 120
+
+    for _ in range(50):
+        adaptive.record_result(site, True, True)
+    assert adaptive.next_interval(site) == 60
@@ -0,0 +1,73 @@
+# tests/test_alerts.py
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from site_monitor import SiteConfig
+from alerts import AlertAggregator, common_host
+
+
+class FakeNotifier:
+    def __init__(self):
+        self.sent = []
+
+    def notify(self, text, **kwargs):
+        self.sent.append(text)
+        return True
+
+
+def make_sites(n, host="example.com", failures=0):
+    return [SiteConfig(url=f"https://s{i}.{host}/", name=f"{host}-{i}", check_interval=60, consecutive_failures=failures)
+            for i in range(n)]
+
+
+# ----------------------------
+# Тест 1: общий хост и поштучная отправка малых групп
+# ----------------------------
+def test_common_host_and_single_alerts():
+    sites = make_sites(3, "cdn.net") + make_sites(1, "other.org")
+    assert common_host(sites) == ("cdn.net", 3)
+    assert common_host(make_sites(1)) is None
+
+    healthy = make_sites(20, "healthy.io")
+    notifier = FakeNotifier()
+    alerts = AlertAggregator(notifier, lambda: healthy)
+    alerts._pending = [("down", sites[0], "cdn.net-0 сбой"), ("down", sites[3], "other.org-0 сбой")]
+    alerts.flush()
+    assert notifier.sent == ["cdn.net-0 сбой", "other.org-0 сбой"]
+
+
+# ----------------------------
+# Тест 2: много переходов за окно — одна сводка, флаппинг не оповещается
+# ----------------------------
+def test_summary_and_flapping():
+    down = make_sites(5, "cdn.net", failures=3)
+    monitored = down + make_sites(20, "healthy.io")
+    notifier = FakeNotifier()
+    alerts = AlertAggregator(notifier, lambda: monitored)
+    alerts._pending = [("down", s, f"{s.name} сбой") for s in down]
+    flapping = monitored[-1]
+    alerts._pending += [("down", flapping, "сбой"), ("up", flapping, "восстановлен")]
+    alerts.flush()
+    assert len(notifier.sent) == 1
+    assert notifier.sent[0].startswith("5 сайтов недоступны, общий хост cdn.net (5 из 5)")
+
+
+# ----------------------------
+# Тест 3: большинство сайтов упало — сообщение о проблеме на стороне мониторинга
+# ----------------------------
+def test_local_outage():
+    monitored = make_sites(10, failures=3)
+    notifier = FakeNotifier()
+    alerts = AlertAggregator(notifier, lambda: monitored)
+    alerts._pending = [("down", s, f"{s.name} сбой") for s in monitored]
+    alerts.flush()
+    assert alerts.local_outage
+    assert len(notifier.sent) == 1 and "10 из 10" in notifier.sent[0]
+
+    for s in monitored:
+        s.consecutive_failures = 0
+    alerts._pending = [("up", s, f"{s.name} восстановлен") for s in monitored]
+    alerts.flush()
+    assert not alerts.local_outage
+    assert len(notifier.sent) == 2 and notifier.sent[1].startswith("✅ Связь восстановлена")
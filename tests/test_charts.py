@@ -0,0 +1,53 @@
+# tests/test_charts.py
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+import asyncio
+
+from charts import ChartRenderer, downsample_lttb
+
+
+# ----------------------------
+# Тест 1: LTTB оставляет threshold точек, края ряда и одиночные пики
+# ----------------------------
+def test_downsample_lttb_keeps_shape():
+    xs = list(range(1000))
+    ys = [10.0] * 1000
+    ys[123] = 500.0
+    ys[777] = -300.0
+    out_x, out_y = downsample_lttb(xs, ys, 50)
+    assert len(out_x) == len(out_y) == 50
+    assert (out_x[0], out_y[0]) == (0, 10.0) and (out_x[-1], out_y[-1]) == (999, 10.0)
+    assert out_x == sorted(out_x)
+    assert 500.0 in out_y and -300.0 in out_y
+
+    # короткий ряд и вырожденный порог возвращаются как есть
+    assert downsample_lttb([1, 2, 3], [4, 5, 6], 10) == ([1, 2, 3], [4, 5, 6])
+    assert downsample_lttb(xs, ys, 2) == (xs, ys)
+
+
+# ----------------------------
+# Тест 2: разовый график отчёта и кэшируемый график пишутся в разные файлы
+# ----------------------------
+@pytest.mark.asyncio
+async def test_report_and_cached_renders_do_not_share_files(tmp_path):
+    charts = ChartRenderer(workers=1, directory=str(tmp_path))
+    try:
+        ts = [1_700_000_000 + 3600 * i for i in range(10)]
+        values = [float(i) for i in range(10)]
+        cached, report = await asyncio.gather(
+            charts.render(1, 7, 42, ts, values, "cached"),
+            charts.render(1, 7, None, ts, values, "report", cache=False),
+        )
+        assert cached != report
+        assert charts.cached(1, 7, 42) == cached
+        assert charts.cached(1, 7, None) is None
+
+        charts.discard(report)
+        assert not os.path.exists(report)
+        assert os.path.exists(cached)
+        assert sorted(os.listdir(tmp_path)) == [os.path.basename(cached)]
+    finally:
+        charts.close()
@@ -0,0 +1,57 @@
+# tests/test_config_sync.py
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock
+
+from site_monitor import SiteMonitor
+
+
+def row(site_id, name, url="https://example.com", updated_at=None, **fields):
+    base = {"id": site_id, "name": name, "url": url, "check_interval": 60, "timeout": 10, "expected_status": 200,
+            "enabled": 1, "notify_on_down": 1, "notify_on_recovery": 1,
+            "created_at": datetime(2025, 1, 1), "updated_at": updated_at or datetime(2025, 1, 1)}
+    base.update(fields)
+    return base
+
+
+# ----------------------------
+# Тест 1: изменения из БД применяются на месте, перепланируется только нужное
+# ----------------------------
+@pytest.mark.asyncio
+async def test_sync_applies_diff_in_place():
+    db = AsyncMock()
+    db.get_sites.return_value = [row(1, "a"), row(2, "b"), row(3, "c")]
+    monitor = SiteMonitor(bot=AsyncMock(), db=db)
+    await monitor.load_sites()
+    monitor.scheduler.start()
+    for site in monitor.sites:
+        monitor._start_site_task(site)
+    a, b = monitor.get_site("a"), monitor.get_site("b")
+    entry_a, entry_b = monitor.scheduler._entries[1], monitor.scheduler._entries[2]
+
+    later = datetime(2025, 1, 1) + timedelta(minutes=5)
+    db.get_sites_changed_since.return_value = [
+        row(1, "a", notify_on_down=0, updated_at=later),             # флаг — без перепланирования
+        row(2, "b2", url="https://example.org", updated_at=later),   # URL и имя — перепланировать
+        row(4, "d", updated_at=later),                               # новый сайт
+    ]
+    db.get_site_ids.return_value = {1, 2, 4}                         # «c» удалён
+    await monitor.sync_sites()
+
+    assert monitor.get_site("a") is a and a.notify_on_down is False
+    assert monitor.scheduler._entries[1] is entry_a
+    assert monitor.get_site("b2") is b and monitor.get_site("b") is None
+    assert b.url == "https://example.org" and monitor.scheduler._entries[2] is not entry_b
+    assert 4 in monitor.scheduler and monitor.get_site("c") is None and 3 not in monitor.scheduler
+    assert monitor._sync_watermark == later
+    db.get_sites_changed_since.assert_awaited_with(datetime(2025, 1, 1))
+
+    # выключение снимает сайт с расписания
+    db.get_sites_changed_since.return_value = [row(1, "a", enabled=0, notify_on_down=0, updated_at=later)]
+    await monitor.sync_sites()
+    assert 1 not in monitor.scheduler
+    await monitor.stop_monitoring()
@@ -0,0 +1,71 @@
+# tests/test_content_rules.py
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from content_rules import ContentRules, LiteralScanner
+
+
+def run(rules, chunks):
+    matcher = rules.matcher()
+    read = 0
+    for chunk in chunks:
+        read += 1
+        if matcher.feed(chunk):
+            break
+    return matcher.finish(), read
+
+
+# ----------------------------
+# Тест 1: поиск находит пересекающиеся шаблоны и шаблоны, разрезанные границей чанков
+# ----------------------------
+def test_literal_scanner_across_chunks():
+    scanner = LiteralScanner([b"he", b"she", b"hers", b"error", b"he"])
+    found = set()
+    tail = b""
+    for chunk in (b"ushe", b"rs, fatal err", b"o", b"r!"):
+        tail = scanner.feed(tail, chunk, found)
+    assert found == {0, 1, 2, 3, 4}
+
+    found = set()
+    tail = b""
+    for byte in b"xx erro":
+        tail = scanner.feed(tail, bytes([byte]), found)
+    assert found == set() and len(tail) == 4
+
+
+# ----------------------------
+# Тест 2: исход решается без чтения всего тела
+# ----------------------------
+def test_rules_stop_early():
+    body = [b"<html>", b"Welcome, user", b"tail" * 1000, b"more"]
+
+    # обязательная строка найдена во втором чанке — дальше не читаем
+    error, read = run(ContentRules(contains=["Welcome"]), body)
+    assert error is None and read == 2
+
+    # запрещённое слово — сбой сразу
+    error, read = run(ContentRules(not_contains=["user"]), body)
+    assert "user" in error and read == 2
+
+    # регулярка на стыке чанков
+    error, _ = run(ContentRules(regex=[r"Welcome,\s+user"]), [b"Welcome,", b" user"])
+    assert error is None
+
+    error, read = run(ContentRules(contains=["Welcome"], max_bytes=100), body)
+    assert "100" in error and read == 3
+
+    error, _ = run(ContentRules(contains=["Goodbye"], regex=[r"\d{3}"]), body)
+    assert "Goodbye" in error and r"\d{3}" in error
+
+
+# ----------------------------
+# Тест 3: разбор правил из сообщения и JSON
+# ----------------------------
+def test_parse_and_json():
+    rules = ContentRules.parse("+OK\n-Fatal error\n~v\\d+\n!~5\\d\\d\nmax=1000")
+    assert rules.contains == ["OK"] and rules.not_contains == ["Fatal error"]
+    assert rules.regex == ["v\\d+"] and rules.not_regex == ["5\\d\\d"] and rules.max_bytes == 1000
+    assert ContentRules.from_json(rules.to_json()) == rules
+    assert ContentRules.from_json(None) is None
+    assert ContentRules().to_json() is None
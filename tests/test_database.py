@@ -0,0 +1,191 @@
+# tests/test_database.py
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+from datetime import datetime
+from contextlib import asynccontextmanager
+
+import pytest
+
+import config
+from database import Database, bucket_tables
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+        self.rows = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params=None):
+        self.conn.pool.queries.append(" ".join(query.split()))
+        if "FROM sites WHERE id IN" in query:
+            self.rows = [{"id": i} for i in params if i not in self.conn.pool.deleted]
+
+    async def fetchall(self):
+        return self.rows
+
+    async def fetchone(self):
+        # information_schema: колонок и индексов ещё нет
+        return {"cnt": 0}
+
+    async def executemany(self, query, rows):
+        if "INSERT INTO checks " in query:
+            rows = list(rows)
+            if any(row[0] in self.conn.pool.deleted for row in rows):
+                # как MySQL: одна строка с несуществующим сайтом срывает весь INSERT
+                raise RuntimeError("Cannot add or update a child row: fk_checks_site")
+            self.conn.pending.append(rows)
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+        self.pending = []
+
+    def cursor(self, *args):
+        return FakeCursor(self)
+
+    async def commit(self):
+        self.pool.batches.extend(self.pending)
+        self.pending = []
+
+    async def rollback(self):
+        self.pending = []
+
+
+class FakePool:
+    """Пул, первые failures обращений к которому падают с ConnectionError."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+        self.queries = []
+        # id удалённых сайтов
+        self.deleted = set()
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("БД недоступна")
+        yield FakeConnection(self)
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+@pytest.fixture
+def fast_flush(monkeypatch):
+    monkeypatch.setattr(config, "checks_flush_interval", 0.05)
+    monkeypatch.setattr(config, "checks_batch_size", 3)
+    monkeypatch.setattr(config, "checks_retry_delay", 0.01)
+    monkeypatch.setattr(config, "checks_retry_max_delay", 0.02)
+
+
+def make_db(pool):
+    db = Database(asyncio.get_running_loop())
+    db.pool = pool
+    return db
+
+
+# ----------------------------
+# Тест 1: проверки пишутся пачками не больше checks_batch_size
+# ----------------------------
+@pytest.mark.asyncio
+async def test_checks_are_batched(fast_flush):
+    pool = FakePool()
+    db = make_db(pool)
+    for i in range(7):
+        await db.add_check(i, 200, True, 10.0)
+    await db.close()
+    assert [len(b) for b in pool.batches] == [3, 3, 1]
+    assert [row[0] for b in pool.batches for row in b] == list(range(7))
+
+
+# ----------------------------
+# Тест 2: ошибка БД не убивает запись — пачка повторяется и доходит
+# ----------------------------
+@pytest.mark.asyncio
+async def test_failing_db_retries_batch(fast_flush):
+    pool = FakePool(failures=3)
+    db = make_db(pool)
+    for i in range(3):
+        await db.add_check(i, 200, True, 10.0)
+    await asyncio.sleep(0.2)
+    assert not db._writer_task.done()
+    assert [row[0] for b in pool.batches for row in b] == [0, 1, 2]
+    await db.close()
+
+
+# ----------------------------
+# Тест 3: после исчерпания попыток пачка отбрасывается, запись продолжается
+# ----------------------------
+@pytest.mark.asyncio
+async def test_batch_dropped_after_retries(fast_flush, monkeypatch):
+    monkeypatch.setattr(config, "checks_write_retries", 1)
+    pool = FakePool(failures=2)
+    db = make_db(pool)
+    for i in range(3):
+        await db.add_check(i, 200, True, 10.0)
+    await asyncio.sleep(0.2)
+    await db.add_check(10, 200, True, 10.0)
+    await db.close()
+    assert [row[0] for b in pool.batches for row in b] == [10]
+
+
+# ----------------------------
+# Тест 4: упавший flusher перезапускается, очередь не теряется
+# ----------------------------
+@pytest.mark.asyncio
+async def test_dead_writer_is_restarted(fast_flush):
+    pool = FakePool()
+    db = make_db(pool)
+    await db.add_check(1, 200, True, 10.0)
+    db._writer_task.cancel()
+    await asyncio.sleep(0)
+    await db.add_check(2, 200, True, 10.0)
+    await asyncio.wait_for(db.close(), timeout=2)
+    assert [row[0] for b in pool.batches for row in b] == [1, 2]
+
+
+# ----------------------------
+# Тест 5: у таблиц агрегатов и скетчей есть индекс по bucket_start, очистка идёт по нему
+# ----------------------------
+@pytest.mark.asyncio
+async def test_bucket_indexes_for_purge():
+    pool = FakePool()
+    db = make_db(pool)
+    await db.create_tables()
+    for table in bucket_tables():
+        assert f"CREATE INDEX idx_{table}_bucket ON {table} (bucket_start)" in pool.queries
+
+    pool.queries.clear()
+    await db.purge_batch("checks_rollup_hour", "bucket_start", datetime(2024, 1, 1), 100, order_by="bucket_start")
+    assert pool.queries == ["DELETE FROM checks_rollup_hour WHERE bucket_start < %s ORDER BY bucket_start LIMIT %s"]
+
+
+# ----------------------------
+# Тест 6: проверки удалённого сайта отбрасываются, остальная пачка записывается
+# ----------------------------
+@pytest.mark.asyncio
+async def test_orphan_rows_do_not_fail_batch(fast_flush):
+    pool = FakePool()
+    pool.deleted = {2}
+    db = make_db(pool)
+    for site_id in (1, 2, 3):
+        await db.add_check(site_id, 200, True, 10.0)
+    await asyncio.wait_for(db.close(), timeout=2)
+    assert [row[0] for b in pool.batches for row in b] == [1, 3]
+    assert {site_id for site_id, _, _ in db.sketches.items("hour")} == {1, 3}
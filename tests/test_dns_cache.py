@@ -0,0 +1,90 @@
+# tests/test_dns_cache.py
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+import asyncio
+import socket
+
+import config
+import dns_cache
+from dns_cache import CachingResolver
+
+
+class CountingResolver:
+    """Резолвер-заглушка: считает обращения и отвечает с задержкой."""
+
+    def __init__(self, delay: float = 0.05):
+        self.calls = 0
+        self.delay = delay
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return [{"hostname": host, "host": f"10.0.0.{self.calls}", "port": port, "family": family,
+                 "proto": 0, "flags": socket.AI_NUMERICHOST}]
+
+    async def close(self):
+        pass
+
+
+# ----------------------------
+# Тест 1: одновременные запросы одного имени делят один резолв
+# ----------------------------
+@pytest.mark.asyncio
+async def test_concurrent_lookups_share_one_resolve():
+    inner = CountingResolver()
+    resolver = CachingResolver(inner)
+    results = await asyncio.gather(*(resolver.resolve("example.test", port) for port in (80, 443, 8080)))
+    await resolver.close()
+    assert inner.calls == 1
+    assert [r[0]["port"] for r in results] == [80, 443, 8080]
+    assert {r[0]["host"] for r in results} == {"10.0.0.1"}
+
+
+# ----------------------------
+# Тест 2: запись живёт TTL, после истечения имя резолвится заново
+# ----------------------------
+@pytest.mark.asyncio
+async def test_entry_expires_after_ttl(monkeypatch):
+    monkeypatch.setattr(config, "dns_cache_ttl", 30)
+    monkeypatch.setattr(config, "dns_cache_min_ttl", 5)
+    now = [1000.0]
+    monkeypatch.setattr(dns_cache, "monotonic", lambda: now[0])
+    inner = CountingResolver(delay=0)
+    resolver = CachingResolver(inner)
+
+    assert (await resolver.resolve("example.test"))[0]["host"] == "10.0.0.1"
+    now[0] += 29
+    assert (await resolver.resolve("example.test"))[0]["host"] == "10.0.0.1"
+    now[0] += 2
+    assert (await resolver.resolve("example.test"))[0]["host"] == "10.0.0.2"
+    assert inner.calls == 2
+
+
+# ----------------------------
+# Тест 3: с aiodns адреса и TTL приходят одним запросом
+# ----------------------------
+@pytest.mark.asyncio
+async def test_aiodns_single_query(monkeypatch):
+    pytest.importorskip("aiodns")
+    monkeypatch.setattr(config, "dns_cache_min_ttl", 7)
+    resolver = CachingResolver()
+    calls = 0
+    resolve_with_ttl = resolver._resolve_with_ttl
+
+    async def counted(host, family):
+        nonlocal calls
+        calls += 1
+        return await resolve_with_ttl(host, family)
+
+    resolver._resolve_with_ttl = counted
+    addrs = await resolver.resolve("localhost", 443)
+    again = await resolver.resolve("localhost", 443)
+    expires, _ = resolver._cache[("localhost", socket.AF_INET)]
+    await resolver.close()
+    assert calls == 1
+    assert addrs == again and addrs[0]["host"] == "127.0.0.1" and addrs[0]["port"] == 443
+    # у записи из hosts TTL 0 — действует нижняя граница
+    assert expires - dns_cache.monotonic() == pytest.approx(7, abs=1)
@@ -0,0 +1,91 @@
+# tests/test_export.py
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+import csv
+import gzip
+from datetime import datetime
+from unittest.mock import AsyncMock
+
+from site_monitor import SiteMonitor, SiteConfig
+
+HEADER = ["Сайт", "Дата и время", "Статус код", "Доступен", "Время отклика (ms)", "Ошибка",
+          "DNS (ms)", "Соединение+TLS (ms)", "TTFB (ms)"]
+
+
+class FakeExportDB:
+    """БД-заглушка: iter_site_checks отдаёт заранее заданные пачки строк."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.calls = []
+
+    async def iter_site_checks(self, site_ids, since, until=None, chunk_size=None):
+        self.calls.append((site_ids, since, until))
+        for chunk in self.chunks:
+            yield chunk
+
+
+def check_row(site_id, minute, status=200, ok=1, error=None, dns_ms=None):
+    return {"site_id": site_id, "checked_at": datetime(2026, 3, 1, 12, minute), "status_code": status, "is_ok": ok,
+            "response_time_ms": 120.0 if ok else None, "error": error, "dns_ms": dns_ms, "connect_ms": None,
+            "ttfb_ms": 80.0 if ok else None}
+
+
+def make_monitor(db):
+    monitor = SiteMonitor(bot=AsyncMock(), db=db)
+    for i, name in enumerate(("alpha", "beta"), start=1):
+        monitor._register_site(SiteConfig(url=f"https://{name}.example.com/", name=name, check_interval=60, id=i))
+    return monitor
+
+
+# ----------------------------
+# Тест 1: выгрузка нескольких сайтов пачками в .csv.gz
+# ----------------------------
+@pytest.mark.asyncio
+async def test_export_multiple_sites_gzip(tmp_path, monkeypatch):
+    monkeypatch.setattr("config.export_dir", str(tmp_path))
+    db = FakeExportDB([
+        [check_row(1, 0, dns_ms=3.5), check_row(1, 1, status=None, ok=0, error="timeout")],
+        [check_row(2, 0)],
+    ])
+    monitor = make_monitor(db)
+    since, until = datetime(2026, 3, 1), datetime(2026, 3, 2)
+    path = await monitor.export_checks_csv(["alpha", "beta", "missing"], since, until, compress=True)
+
+    assert path == os.path.join(str(tmp_path), "2_sites_20260301_20260302.csv.gz")
+    assert db.calls == [([1, 2], since, until)]
+    with gzip.open(path, mode="rt", newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == HEADER
+    assert rows[1] == ["alpha", "2026-03-01 12:00:00", "200", "1", "120.0", "", "3.5", "", "80.0"]
+    assert rows[2] == ["alpha", "2026-03-01 12:01:00", "", "0", "", "timeout", "", "", ""]
+    assert rows[3][0] == "beta"
+    assert len(rows) == 4
+
+
+# ----------------------------
+# Тест 2: выгрузка одного сайта называется по его имени
+# ----------------------------
+@pytest.mark.asyncio
+async def test_export_single_site_name(tmp_path, monkeypatch):
+    monkeypatch.setattr("config.export_dir", str(tmp_path))
+    monitor = make_monitor(FakeExportDB([[check_row(2, 0)]]))
+    path = await monitor.export_checks_csv(["beta"], datetime(2026, 3, 1), datetime(2026, 3, 2), compress=False)
+    assert os.path.basename(path) == "beta_20260301_20260302.csv"
+    with open(path, newline="", encoding="utf-8") as f:
+        assert len(list(csv.reader(f))) == 2
+
+
+# ----------------------------
+# Тест 3: пустая выгрузка не оставляет файла
+# ----------------------------
+@pytest.mark.asyncio
+async def test_empty_export_removes_file(tmp_path):
+    monitor = make_monitor(FakeExportDB([]))
+    path = str(tmp_path / "empty.csv.gz")
+    assert await monitor.export_checks_csv(["alpha"], datetime(2026, 3, 1), file_path=path, compress=True) is None
+    assert not os.path.exists(path)
+    assert await monitor.export_checks_csv(["missing"], datetime(2026, 3, 1), file_path=path) is None
@@ -0,0 +1,193 @@
+# tests/test_http_client.py
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+import pytest_asyncio
+import asyncio
+from aiohttp import web
+
+from site_monitor import SiteConfig
+from http_client import HttpClient, PROBE_GET, PROBE_HEAD, PROBE_HEADERS, PROBE_RANGE, is_expected_status
+from ratelimit import HostLimiter
+
+
+BIG_BODY = 64 * 1024 * 1024
+BIG_CHUNK = 64 * 1024
+
+
+@pytest_asyncio.fixture
+async def server():
+    state = {"requests": 0, "active": 0, "peak": 0, "methods": [], "ranges": [], "big_sent": None}
+
+    async def big(request):
+        # большое тело, которое сервер отдаёт, пока клиент читает; Range игнорируется
+        state["methods"].append(request.method)
+        state["ranges"].append(request.headers.get("Range"))
+        response = web.StreamResponse()
+        response.content_length = BIG_BODY
+        await response.prepare(request)
+        sent = 0
+        if request.method != "HEAD":
+            chunk = b"x" * BIG_CHUNK
+            try:
+                while sent < BIG_BODY:
+                    await response.write(chunk)
+                    sent += len(chunk)
+            except (ConnectionResetError, ConnectionError):
+                pass
+        state["big_sent"] = sent
+        return response
+
+    async def ranged(request):
+        # сервер с поддержкой Range: отвечает 206 и отдаёт только запрошенные байты
+        state["ranges"].append(request.headers.get("Range"))
+        body = b"0123456789" * 100
+        spec = request.headers.get("Range")
+        if not spec:
+            return web.Response(body=body)
+        start, end = spec.removeprefix("bytes=").split("-")
+        part = body[int(start):int(end) + 1]
+        return web.Response(status=206, body=part,
+                            headers={"Content-Range": f"bytes {start}-{int(start) + len(part) - 1}/{len(body)}"})
+
+    async def handle(request):
+        state["requests"] += 1
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(0.05)
+        state["active"] -= 1
+        return web.Response(text=f"ok {request.path}")
+
+    app = web.Application()
+    app.router.add_get("/big", big)
+    app.router.add_get("/ranged", ranged)
+    app.router.add_get("/{tail:.*}", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    yield f"http://127.0.0.1:{port}", state
+    await runner.cleanup()
+
+
+# ----------------------------
+# Тест 1: одинаковые цели объединяются в один запрос
+# ----------------------------
+@pytest.mark.asyncio
+async def test_duplicate_targets_coalesce(server):
+    base, state = server
+    client = HttpClient()
+    a = SiteConfig(url=f"{base}/same", name="a", check_interval=60)
+    b = SiteConfig(url=f"{base}/same", name="b", check_interval=60)
+    other = SiteConfig(url=f"{base}/same", name="c", check_interval=60, timeout=5)
+    results = await asyncio.gather(client.check(a), client.check(b), client.check(other))
+    await client.close()
+    assert results[0] is results[1]
+    assert results[2] is not results[0]
+    assert all(r.status == 200 for r in results)
+    assert state["requests"] == 2
+
+
+# ----------------------------
+# Тест 2: лимит одновременных проверок на хост
+# ----------------------------
+@pytest.mark.asyncio
+async def test_host_concurrency_limit(server):
+    base, state = server
+    client = HttpClient()
+    client.limiter = HostLimiter(concurrency=2, rate=0)
+    sites = [SiteConfig(url=f"{base}/{i}", name=str(i), check_interval=60) for i in range(6)]
+    await asyncio.gather(*(client.check(site) for site in sites))
+    await client.close()
+    assert state["requests"] == 6
+    assert state["peak"] == 2
+
+
+async def wait_big_sent(state, timeout: float = 2.0):
+    # сервер узнаёт о закрытии соединения не сразу
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while state["big_sent"] is None and loop.time() < deadline:
+        await asyncio.sleep(0.01)
+    return state["big_sent"]
+
+
+# ----------------------------
+# Тест 3: HEAD и «только заголовки» не качают тело
+# ----------------------------
+@pytest.mark.asyncio
+async def test_head_and_headers_modes(server):
+    base, state = server
+    client = HttpClient()
+    head = SiteConfig(url=f"{base}/big", name="head", check_interval=60, probe_mode=PROBE_HEAD)
+    result = await client.check(head)
+    assert result.status == 200 and result.error is None
+    assert state["methods"] == ["HEAD"]
+
+    state["big_sent"] = None
+    headers = SiteConfig(url=f"{base}/big", name="headers", check_interval=60, probe_mode=PROBE_HEADERS)
+    result = await client.check(headers)
+    await client.close()
+    assert result.status == 200 and result.error is None
+    assert state["methods"] == ["HEAD", "GET"]
+    # соединение закрыто сразу после заголовков — тело отдано далеко не целиком
+    assert await wait_big_sent(state) < BIG_BODY
+
+
+# ----------------------------
+# Тест 4: режим range просит только max_body_bytes и не читает больше, даже если Range проигнорирован
+# ----------------------------
+@pytest.mark.asyncio
+async def test_range_mode_limits_body(server):
+    base, state = server
+    client = HttpClient()
+    site = SiteConfig(url=f"{base}/ranged", name="ranged", check_interval=60, probe_mode=PROBE_RANGE,
+                      max_body_bytes=100)
+    result = await client.check(site)
+    assert result.status == 206
+    assert state["ranges"] == ["bytes=0-99"]
+    assert is_expected_status(site, result.status)
+
+    ignored = SiteConfig(url=f"{base}/big", name="ignored", check_interval=60, probe_mode=PROBE_RANGE,
+                         max_body_bytes=1000)
+    result = await client.check(ignored)
+    await client.close()
+    assert result.status == 200 and is_expected_status(ignored, result.status)
+    assert state["ranges"][-1] == "bytes=0-999"
+    assert await wait_big_sent(state) < BIG_BODY
+
+
+# ----------------------------
+# Тест 5: 206 засчитывается вместо 200 только в режиме range
+# ----------------------------
+def test_expected_status_206_only_for_range():
+    get = SiteConfig(url="http://x", name="get", check_interval=60, probe_mode=PROBE_GET)
+    ranged = SiteConfig(url="http://x", name="range", check_interval=60, probe_mode=PROBE_RANGE)
+    assert is_expected_status(ranged, 206) and is_expected_status(ranged, 200)
+    assert not is_expected_status(get, 206)
+    assert not is_expected_status(ranged, None)
+    ranged.expected_status = 204
+    assert not is_expected_status(ranged, 206)
+
+
+# ----------------------------
+# Тест 6: фазы запроса замеряются; у соединения из пула нет DNS и установки соединения
+# ----------------------------
+@pytest.mark.asyncio
+async def test_trace_timings(server):
+    base, state = server
+    # по IP-адресу aiohttp не резолвит имя, поэтому берём localhost; сервер отвечает не раньше чем через 50 ms
+    url = base.replace("127.0.0.1", "localhost")
+    client = HttpClient()
+    first = await client.check(SiteConfig(url=f"{url}/first", name="first", check_interval=60))
+    reused = await client.check(SiteConfig(url=f"{url}/second", name="second", check_interval=60))
+    await client.close()
+    assert first.status == 200 and reused.status == 200
+    assert first.timings.dns_ms is not None and first.timings.dns_ms >= 0
+    assert first.timings.connect_ms is not None and first.timings.connect_ms >= 0
+    assert first.timings.ttfb_ms is not None and first.timings.ttfb_ms >= 40
+    assert reused.timings.dns_ms is None and reused.timings.connect_ms is None
+    assert reused.timings.ttfb_ms is not None
@@ -0,0 +1,54 @@
+# tests/test_metrics.py
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from metrics import Counter, Gauge, Histogram, Registry
+
+
+# ----------------------------
+# Тест 1: бакеты гистограммы накопительные, граница le включается в бакет
+# ----------------------------
+def test_histogram_cumulative_buckets():
+    hist = Histogram("probe_seconds", "Длительность", ("site",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        hist.observe(value, "a")
+    samples = {(name, labels[-1] if name.endswith("_bucket") else None): value
+               for name, _, labels, value in hist.samples()}
+    assert samples[("probe_seconds_bucket", "0.1")] == 2
+    assert samples[("probe_seconds_bucket", "1.0")] == 3
+    assert samples[("probe_seconds_bucket", "+Inf")] == 4
+    assert samples[("probe_seconds_count", None)] == 4
+    assert samples[("probe_seconds_sum", None)] == 3.65
+
+
+# ----------------------------
+# Тест 2: текстовый формат Prometheus для счётчика, гистограммы и gauge с callback
+# ----------------------------
+def test_render_text_exposition():
+    registry = Registry()
+    probes = registry.register(Counter("probes_total", "Число проверок", ("site", "result")))
+    hist = registry.register(Histogram("lag_seconds", "Отставание", buckets=(1.0,)))
+    registry.register(Gauge("in_flight", "Проверок в работе", callback=lambda: 3))
+    registry.register(Gauge("broken", "Ошибка сбора", callback=lambda: 1 / 0))
+    probes.inc('a"b\\c\nd', "ok")
+    probes.inc('a"b\\c\nd', "ok")
+    hist.observe(0.5)
+
+    lines = registry.render().splitlines()
+    assert lines[:3] == [
+        "# HELP probes_total Число проверок",
+        "# TYPE probes_total counter",
+        'probes_total{site="a\\"b\\\\c\\nd",result="ok"} 2',
+    ]
+    assert lines[3:9] == [
+        "# HELP lag_seconds Отставание",
+        "# TYPE lag_seconds histogram",
+        'lag_seconds_bucket{le="1.0"} 1',
+        'lag_seconds_bucket{le="+Inf"} 1',
+        "lag_seconds_sum 0.5",
+        "lag_seconds_count 1",
+    ]
+    assert lines[9:12] == ["# HELP in_flight Проверок в работе", "# TYPE in_flight gauge", "in_flight 3"]
+    # ошибка в callback не ломает вывод остальных метрик
+    assert lines[12:] == ["# HELP broken Ошибка сбора", "# TYPE broken gauge"]
@@ -9,7 +9,7 @@ from datetime import datetime, timedelta
 from unittest.mock import AsyncMock
 
 from site_monitor import SiteMonitor, SiteConfig
-from database import Database
+from database import Database, bucket_tables
 
 # ----------------------------
 # Асинхронные фикстуры через pytest_asyncio
@@ -22,8 +22,7 @@ async def db():
     await test_db.create_pool()
     await test_db.create_tables()
     yield test_db
-    test_db.pool.close()
-    await test_db.pool.wait_closed()
+    await test_db.close()
 
 @pytest_asyncio.fixture
 async def monitor(db):
@@ -69,8 +68,48 @@ async def test_check_site_availability_timeout(monitor):
     site = SiteConfig(name="TimeoutSite", url="http://10.255.255.1", check_interval=1, timeout=1)
     await monitor.add_site(site)
 
-    task = asyncio.create_task(monitor.check_site_availability(site))
-    await asyncio.sleep(2)
-    task.cancel()
+    # одна попытка без повторов: по таймауту проверка завершается сбоем
+    await asyncio.wait_for(monitor.check_site_availability(site), 5)
 
-    assert site.last_status is None
+    assert site.last_status is False
+    assert site.consecutive_failures == 1
+
+# ----------------------------
+# Тест 6: восстановление состояния после перезапуска
+# ----------------------------
+@pytest.mark.asyncio
+async def test_restore_state(monitor, db):
+    site = SiteConfig(name="WarmSite", url="https://example.com", check_interval=60)
+    await monitor.add_site(site)
+    now = datetime.now().replace(microsecond=0)
+    # одна успешная проверка, затем три сбоя подряд
+    await db._write_checks([
+        (site.id, now - timedelta(seconds=30 - i), 200 if i == 0 else None, int(i == 0), 100.0, None, None, None, None)
+        for i in range(4)
+    ])
+
+    restarted = SiteMonitor(bot=AsyncMock(), db=db)
+    await restarted.load_sites()
+    await restarted.restore_state()
+    restored = restarted.get_site("WarmSite")
+    assert restored.last_status is False
+    assert restored.consecutive_failures == 3
+    assert restored.last_check == now - timedelta(seconds=27)
+    # следующая проверка — через остаток интервала от последней
+    assert 30 <= restarted._first_delay(restored) <= 33
+
+    await monitor.delete_site(site.name)
+
+# ----------------------------
+# Тест 7: отчёты по всем сайтам за период могут читать агрегаты и скетчи по индексу bucket_start
+# ----------------------------
+@pytest.mark.asyncio
+async def test_report_range_uses_bucket_index(db):
+    since = datetime.now() - timedelta(days=7)
+    async with db._acquire() as conn:
+        async with conn.cursor() as cur:
+            for table in bucket_tables():
+                await cur.execute(f"EXPLAIN SELECT site_id, bucket_start, cnt FROM {table} WHERE bucket_start >= %s",
+                                  (since,))
+                plan = await cur.fetchone()
+                assert f"idx_{table}_bucket" in (plan["possible_keys"] or "")
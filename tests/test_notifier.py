@@ -0,0 +1,97 @@
+# tests/test_notifier.py
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+import asyncio
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+import config
+from notifier import Notifier
+from ratelimit import TokenBucket
+
+
+class FakeBot:
+    def __init__(self, retry_after_first: int = 0):
+        self.sent = []
+        self.retries_left = retry_after_first
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        if self.retries_left:
+            self.retries_left -= 1
+            raise TelegramRetryAfter(SendMessage(chat_id=chat_id, text=text), "Flood control", 0)
+        self.sent.append((chat_id, text))
+
+
+# ----------------------------
+# Тест 1: ведро токенов выдаёт запас, потом ограничивает частоту
+# ----------------------------
+def test_token_bucket():
+    bucket = TokenBucket(rate=2, capacity=2)
+    assert bucket.delay(0.0) == 0
+    assert bucket.delay(0.0) == 0
+    assert bucket.delay(0.0) == pytest.approx(0.5)
+    assert bucket.delay(0.5) == 0
+
+
+# ----------------------------
+# Тест 2: notify не блокирует, переполнение отбрасывает, RetryAfter повторяется
+# ----------------------------
+@pytest.mark.asyncio
+async def test_notifier_queue_and_retry(monkeypatch):
+    monkeypatch.setattr(config, "telegram_chat_rate", 1000)
+    bot = FakeBot(retry_after_first=1)
+    notifier = Notifier(bot, queue_size=2)
+
+    assert notifier.notify("a", chat_id=1)
+    assert notifier.notify("b", chat_id=1)
+    assert not notifier.notify("c", chat_id=1)  # очередь полна, воркер ещё не запускался
+
+    assert await notifier.send("d", chat_id=2)
+    await notifier.close()
+    assert bot.sent == [(1, "a"), (1, "b"), (2, "d")]
+
+
+# ----------------------------
+# Тест 3: оповещение уходит раньше отчётов и не ждёт токенов, потраченных на отчёты
+# ----------------------------
+@pytest.mark.asyncio
+async def test_alerts_bypass_reports(monkeypatch):
+    monkeypatch.setattr(config, "telegram_chat_rate", 5)
+    monkeypatch.setattr(config, "telegram_chat_burst", 3)
+    monkeypatch.setattr(config, "telegram_alert_reserve", 1)
+    loop = asyncio.get_running_loop()
+    bot = FakeBot()
+    sent_at = {}
+
+    async def send_message(chat_id, text, parse_mode=None):
+        sent_at[text] = loop.time()
+        bot.sent.append((chat_id, text))
+
+    bot.send_message = send_message
+    notifier = Notifier(bot)
+    started = loop.time()
+    reports = asyncio.gather(*(notifier.send(f"report{i}", chat_id=1) for i in range(4)))
+    await asyncio.sleep(0.05)
+    assert [text for _, text in bot.sent] == ["report0", "report1"]
+
+    notifier.notify("alert", chat_id=1)
+    assert all(await reports)
+    await notifier.close()
+    assert [text for _, text in bot.sent] == ["report0", "report1", "alert", "report2", "report3"]
+    assert sent_at["alert"] - started < 0.1
+
+
+# ----------------------------
+# Тест 4: запас токенов для оповещений не больше размера ведра
+# ----------------------------
+def test_token_bucket_reserve():
+    bucket = TokenBucket(rate=1, capacity=3)
+    assert bucket.delay(0.0, reserve=1) == 0
+    assert bucket.delay(0.0, reserve=1) == 0
+    assert bucket.delay(0.0, reserve=1) == pytest.approx(1.0)
+    assert bucket.delay(0.0) == 0
+    assert TokenBucket(rate=1, capacity=1).delay(0.0, reserve=5) == 0
@@ -0,0 +1,66 @@
+# tests/test_retention.py
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from datetime import date
+
+import retention
+from retention import RetentionPolicy
+
+
+class FakeRetentionDB:
+    """БД-заглушка: запоминает, какие таблицы чистились."""
+
+    def __init__(self, unrolled=None):
+        self.unrolled = unrolled
+        self.purged = []
+
+    async def first_unrolled_day(self, cutoff):
+        return self.unrolled
+
+    async def get_expired_partitions(self, table, cutoff):
+        return []
+
+    async def drop_partitions(self, table, partitions):
+        pass
+
+    async def purge_batch(self, table, column, cutoff, limit, order_by=None):
+        self.purged.append(table)
+        return 0
+
+
+def make_policy(raw_days):
+    return RetentionPolicy(raw_days=raw_days, rollup_days={"minute": 7}, batch_size=100, batch_pause=0)
+
+
+# ----------------------------
+# Тест 1: сырые проверки без агрегатов не удаляются, агрегаты чистятся как обычно
+# ----------------------------
+@pytest.mark.asyncio
+async def test_raw_purge_skipped_until_rolled_up():
+    db = FakeRetentionDB(unrolled=date(2026, 1, 1))
+    await retention.apply_retention(db, make_policy(30))
+    assert "checks" not in db.purged
+    assert "checks_rollup_minute" in db.purged
+
+
+# ----------------------------
+# Тест 2: когда всё свёрнуто, сырые проверки удаляются
+# ----------------------------
+@pytest.mark.asyncio
+async def test_raw_purge_after_backfill():
+    db = FakeRetentionDB()
+    await retention.apply_retention(db, make_policy(30))
+    assert db.purged[0] == "checks"
+
+
+# ----------------------------
+# Тест 3: RAW_RETENTION_DAYS=0 — сырые проверки не трогаются вовсе
+# ----------------------------
+@pytest.mark.asyncio
+async def test_raw_retention_off():
+    db = FakeRetentionDB()
+    await retention.apply_retention(db, make_policy(0))
+    assert "checks" not in db.purged
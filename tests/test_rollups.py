@@ -0,0 +1,50 @@
+# tests/test_rollups.py
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from datetime import datetime, timedelta
+
+import rollups
+
+
+# ----------------------------
+# Тест 1: пачка проверок раскладывается по бакетам всех гранулярностей
+# ----------------------------
+def test_aggregate_checks():
+    t = datetime(2025, 1, 1, 10, 15, 30)
+    rows = [
+        (1, t, 200, 1, 40.0, None, 5.0, 10.0, 20.0),
+        (1, t + timedelta(seconds=10), 200, 1, 120.0, None, None, None, 100.0),
+        (1, t + timedelta(minutes=1), None, 0, 10000.0, None),
+        (2, t, 200, 1, 300.0, None),
+    ]
+    result = rollups.aggregate_checks(rows)
+
+    minute = result["minute"][(1, datetime(2025, 1, 1, 10, 15))]
+    assert (minute.cnt, minute.ok_cnt, minute.sum_ms) == (2, 2, 160)
+    assert (minute.min_ms, minute.max_ms) == (40, 120)
+    phases = dict(zip(rollups.PHASE_COLUMNS, minute.phases))
+    assert rollups.phase_averages(phases) == {"dns": 5.0, "connect": 10.0, "ttfb": 60.0}
+
+    hour = result["hour"][(1, datetime(2025, 1, 1, 10))]
+    assert (hour.cnt, hour.ok_cnt) == (3, 2)
+    assert sum(hour.hist) == 2
+    assert len(result["day"]) == 2
+
+
+# ----------------------------
+# Тест 2: перцентили по гистограмме и выбор гранулярности
+# ----------------------------
+def test_percentile_and_granularity():
+    hist = [0] * len(rollups.HIST_COLUMNS)
+    hist[rollups.hist_index(80)] = 90
+    hist[rollups.hist_index(15000)] = 10
+    assert rollups.percentile_from_hist(hist, 0.5) == 100
+    assert rollups.percentile_from_hist(hist, 0.99, max_ms=15000) == 15000
+    assert rollups.percentile_from_hist([0] * len(hist), 0.5) is None
+
+    now = datetime.now()
+    assert rollups.pick_granularity(now - timedelta(hours=1)) == "minute"
+    assert rollups.pick_granularity(now - timedelta(days=30)) == "hour"
+    assert rollups.pick_granularity(now - timedelta(days=365)) == "day"
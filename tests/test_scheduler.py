@@ -0,0 +1,109 @@
+# tests/test_scheduler.py
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+import asyncio
+
+from site_monitor import SiteConfig
+from scheduler import ProbeScheduler, jitter
+from ratelimit import HostLimiter
+from http_client import target_host
+
+
+# ----------------------------
+# Тест 1: джиттер детерминирован и не выходит за интервал
+# ----------------------------
+def test_jitter_is_deterministic():
+    assert jitter("site-a", 60) == jitter("site-a", 60)
+    assert 0 <= jitter("site-b", 60) < 60
+    assert jitter("site-c", 0) == 0
+
+
+# ----------------------------
+# Тест 2: ограничение числа одновременных проверок
+# ----------------------------
+@pytest.mark.asyncio
+async def test_concurrency_cap():
+    active = 0
+    peak = 0
+    calls = 0
+
+    async def probe(site):
+        nonlocal active, peak, calls
+        active += 1
+        calls += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.05)
+        active -= 1
+
+    scheduler = ProbeScheduler(probe, workers=3)
+    scheduler.start()
+    for i in range(10):
+        scheduler.schedule(f"s{i}", SiteConfig(url="http://x", name=f"s{i}", check_interval=60), delay=0)
+    await asyncio.sleep(0.3)
+    await scheduler.stop()
+
+    assert calls == 10
+    assert peak == 3
+
+
+# ----------------------------
+# Тест 3: снятие с расписания останавливает проверки
+# ----------------------------
+@pytest.mark.asyncio
+async def test_unschedule_stops_probes():
+    calls = []
+
+    async def probe(site):
+        calls.append(site.name)
+
+    site = SiteConfig(url="http://x", name="s", check_interval=0.05)
+    scheduler = ProbeScheduler(probe, workers=1)
+    scheduler.start()
+    scheduler.schedule(site.name, site, delay=0)
+    await asyncio.sleep(0.12)
+    scheduler.unschedule(site.name)
+    seen = len(calls)
+    await asyncio.sleep(0.15)
+    await scheduler.stop()
+
+    assert seen >= 2
+    assert len(calls) == seen
+    assert site.name not in scheduler
+
+
+# ----------------------------
+# Тест 4: хост, упёршийся в лимит, не занимает воркеры и не задерживает другие хосты
+# ----------------------------
+@pytest.mark.asyncio
+async def test_host_limit_does_not_starve_other_hosts():
+    loop = asyncio.get_running_loop()
+    started = {}
+    active = {}
+    peak = {}
+
+    async def probe(site):
+        host = target_host(site)
+        started.setdefault(site.name, loop.time())
+        active[host] = active.get(host, 0) + 1
+        peak[host] = max(peak.get(host, 0), active[host])
+        await asyncio.sleep(0.1 if host == "slow" else 0.01)
+        active[host] -= 1
+
+    limiter = HostLimiter(concurrency=1, rate=0)
+    scheduler = ProbeScheduler(probe, workers=2, limiter=limiter, host=target_host)
+    scheduler.start()
+    begin = loop.time()
+    for i in range(4):
+        scheduler.schedule(f"slow{i}", SiteConfig(url=f"http://slow/{i}", name=f"slow{i}", check_interval=60), delay=0)
+    scheduler.schedule("fast", SiteConfig(url="http://fast/", name="fast", check_interval=60), delay=0.01)
+    await asyncio.sleep(0.5)
+    await scheduler.stop()
+
+    assert len(started) == 5
+    assert peak == {"slow": 1, "fast": 1}
+    # раньше оба воркера ждали слот медленного хоста, и быстрый проверялся только через 0.2+ с
+    assert started["fast"] - begin < 0.05
+    assert not limiter._active
@@ -0,0 +1,119 @@
+# tests/test_sharding.py
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+import asyncio
+
+from sharding import LEADER_LEASE, ShardCoordinator, assign_shards, shard_of
+
+
+# ----------------------------
+# Тест 1: шарды делятся между экземплярами без пересечений и пропусков
+# ----------------------------
+def test_assign_shards_partition():
+    instances = ["b", "a", "c"]
+    parts = [assign_shards(64, instances, i) for i in instances]
+    assert set().union(*parts) == set(range(64))
+    assert sum(len(p) for p in parts) == 64
+    assert max(len(p) for p in parts) - min(len(p) for p in parts) <= 1
+
+
+# ----------------------------
+# Тест 2: экземпляр, которого нет среди живых, ничего не получает
+# ----------------------------
+def test_assign_shards_unknown_instance():
+    assert assign_shards(8, ["a"], "b") == set()
+    assert assign_shards(8, ["a"], "a") == set(range(8))
+    assert shard_of(67, 64) == 3
+
+
+class FakeLeaseDB:
+    """Аренды в памяти: held — что сейчас у экземпляра, fail — ошибка БД на каждом вызове."""
+
+    def __init__(self) -> None:
+        self.held = {LEADER_LEASE}
+        self.fail = False
+
+    async def ensure_leases(self, names):
+        pass
+
+    async def heartbeat(self, instance_id):
+        if self.fail:
+            raise ConnectionError("db down")
+
+    async def get_live_instances(self, ttl):
+        return ["a"]
+
+    async def release_leases(self, owner, names=None):
+        pass
+
+    async def claim_leases(self, owner, names, ttl):
+        return len(names)
+
+    async def get_held_leases(self, owner):
+        return set(self.held)
+
+
+# ----------------------------
+# Тест 3: потеря аренды ведущего будит тех, кто ждёт wait_follower()
+# ----------------------------
+@pytest.mark.asyncio
+async def test_leadership_lost_wakes_follower_waiters():
+    db = FakeLeaseDB()
+    coordinator = ShardCoordinator(db, instance_id="a", shard_count=4)
+    await coordinator.tick()
+    assert coordinator.is_leader
+    await asyncio.wait_for(coordinator.wait_leader(), 0.1)
+
+    follower = asyncio.create_task(coordinator.wait_follower())
+    await asyncio.sleep(0)
+    assert not follower.done()
+    db.held = set()
+    await coordinator.tick()
+    await asyncio.wait_for(follower, 0.1)
+    assert not coordinator.is_leader
+
+
+# ----------------------------
+# Тест 4: если аренду не удаётся продлевать дольше её срока, экземпляр перестаёт считать себя ведущим
+# ----------------------------
+@pytest.mark.asyncio
+async def test_leadership_dropped_when_renewal_fails(monkeypatch):
+    monkeypatch.setattr("config.heartbeat_interval", 0.01)
+    monkeypatch.setattr("config.lease_ttl", 0.05)
+    db = FakeLeaseDB()
+    coordinator = ShardCoordinator(db, instance_id="a", shard_count=4)
+    coordinator.start()
+    await asyncio.wait_for(coordinator.wait_leader(), 0.5)
+    db.fail = True
+    await asyncio.wait_for(coordinator.wait_follower(), 0.5)
+    assert not coordinator.is_leader
+    await coordinator.stop()
+
+
+# ----------------------------
+# Тест 5: после истечения аренд шарды перестают считаться своими, сайты снимаются с проверки
+# ----------------------------
+@pytest.mark.asyncio
+async def test_shards_released_when_renewal_fails(monkeypatch):
+    monkeypatch.setattr("config.heartbeat_interval", 0.01)
+    monkeypatch.setattr("config.lease_ttl", 0.05)
+    db = FakeLeaseDB()
+    db.held = {LEADER_LEASE} | {f"shard:{i}" for i in range(4)}
+    changes = []
+
+    async def on_change(gained, lost):
+        changes.append((gained, lost))
+
+    coordinator = ShardCoordinator(db, on_change=on_change, instance_id="a", shard_count=4)
+    coordinator.start()
+    await asyncio.wait_for(coordinator.wait_leader(), 0.5)
+    assert coordinator.owned == {0, 1, 2, 3}
+    db.fail = True
+    await asyncio.wait_for(coordinator.wait_follower(), 0.5)
+    await coordinator.stop()
+    assert coordinator.owned == set()
+    assert not coordinator.owns(1)
+    assert changes == [({0, 1, 2, 3}, set()), (set(), {0, 1, 2, 3})]
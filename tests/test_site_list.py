@@ -0,0 +1,134 @@
+# tests/test_site_list.py
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from types import SimpleNamespace
+
+import callbackdata as cb
+from http_client import ProbeResult, ProbeTimings
+from site_monitor import SiteConfig, SiteMonitor
+from site_list import SiteListKeyboards, FILTER_DOWN, FILTER_OFF
+
+
+def make_sites(n, prefix="site", first_id=1):
+    sites = {}
+    for i in range(n):
+        site = SiteConfig(url=f"https://{prefix}{i}.example.com/", name=f"{prefix}-{i:03d}", check_interval=60, id=first_id + i)
+        sites[site.id] = site
+    return sites
+
+
+def site_buttons(markup):
+    return [b for row in markup.inline_keyboard for b in row if b.callback_data.startswith("sl:")]
+
+
+# ----------------------------
+# Тест 1: страницы, фильтры и короткие callback_data
+# ----------------------------
+def test_pages_and_filters():
+    sites = make_sites(45)
+    sites[3].enabled = False
+    sites[7].consecutive_failures = 5
+    lists = SiteListKeyboards(page_size=20)
+
+    text, markup = lists.render(sites)
+    assert "45" in text and "1 из 3" in text
+    assert len(site_buttons(markup)) == 20
+    _, last = lists.render(sites, page=99)
+    assert len(site_buttons(last)) == 5
+
+    _, down = lists.render(sites, FILTER_DOWN)
+    assert [b.text for b in site_buttons(down)] == ["🔴 site-006"]
+    _, off = lists.render(sites, FILTER_OFF)
+    assert [b.text for b in site_buttons(off)] == ["⏸ site-002"]
+
+    long = SiteConfig(url="https://x.example.com/", name="я" * 200, check_interval=60, id=10 ** 12)
+    _, markup = lists.render({long.id: long}, token=lists.search("Я" * 200))
+    for row in markup.inline_keyboard:
+        for button in row:
+            assert len(button.callback_data.encode()) <= 64
+    data = cb.SitesList.unpack(site_buttons(markup)[0].callback_data)
+    assert data.id == long.id
+
+
+# ----------------------------
+# Тест 2: поиск по префиксу и вытеснение старых запросов
+# ----------------------------
+def test_search():
+    sites = {**make_sites(3, "alpha"), **make_sites(2, "beta", first_id=100)}
+    lists = SiteListKeyboards(search_limit=2)
+    token = lists.search("  BET ")
+    assert lists.search("bet") == token
+    text, markup = lists.render(sites, token=token)
+    assert "«bet»" in text
+    assert [b.text for b in site_buttons(markup)] == ["🟢 beta-000", "🟢 beta-001"]
+
+    lists.search("a")
+    lists.search("b")
+    assert lists.query(token) is None
+
+
+# ----------------------------
+# Тест 3: сброс кэша только по затронутым страницам и спискам
+# ----------------------------
+def test_invalidate():
+    sites = make_sites(45)
+    lists = SiteListKeyboards(page_size=20)
+    first = lists.render(sites, page=0)
+    second = lists.render(sites, page=1)
+    down = lists.render(sites, FILTER_DOWN)
+    assert lists.render(sites, page=0) is first
+
+    # сайт со второй страницы упал: меняется только его страница и список упавших
+    sites[25].consecutive_failures = 3
+    lists.invalidate(sites[25])
+    assert lists.render(sites, page=0) is first
+    new_second = lists.render(sites, page=1)
+    assert new_second is not second and "🔴 site-024" in [b.text for b in site_buttons(new_second[1])]
+    new_down = lists.render(sites, FILTER_DOWN)
+    assert new_down is not down and len(site_buttons(new_down[1])) == 1
+
+    # переименование меняет порядок — список пересобирается целиком
+    sites[1].name = "zzz"
+    lists.invalidate(sites[1], renamed=True)
+    assert lists.render(sites, page=0) is not first
+    _, last = lists.render(sites, page=2)
+    assert site_buttons(last)[-1].text == "🟢 zzz"
+
+    removed = sites.pop(45)
+    lists.invalidate(removed, removed=True)
+    assert "44" in lists.render(sites)[0]
+
+
+class FakeHttp:
+    def __init__(self, status):
+        self.status = status
+
+    async def check(self, site, admitted=False):
+        return ProbeResult(self.status, None, 12.0, ProbeTimings(), 0.0)
+
+
+class FakeChecksDB:
+    async def add_check(self, *args, **kwargs):
+        pass
+
+
+# ----------------------------
+# Тест 4: восстановившийся сайт пропадает из списка упавших
+# ----------------------------
+@pytest.mark.asyncio
+async def test_recovery_invalidates_down_list():
+    sites = make_sites(3)
+    sites[2].consecutive_failures = 3
+    lists = SiteListKeyboards(page_size=20)
+    _, down = lists.render(sites, FILTER_DOWN)
+    assert [b.text for b in site_buttons(down)] == ["🔴 site-001"]
+
+    monitor = SimpleNamespace(http=FakeHttp(200), site_lists=lists, db=FakeChecksDB(),
+                              alerts=SimpleNamespace(recovered=lambda site, text: None))
+    await SiteMonitor.check_site_availability(monitor, sites[2])
+    assert sites[2].consecutive_failures == 0
+    _, down = lists.render(sites, FILTER_DOWN)
+    assert site_buttons(down) == []
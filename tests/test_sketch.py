@@ -0,0 +1,94 @@
+# tests/test_sketch.py
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import sketch
+from sketch import LatencySketch, SketchStore
+
+
+def exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+# ----------------------------
+# Тест 1: квантили в пределах относительной точности
+# ----------------------------
+def test_quantiles_within_accuracy():
+    rnd = random.Random(1)
+    values = [rnd.lognormvariate(5, 1) for _ in range(20000)]
+    s = LatencySketch(0.01)
+    for v in values:
+        s.add(v)
+    assert s.count == len(values)
+    for q in (0.5, 0.9, 0.99):
+        exact = exact_quantile(values, q)
+        assert abs(s.quantile(q) - exact) <= exact * 0.01 + 1e-9
+    assert s.mean() == pytest.approx(sum(values) / len(values))
+
+
+# ----------------------------
+# Тест 2: слияние частей равно скетчу по всем данным
+# ----------------------------
+def test_merge_equals_whole():
+    rnd = random.Random(2)
+    values = [rnd.uniform(0.1, 3000) for _ in range(5000)]
+    whole, a, b = LatencySketch(0.01), LatencySketch(0.01), LatencySketch(0.01)
+    for i, v in enumerate(values):
+        whole.add(v)
+        (a if i % 2 else b).add(v)
+    merged = sketch.merge_all([a, b])
+    assert merged.bins == whole.bins
+    assert merged.zero_count == whole.zero_count
+    assert merged.quantile(0.99) == whole.quantile(0.99)
+    with pytest.raises(ValueError):
+        a.merge(LatencySketch(0.02))
+    assert sketch.merge_all([]) is None
+
+
+# ----------------------------
+# Тест 3: сериализация без потерь и компактна
+# ----------------------------
+def test_roundtrip():
+    s = LatencySketch(0.01)
+    for v in (0.5, 40, 41, 120, 120, 9000):
+        s.add(v)
+    data = s.to_bytes()
+    restored = LatencySketch.from_bytes(data)
+    assert restored.bins == s.bins
+    assert restored.count == s.count
+    assert restored.zero_count == 1
+    assert restored.sum == pytest.approx(s.sum)
+    assert len(data) < 300
+    assert LatencySketch.from_bytes(LatencySketch().to_bytes()).quantile(0.5) is None
+
+
+# ----------------------------
+# Тест 4: хранилище текущих бакетов
+# ----------------------------
+def test_store_dirty_and_eviction():
+    store = SketchStore()
+    t = datetime(2025, 1, 1, 10, 30)
+    store.add_checks([
+        (1, t, 200, 1, 100.0, None),
+        (1, t + timedelta(minutes=40), 200, 1, 200.0, None),
+        (2, t, None, 0, 5000.0, "timeout"),
+    ])
+    dirty = store.take_dirty(now=t + timedelta(minutes=45))
+    assert sorted((site_id, start) for site_id, start, _ in dirty["hour"]) == [
+        (1, datetime(2025, 1, 1, 10)), (1, datetime(2025, 1, 1, 11))]
+    assert [s.count for _, _, s in dirty["day"]] == [2]
+    # закончившийся часовой бакет уже записан и из памяти ушёл
+    assert store.get("hour", 1, datetime(2025, 1, 1, 10)) is None
+    assert store.get("hour", 1, datetime(2025, 1, 1, 11)) is not None
+    assert store.take_dirty(now=t + timedelta(minutes=45)) == {"hour": [], "day": []}
+
+    store.restore(dirty)
+    again = store.take_dirty(now=t + timedelta(minutes=45))
+    assert len(again["hour"]) == 2 and len(again["day"]) == 1
@@ -1,3 +1,30 @@
+import adaptive
+from http_client import PROBE_MODES, PROBE_RANGE
+
+
+def probe_mode_from_label(text: str):
+    """Режим проверки по подписи кнопки (или по самому коду режима)."""
+    text = text.strip()
+    for mode, label in PROBE_MODES.items():
+        if text == label or text.lower() == mode:
+            return mode
+    return None
+
+
+def format_probe_mode(site) -> str:
+    label = PROBE_MODES.get(site.probe_mode, site.probe_mode)
+    if site.probe_mode == PROBE_RANGE:
+        return f"{label}, до {site.max_body_bytes} байт"
+    return label
+
+
+def format_interval(site) -> str:
+    if not site.adaptive:
+        return f"{site.check_interval} сек"
+    low, high = adaptive.bounds(site)
+    return f"{site.check_interval} сек, адаптивный {low:.0f}–{high:.0f} сек"
+
+
 def format_site_info(site) -> str:
     """Форматирует информацию о сайте для отправки пользователю."""
     status_emoji = "🟢" if site.last_status else "🔴" if site.last_status is not None else "⚪"
@@ -8,9 +35,11 @@ def format_site_info(site) -> str:
     text = (
         f"🔹 <b>{site.name}</b>\n"
         f"🌐 URL: {site.url}\n"
-        f"⏱ Интервал проверки: {site.check_interval} сек\n"
+        f"⏱ Интервал проверки: {format_interval(site)}\n"
         f"⏳ Таймаут: {site.timeout} сек\n"
         f"✅ Ожидаемый статус: {site.expected_status}\n"
+        f"📡 Режим проверки: {format_probe_mode(site)}\n"
+        f"🔎 Правила содержимого: {site.content_rules.describe() if site.content_rules else '–'}\n"
         f"🟢 Статус: {status_emoji}\n"
         f"🟢 Включен: {enabled_emoji}\n"
         f"🕒 Последняя проверка: {last_check_str}\n"